@@ -0,0 +1 @@
+"""Benchmarks and the mock Softaculous server they run against"""
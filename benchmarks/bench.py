@@ -0,0 +1,192 @@
+"""End-to-end throughput benchmarks against the mock Softaculous server
+
+Measures sites per minute for a bulk audit (the BulkExecutor + audit_site
+pipeline run_bulk_audit drives, without the Streamlit rendering), backup
+download MB/s, and the peak RSS of each run. Every scenario runs in its own
+process and working directory so memory high-water marks and logs do not
+mix, against one mock server process shared by the whole suite.
+
+    python -m benchmarks.bench                    # compare with baselines.json
+    python -m benchmarks.bench --save-baseline    # record new baselines
+    python -m benchmarks.bench --sites 10 100     # subset of scales
+
+Exits with status 1 when a metric regresses past --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINES_PATH = Path(__file__).resolve().parent / 'baselines.json'
+
+DEFAULT_SITES = (10, 100, 1000)
+AUDIT_STEPS = ("Update all plugins", "Create backups")
+
+# Metric -> True when higher is better
+METRICS = {'sites_per_minute': True, 'mb_per_s': True, 'peak_rss_mb': False}
+
+def peak_rss_mb():
+    """High-water resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# --- Scenarios (run in a child process) ---
+def bench_bulk_audit(port, sites):
+    from benchmarks.mock_softaculous import MockSoftaculous, installation_domain, installation_id
+    from wpaudit.audit import audit_logger
+    from wpaudit.client import BulkExecutor, audit_site, get_client, run_sync
+
+    audit_logger.bind_context('benchmark', '127.0.0.1', 'benchmark')
+    client = get_client(MockSoftaculous().credentials(port))
+    domains = [{'insid': installation_id(i), 'display_name': f"{installation_domain(i)}/"} for i in range(sites)]
+
+    started = time.perf_counter()
+    executor = BulkExecutor()
+    errors = 0
+    for domain, outcomes in executor.run(domains, lambda domain: audit_site(client, domain, AUDIT_STEPS),
+                                         host=client.credentials['host'], operation='benchmark'):
+        errors += sum(1 for ok, message in outcomes if not ok)
+    elapsed = time.perf_counter() - started
+    audit_logger.flush()
+    run_sync(client.close())
+    return {'sites': sites, 'seconds': round(elapsed, 3), 'sites_per_minute': round(sites / elapsed * 60, 1),
+            'errors': errors}
+
+def bench_download(port, backups):
+    from benchmarks.mock_softaculous import MockSoftaculous
+    from wpaudit import downloads
+    from wpaudit.audit import audit_logger
+    from wpaudit.client import get_client, run_sync
+
+    audit_logger.bind_context('benchmark', '127.0.0.1', 'benchmark')
+    client = get_client(MockSoftaculous().credentials(port))
+    listing, error = run_sync(client.list_backups())
+    if error:
+        raise RuntimeError(error)
+    metadata = downloads.backup_metadata(listing)
+    names = sorted(metadata)[:backups]
+
+    started = time.perf_counter()
+    results = run_sync(downloads.bulk_download_backups(client, names, metadata=metadata,
+                                                       sizes=downloads.backup_sizes(listing)))
+    elapsed = time.perf_counter() - started
+    total = sum(metadata[name]['size'] for name in results['success'])
+    audit_logger.flush()
+    run_sync(client.close())
+    return {'backups': len(results['success']), 'errors': len(results['errors']), 'bytes': total,
+            'seconds': round(elapsed, 3), 'mb_per_s': round(total / elapsed / (1024 * 1024), 1)}
+
+SCENARIOS = {'bulk_audit': bench_bulk_audit, 'download': bench_download}
+
+def child_main(scenario, port, size):
+    result = SCENARIOS[scenario](port, size)
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print(json.dumps(result), flush=True)
+
+# --- Runner ---
+def start_mock(args, workdir):
+    command = [sys.executable, '-m', 'benchmarks.mock_softaculous', '--installations', str(max(args.sites)),
+               '--plugins', str(args.plugins), '--latency', str(args.latency), '--jitter', str(args.jitter),
+               '--error-rate', str(args.error_rate), '--backups', str(args.backups),
+               '--backup-size', str(args.backup_mb * 1024 * 1024)]
+    process = subprocess.Popen(command, cwd=workdir, env=child_env(), stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('PORT '):
+        process.kill()
+        raise RuntimeError(f"Mock server failed to start: {line!r}")
+    return process, int(line.split()[1])
+
+def child_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get('PYTHONPATH')]))
+    return env
+
+def run_scenario(scenario, port, size):
+    """Run one scenario in a fresh process and working directory"""
+    with tempfile.TemporaryDirectory(prefix=f'wpaudit-bench-{scenario}-') as workdir:
+        completed = subprocess.run([sys.executable, '-m', 'benchmarks.bench', '--child', scenario,
+                                    '--port', str(port), '--size', str(size)],
+                                   cwd=workdir, env=child_env(), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{scenario}[{size}] failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results, baselines, tolerance):
+    """Regressions as (key, metric, baseline, current) tuples"""
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if not baseline:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in result or metric not in baseline:
+                continue
+            limit = baseline[metric] * (1 - tolerance if higher_is_better else 1 + tolerance)
+            if (result[metric] < limit) if higher_is_better else (result[metric] > limit):
+                regressions.append((key, metric, baseline[metric], result[metric]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk audit and download benchmarks against a mock server")
+    parser.add_argument('--sites', type=int, nargs='+', default=list(DEFAULT_SITES))
+    parser.add_argument('--plugins', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--backups', type=int, default=8, help="Backups downloaded in the download scenario")
+    parser.add_argument('--backup-mb', type=int, default=32, help="Size of each backup in MB")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed fractional regression")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--baselines', type=Path, default=BASELINES_PATH)
+    parser.add_argument('--child', choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child_main(args.child, args.port, args.size)
+        return 0
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='wpaudit-bench-mock-') as workdir:
+        mock, port = start_mock(args, workdir)
+        try:
+            for sites in sorted(args.sites):
+                key = f"bulk_audit[sites={sites}]"
+                results[key] = run_scenario('bulk_audit', port, sites)
+                print(f"{key:28} {results[key]['sites_per_minute']:>10.1f} sites/min  "
+                      f"{results[key]['peak_rss_mb']:>7.1f} MB peak  ({results[key]['errors']} errors)")
+            key = f"download[backups={args.backups},mb={args.backup_mb}]"
+            results[key] = run_scenario('download', port, args.backups)
+            print(f"{key:28} {results[key]['mb_per_s']:>10.1f} MB/s       "
+                  f"{results[key]['peak_rss_mb']:>7.1f} MB peak  ({results[key]['errors']} errors)")
+        finally:
+            mock.terminate()
+            mock.wait()
+
+    stored = json.loads(args.baselines.read_text()) if args.baselines.exists() else {'results': {}}
+    if args.save_baseline:
+        stored['results'].update(results)
+        stored['machine'] = {'python': platform.python_version(), 'platform': platform.platform(),
+                             'cpus': os.cpu_count(), 'recorded': time.strftime('%Y-%m-%d')}
+        args.baselines.write_text(json.dumps(stored, indent=2, sort_keys=True) + '\n')
+        print(f"Saved baselines to {args.baselines}")
+        return 0
+
+    regressions = compare(results, stored['results'], args.tolerance)
+    for key, metric, baseline, current in regressions:
+        print(f"REGRESSION {key} {metric}: {current} vs baseline {baseline}")
+    if not stored['results']:
+        print("No baselines recorded yet; run with --save-baseline")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
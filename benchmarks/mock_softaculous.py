@@ -0,0 +1,234 @@
+"""Local stand-in for the Softaculous index.live.php API, for benchmarks
+
+Speaks the act=...&api=serialize protocol with PHP-serialized payloads for
+the acts the client uses: installation and plugin listings, plugin updates,
+core upgrades, backup creation, listing, download (with Range) and removal.
+Latency and error rate are configurable; backups are generated on the fly.
+
+Run standalone with:
+    python -m benchmarks.mock_softaculous --installations 1000 --plugins 20 --latency 0.02
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+import threading
+import time
+
+import phpserialize
+from aiohttp import web
+
+from wpaudit.config import SOFTACULOUS_PATH
+
+STREAM_BLOCK = 1024 * 1024
+
+def installation_id(index):
+    """Softaculous-style insid of the index-th mock installation"""
+    return f"26_{10000 + index}"
+
+def installation_domain(index):
+    return f"site{index:05d}.example.edu"
+
+class MockSoftaculous:
+    """Softaculous API stand-in with N installations of M plugins each"""
+    def __init__(self, installations=10, plugins=20, latency=0.02, jitter=0.0, error_rate=0.0,
+                 backup_size=8 * 1024 * 1024, backups=0, seed=0, interrupt_after=0):
+        self.installations = installations
+        self.plugins = plugins
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.backup_size = backup_size
+        self.random = random.Random(seed)
+        self.requests = {}
+        self.errors = 0
+        self.backups = {}
+        # Drop the first full download of each backup after this many bytes (0 = never)
+        self.interrupt_after = interrupt_after
+        self.interrupted = set()
+        self.resumed = {}  # name -> start offset of the last ranged download
+        self._block = random.Random(seed).randbytes(STREAM_BLOCK)
+        self._loop = None
+        self._runner = None
+        for index in range(backups):
+            self._add_backup(installation_id(index % max(installations, 1)))
+
+    # --- Payloads ---
+    def installations_payload(self):
+        installs = {}
+        for index in range(self.installations):
+            domain = installation_domain(index)
+            installs[installation_id(index)] = {
+                'insid': installation_id(index), 'sid': 26, 'ver': '6.4.3', 'itime': 1700000000 + index,
+                'softpath': f"/home/clas/public_html/{domain}", 'softurl': f"https://{domain}",
+                'softdomain': domain, 'softdirectory': '', 'cuser': 'clas',
+                'site_name': f"Site {index}", 'softdb': f"clas_wp{index}", 'softdbuser': f"clas_wp{index}",
+                'softdbhost': 'localhost', 'softdbpass': 'x' * 16, 'dbprefix': 'wp_',
+                'display_softurl': f"https://{domain}", 'auto_upgrade': 0, 'eu_auto_upgrade': 0,
+            }
+        return {'title': 'WordPress Installations', 'installations': installs}
+
+    def plugins_payload(self, insid):
+        plugins = {}
+        for index in range(self.plugins):
+            slug = f"plugin-{index:03d}"
+            plugins[f"{slug}/{slug}.php"] = {
+                'Name': f"Plugin {index}", 'PluginURI': f"https://wordpress.org/plugins/{slug}/",
+                'Version': f"1.{index}.0", 'Description': f"Mock plugin {index} on {insid}. " * 4,
+                'Author': 'CLAS IT', 'AuthorURI': 'https://clas.example.edu', 'TextDomain': slug,
+                'RequiresWP': '5.8', 'RequiresPHP': '7.4', 'Network': False,
+                'active': index % 3 != 0, 'update_available': index % 5 == 0,
+                'new_version': f"1.{index}.1" if index % 5 == 0 else '',
+            }
+        return {'title': 'Plugins', 'plugins': plugins}
+
+    def backups_payload(self):
+        listing = {}
+        for name, backup in self.backups.items():
+            listing.setdefault(backup['insid'], {})[name] = {
+                'name': name, 'size': backup['size'], 'btime': backup['btime'], 'insid': backup['insid'],
+                'backup_dir': 1, 'backup_datadir': 1, 'backup_db': 1, 'ver': '6.4.3',
+            }
+        return {'title': 'Backups', 'backups': listing}
+
+    def _add_backup(self, insid):
+        btime = int(time.time())
+        name = f"wp.{insid}.{btime}_{len(self.backups)}.tar.gz"
+        self.backups[name] = {'insid': insid, 'size': self.backup_size, 'btime': btime}
+        return name
+
+    def backup_content(self, name):
+        """Exact bytes served for a backup"""
+        size = self.backups[name]['size']
+        return (self._block * (size // STREAM_BLOCK + 1))[:size]
+
+    # --- HTTP ---
+    def _serialized(self, payload):
+        return web.Response(body=phpserialize.dumps(payload), content_type='text/plain')
+
+    async def handle(self, request):
+        act = request.query.get('act', '')
+        self.requests[act] = self.requests.get(act, 0) + 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if act == 'home':
+            return web.json_response({'title': 'Softaculous'})
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text='Service Unavailable', headers={'Retry-After': '0'})
+
+        form = await request.post() if request.method == 'POST' else {}
+        if act == 'wordpress':
+            if form.get('type') == 'plugins':
+                if form.get('list'):
+                    return self._serialized(self.plugins_payload(form.get('insid', '')))
+                return self._serialized({'done': 1})
+            return self._serialized(self.installations_payload())
+        if act == 'upgrade':
+            return self._serialized({'done': 1, 'insid': request.query.get('insid', '')})
+        if act == 'backup':
+            name = self._add_backup(request.query.get('insid', ''))
+            return self._serialized({'done': 1, 'backup': name})
+        if act == 'backups':
+            if 'download' in request.query:
+                return await self._download(request, request.query['download'])
+            if 'remove' in request.query:
+                self.backups.pop(request.query['remove'], None)
+                return self._serialized({'done': 1})
+            return self._serialized(self.backups_payload())
+        return self._serialized({'error': [f"Unknown act {act}"]})
+
+    async def _download(self, request, name):
+        backup = self.backups.get(name)
+        if backup is None:
+            return web.Response(status=404, text='Backup not found')
+        size = backup['size']
+        etag = '"' + hashlib.sha1(f"{name}:{size}".encode()).hexdigest() + '"'
+        start = 0
+        range_header = request.headers.get('Range', '')
+        if range_header.startswith('bytes=') and request.headers.get('If-Range', etag) == etag:
+            start = int(range_header[6:].split('-')[0] or 0)
+            if start >= size:
+                return web.Response(status=416, headers={'Content-Range': f"bytes */{size}"})
+            if start:
+                self.resumed[name] = start
+        response = web.StreamResponse(status=206 if start else 200, headers={'ETag': etag})
+        if start:
+            response.headers['Content-Range'] = f"bytes {start}-{size - 1}/{size}"
+        response.content_length = size - start
+        await response.prepare(request)
+        cut = None
+        if self.interrupt_after and not start and name not in self.interrupted:
+            self.interrupted.add(name)
+            cut = min(self.interrupt_after, size)
+        offset = start
+        while offset < size:
+            block_offset = offset % STREAM_BLOCK
+            chunk = self._block[block_offset:block_offset + min(STREAM_BLOCK - block_offset, size - offset)]
+            if cut is not None and offset + len(chunk) >= cut:
+                await response.write(chunk[:cut - offset])
+                # Drop the connection mid-body, as a flaky proxy would
+                request.transport.close()
+                return response
+            await response.write(chunk)
+            offset += len(chunk)
+        await response.write_eof()
+        return response
+
+    # --- Lifecycle ---
+    async def start(self, host='127.0.0.1', port=0):
+        """Serve on the running loop; returns the bound port"""
+        app = web.Application(client_max_size=1024 * 1024)
+        app.router.add_route('*', SOFTACULOUS_PATH, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    def start_in_thread(self, host='127.0.0.1', port=0):
+        """Serve from a daemon thread with its own event loop; returns the bound port"""
+        self._loop = asyncio.new_event_loop()
+        port = self._loop.run_until_complete(self.start(host, port))
+        threading.Thread(target=self._loop.run_forever, name='mock-softaculous', daemon=True).start()
+        return port
+
+    def stop(self):
+        """Shut down a server started with start_in_thread"""
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def credentials(self, port, host='127.0.0.1'):
+        """Credentials for SoftaculousClient pointing at this server"""
+        return {'host': host, 'port': port, 'user': 'clas', 'pass': 'mock', 'scheme': 'http'}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--installations', type=int, default=10)
+    parser.add_argument('--plugins', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds added to every request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--backups', type=int, default=0, help="Backups present at startup")
+    parser.add_argument('--backup-size', type=int, default=8 * 1024 * 1024, help="Bytes per backup")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = MockSoftaculous(args.installations, args.plugins, args.latency, args.jitter, args.error_rate,
+                             args.backup_size, args.backups, args.seed)
+    loop = asyncio.new_event_loop()
+    port = loop.run_until_complete(server.start(args.host, args.port))
+    # The benchmark runner reads the port from this line
+    print(f"PORT {port}", flush=True)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
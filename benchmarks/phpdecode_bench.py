@@ -0,0 +1,106 @@
+"""Microbenchmark: phpserialize versus wpaudit.phpdecode on synthetic Softaculous listings
+
+For each payload size it times three ways of getting the records the client
+returns: phpserialize.loads followed by the old reshaping loop,
+phpdecode.loads followed by the same loop, and the one-pass
+phpdecode.installations / phpdecode.plugins decoders.
+
+    python -m benchmarks.phpdecode_bench --sizes 1 10 100
+"""
+import argparse
+import gc
+import sys
+import time
+
+import phpserialize
+
+from benchmarks.mock_softaculous import MockSoftaculous, installation_id
+from wpaudit import phpdecode
+
+def synthetic_payload(kind, target_mb):
+    """A serialized installations or plugins listing of roughly target_mb megabytes
+
+    One entry is serialized and repeated under distinct keys, which keeps
+    generating 100 MB fast.
+    """
+    mock = MockSoftaculous(installations=1, plugins=1)
+    if kind == 'installations':
+        entry = phpserialize.dumps(mock.installations_payload()['installations'][installation_id(0)])
+        key = lambda index: installation_id(index)
+    else:
+        entry = phpserialize.dumps(mock.plugins_payload(installation_id(0))['plugins']['plugin-000/plugin-000.php'])
+        key = lambda index: f"plugin-{index:06d}/plugin-{index:06d}.php"
+    count = max(1, int(target_mb * 1024 * 1024 / (len(entry) + 32)))
+    body = b''.join(phpserialize.dumps(key(index)) + entry for index in range(count))
+    title = phpserialize.dumps('title') + phpserialize.dumps(kind.title())
+    return (b'a:2:{' + title + phpserialize.dumps(kind) + b'a:%d:{' % count + body + b'}}'), count
+
+def reshape_installations(result):
+    """The reshaping list_wordpress_installations did after a generic decode"""
+    installations = []
+    for insid, install_data in result['installations'].items():
+        installations.append({
+            'insid': insid,
+            'domain': install_data.get('softurl', ''),
+            'path': install_data.get('softpath', ''),
+            'version': install_data.get('ver', ''),
+            'user': install_data.get('cuser', ''),
+            'display_name': f"{install_data.get('softdomain', '')}/{install_data.get('softdirectory', '')}"
+        })
+    return installations
+
+def reshape_plugins(result):
+    """The reshaping get_plugins_for_installation did after a generic decode"""
+    return [{'name': data.get('Name', 'Unknown'), 'slug': path, 'version': data.get('Version', ''),
+             'active': data.get('active', False), 'update_available': data.get('update_available', False),
+             'new_version': data.get('new_version', ''), 'description': data.get('Description', '')}
+            for path, data in result['plugins'].items()]
+
+def timed(function, payload, repeat):
+    """Best wall time of repeat runs, with the collector paused as in a steady-state service"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            records = function(payload)
+            elapsed = time.perf_counter() - started
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PHP-unserialize decoder microbenchmark")
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 10, 100], help="Payload sizes in MB")
+    parser.add_argument('--kinds', nargs='+', default=['installations', 'plugins'],
+                        choices=['installations', 'plugins'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    for kind in args.kinds:
+        reshape = reshape_installations if kind == 'installations' else reshape_plugins
+        one_pass = phpdecode.installations if kind == 'installations' else phpdecode.plugins
+        candidates = [
+            ('phpserialize.loads + reshape', lambda data: reshape(phpserialize.loads(data, decode_strings=True))),
+            ('phpdecode.loads + reshape', lambda data: reshape(phpdecode.loads(data))),
+            (f'phpdecode.{kind}', one_pass),
+        ]
+        for size in args.sizes:
+            payload, count = synthetic_payload(kind, size)
+            megabytes = len(payload) / (1024 * 1024)
+            print(f"{kind}: {megabytes:.1f} MB, {count} entries")
+            baseline = expected = None
+            for name, function in candidates:
+                elapsed, records = timed(function, payload, args.repeat)
+                if expected is None:
+                    baseline, expected = elapsed, records
+                elif records != expected:
+                    print(f"  {name} returned different records", file=sys.stderr)
+                    return 1
+                print(f"  {name:32} {elapsed:8.3f} s  {megabytes / elapsed:8.1f} MB/s  {baseline / elapsed:5.1f}x")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
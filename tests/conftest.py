@@ -0,0 +1,52 @@
+"""Shared fixtures: an isolated working directory and in-process mock Softaculous servers"""
+import os
+
+import pytest
+
+from benchmarks.mock_softaculous import MockSoftaculous
+from wpaudit.client import SoftaculousClient, run_sync
+from wpaudit.config import LOCAL_BACKUP_DIR, DOWNLOADS_DIR, LOGS_DIR
+from wpaudit.limiter import AdaptiveLimiter
+from wpaudit.resilience import CircuitBreaker
+
+@pytest.fixture(scope='session', autouse=True)
+def workdir(tmp_path_factory):
+    # backups/, downloads/ and logs/ are relative to the working directory
+    path = tmp_path_factory.mktemp('workdir')
+    previous = os.getcwd()
+    os.chdir(path)
+    for directory in (LOCAL_BACKUP_DIR, DOWNLOADS_DIR, LOGS_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    yield path
+    os.chdir(previous)
+
+@pytest.fixture
+def mock_server():
+    """Factory: start a MockSoftaculous with the given options on a free port"""
+    servers = []
+
+    def start(**options):
+        options.setdefault('latency', 0)
+        server = MockSoftaculous(**options)
+        server.port = server.start_in_thread()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def client_for():
+    """Factory: a client for a mock server with its own limiter and breaker"""
+    clients = []
+
+    def make(server, **breaker_options):
+        client = SoftaculousClient(server.credentials(server.port), limiter=AdaptiveLimiter(),
+                                   breaker=CircuitBreaker('127.0.0.1', **breaker_options))
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        run_sync(client.close())
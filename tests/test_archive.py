@@ -0,0 +1,83 @@
+"""Archives written from local files and streamed from the server read back intact"""
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from wpaudit import archive, downloads
+from wpaudit.client import run_sync
+from wpaudit.store import BackupStore
+
+FORMATS = archive.available_formats()
+
+def read_members(path, compression_type):
+    """{arcname: bytes} for every member of an archive"""
+    if compression_type == 'zip':
+        with zipfile.ZipFile(path) as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+    if compression_type == 'tar.gz':
+        tar = tarfile.open(path, 'r:gz')
+    else:
+        import zstandard
+        with open(path, 'rb') as f:
+            data = zstandard.ZstdDecompressor().stream_reader(f).read()
+        tar = tarfile.open(fileobj=io.BytesIO(data))
+    with tar:
+        return {member.name: tar.extractfile(member).read() for member in tar.getmembers()}
+
+@pytest.mark.parametrize('compression_type', FORMATS)
+def test_local_files_round_trip(tmp_path, compression_type):
+    text = tmp_path / 'site.sql'
+    text.write_bytes(b'INSERT INTO wp_posts VALUES (1);\n' * 20000)
+    packed = tmp_path / 'site.tar.gz'
+    # Already compressed, so it is stored rather than recompressed
+    packed.write_bytes(gzip.compress(os.urandom(200_000)))
+    archive_path = tmp_path / f'out.{compression_type}'
+
+    stats, error = archive.create_archive([(text, 'site.sql'), (packed, 'backups/site.tar.gz')], archive_path,
+                                          compression_type, threads=2)
+
+    assert error is None
+    assert stats['members'] == 2
+    assert read_members(archive_path, compression_type) == {
+        'site.sql': text.read_bytes(), 'backups/site.tar.gz': packed.read_bytes()}
+
+@pytest.mark.parametrize('compression_type', FORMATS)
+def test_invalid_level_is_rejected(tmp_path, compression_type):
+    stats, error = archive.create_archive([], tmp_path / 'out', compression_type, level=99)
+
+    assert stats is None
+    assert 'Compression level' in error
+
+@pytest.mark.parametrize('compression_type', FORMATS)
+def test_streamed_archive_round_trip(mock_server, client_for, tmp_path, compression_type):
+    server = mock_server(installations=2, backups=3, backup_size=1024 * 1024 + 7, interrupt_after=300_000)
+    client = client_for(server)
+    listing, _ = run_sync(client.list_backups())
+    metadata = downloads.backup_metadata(listing)
+    archive_path = tmp_path / f'stream.{compression_type}'
+
+    stats, error = run_sync(downloads.stream_backups_to_archive(
+        client, sorted(metadata), archive_path, compression_type, metadata=metadata, threads=2,
+        store=downloads.store_for(tmp_path / 'store')))
+
+    assert error is None
+    assert stats['members'] == 3
+    # Every member was cut off once and resumed inside the archive
+    assert set(server.resumed) == set(server.backups)
+    assert read_members(archive_path, compression_type) == {
+        name: server.backup_content(name) for name in server.backups}
+
+def test_archive_key_depends_on_level(tmp_path):
+    store = BackupStore(tmp_path)
+    download = tmp_path / 'site.tar.gz.part'
+    download.write_bytes(b'backup')
+    store.ingest(download, 'site.tar.gz')
+
+    default_key = store.archive_key(['site.tar.gz'], 'zip')
+    assert default_key == store.archive_key(['site.tar.gz'], 'zip', archive.ARCHIVE_LEVELS['zip'])
+    assert default_key != store.archive_key(['site.tar.gz'], 'zip', 9)
+    assert store.archive_key(['missing.tar.gz'], 'zip') is None
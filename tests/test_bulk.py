@@ -0,0 +1,54 @@
+"""Bulk audit fan-out with and without injected server errors"""
+from benchmarks.mock_softaculous import installation_domain, installation_id
+from wpaudit.client import BulkExecutor, audit_site
+
+STEPS = ("Update all plugins", "Create backups")
+
+def run_audit(client, sites):
+    domains = [{'insid': installation_id(i), 'display_name': f"{installation_domain(i)}/"} for i in range(sites)]
+    executor = BulkExecutor()
+    return dict((domain['insid'], outcomes) for domain, outcomes in
+                executor.run(domains, lambda domain: audit_site(client, domain, STEPS),
+                             host=client.credentials['host'], operation='test'))
+
+def test_bulk_audit_all_sites_succeed(mock_server, client_for):
+    server = mock_server(installations=12)
+    client = client_for(server)
+
+    results = run_audit(client, 12)
+
+    assert sorted(results) == sorted(installation_id(i) for i in range(12))
+    assert all(ok for outcomes in results.values() for ok, _ in outcomes)
+    assert all(len(outcomes) == len(STEPS) for outcomes in results.values())
+    assert len(server.backups) == 12
+
+def test_bulk_audit_reports_injected_errors(mock_server, client_for):
+    server = mock_server(installations=30, error_rate=0.3, seed=1)
+    # Keep the breaker closed so every failure comes from the server
+    client = client_for(server, min_calls=10_000)
+
+    results = run_audit(client, 30)
+    outcomes = [outcome for site_outcomes in results.values() for outcome in site_outcomes]
+    failed = [message for ok, message in outcomes if not ok]
+
+    assert len(results) == 30
+    assert all(len(site_outcomes) == len(STEPS) for site_outcomes in results.values())
+    # Mutations are sent once, so each 503 is exactly one failed step
+    assert server.errors > 0
+    assert len(failed) == server.errors
+    assert all('HTTP 503' in message for message in failed)
+    created = sum(1 for ok, message in outcomes if ok and message.startswith('Backup created'))
+    assert len(server.backups) == created
+
+def test_bulk_audit_fails_fast_once_breaker_opens(mock_server, client_for):
+    server = mock_server(installations=20, error_rate=1.0)
+    client = client_for(server, min_calls=4)
+
+    results = run_audit(client, 20)
+    messages = [message for outcomes in results.values() for ok, message in outcomes]
+
+    assert len(results) == 20
+    assert not any(ok for outcomes in results.values() for ok, _ in outcomes)
+    assert client.breaker.state == client.breaker.OPEN
+    # Requests stop reaching the server once the breaker has tripped
+    assert server.errors < len(messages)
@@ -0,0 +1,60 @@
+"""Listing and plugin decoding against the mock server"""
+from benchmarks.mock_softaculous import installation_domain, installation_id
+from wpaudit.client import run_sync
+
+def test_list_installations(mock_server, client_for):
+    server = mock_server(installations=5)
+    client = client_for(server)
+
+    installations, error = run_sync(client.list_wordpress_installations())
+
+    assert error is None
+    assert [site['insid'] for site in installations] == [installation_id(i) for i in range(5)]
+    first = installations[0]
+    assert first['domain'] == f"https://{installation_domain(0)}"
+    assert first['path'] == f"/home/clas/public_html/{installation_domain(0)}"
+    assert first['display_name'] == f"{installation_domain(0)}/"
+    assert first['version'] == '6.4.3'
+    assert first['user'] == 'clas'
+
+def test_listing_is_cached_and_copied(mock_server, client_for):
+    server = mock_server(installations=2)
+    client = client_for(server)
+
+    first, _ = run_sync(client.list_wordpress_installations())
+    first[0]['insid'] = 'changed'
+    second, _ = run_sync(client.list_wordpress_installations())
+
+    assert server.requests['wordpress'] == 1
+    assert second[0]['insid'] == installation_id(0)
+
+def test_plugins_for_installation(mock_server, client_for):
+    server = mock_server(installations=1, plugins=7)
+    client = client_for(server)
+
+    plugins, error = run_sync(client.get_plugins_for_installation(installation_id(0)))
+
+    assert error is None
+    assert len(plugins) == 7
+    by_slug = {plugin['slug']: plugin for plugin in plugins}
+    plugin = by_slug['plugin-005/plugin-005.php']
+    assert plugin['name'] == 'Plugin 5'
+    assert plugin['version'] == '1.5.0'
+    assert plugin['active'] is True
+    assert plugin['update_available'] is True
+    assert plugin['new_version'] == '1.5.1'
+    assert by_slug['plugin-003/plugin-003.php']['active'] is False
+    assert by_slug['plugin-001/plugin-001.php']['update_available'] is False
+
+def test_plugin_update_invalidates_listing(mock_server, client_for):
+    server = mock_server(installations=1, plugins=3)
+    client = client_for(server)
+    insid = installation_id(0)
+
+    run_sync(client.get_plugins_for_installation(insid))
+    _, error = run_sync(client.update_plugin(insid))
+    run_sync(client.get_plugins_for_installation(insid))
+
+    assert error is None
+    # list, update, list again after the cached listing was dropped
+    assert server.requests['wordpress'] == 3
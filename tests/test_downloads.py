@@ -0,0 +1,70 @@
+"""Streaming backup downloads: byte-for-byte results, resume and skip"""
+from wpaudit import downloads
+from wpaudit.client import run_sync
+from wpaudit.store import BackupStore
+
+def server_metadata(client):
+    listing, error = run_sync(client.list_backups())
+    assert error is None
+    return downloads.backup_metadata(listing)
+
+def test_bulk_download_matches_server(mock_server, client_for, tmp_path):
+    server = mock_server(installations=2, backups=3, backup_size=1024 * 1024 + 123)
+    client = client_for(server)
+    metadata = server_metadata(client)
+
+    results = run_sync(downloads.bulk_download_backups(client, sorted(metadata), metadata=metadata,
+                                                       dest_dir=tmp_path))
+
+    assert results['errors'] == {}
+    assert sorted(results['success']) == sorted(server.backups)
+    for name in server.backups:
+        assert (tmp_path / name).read_bytes() == server.backup_content(name)
+
+def test_download_resumes_after_dropped_connection(mock_server, client_for, tmp_path):
+    server = mock_server(installations=1, backups=1, backup_size=3 * 1024 * 1024, interrupt_after=1_000_000)
+    client = client_for(server)
+    name = next(iter(server.backups))
+
+    path, error = run_sync(downloads.download_backup_file(client, name, dest_dir=tmp_path))
+
+    assert error is None
+    assert server.interrupted == {name}
+    # Resumed from whatever reached the client before the drop, not from zero
+    assert 0 < server.resumed[name] <= 1_000_000
+    assert path.read_bytes() == server.backup_content(name)
+    assert not downloads.part_paths(path)[0].exists()
+
+def test_download_resumes_on_a_later_call(mock_server, client_for, tmp_path):
+    server = mock_server(installations=1, backups=1, backup_size=2 * 1024 * 1024, interrupt_after=700_000)
+    client = client_for(server)
+    name = next(iter(server.backups))
+
+    path, error = run_sync(downloads.download_backup_file(client, name, dest_dir=tmp_path, attempts=1))
+    assert path is None and error
+    part_path, sidecar_path = downloads.part_paths(downloads.local_backup_path(name, tmp_path))
+    offset = downloads.read_sidecar(sidecar_path)['offset']
+    assert 0 < offset <= 700_000
+    assert part_path.stat().st_size == offset
+
+    path, error = run_sync(downloads.download_backup_file(client, name, dest_dir=tmp_path))
+
+    assert error is None
+    assert server.resumed[name] == offset
+    assert path.read_bytes() == server.backup_content(name)
+
+def test_current_backups_are_skipped(mock_server, client_for, tmp_path):
+    server = mock_server(installations=2, backups=2, backup_size=256 * 1024)
+    client = client_for(server)
+    metadata = server_metadata(client)
+    names = sorted(metadata)
+
+    run_sync(downloads.bulk_download_backups(client, names, metadata=metadata, dest_dir=tmp_path))
+    downloads_before = server.requests['backups']
+    results = run_sync(downloads.bulk_download_backups(client, names, metadata=metadata, dest_dir=tmp_path))
+
+    assert sorted(results['skipped']) == names
+    assert results['success'] == []
+    assert server.requests['backups'] == downloads_before
+    assert all(BackupStore(tmp_path).is_current(name, metadata[name]['size'], metadata[name]['mtime'])
+               for name in names)
@@ -0,0 +1,61 @@
+"""Log writers sharing a directory rotate and compress without losing lines"""
+import gzip
+import json
+import os
+import threading
+import time
+
+from wpaudit.audit import AuditWriter
+from wpaudit.logfiles import compress_pending, compress_segment
+
+def read_entries(logs_dir):
+    entries = []
+    for name in os.listdir(logs_dir):
+        if not name.startswith('api_calls'):
+            continue
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(logs_dir / name, 'rt') as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    return entries
+
+def test_concurrent_writers_keep_every_line(tmp_path):
+    # Separate writers stand in for the app and the CLI appending to the same logs
+    writers = [AuditWriter(tmp_path, flush_interval=0.01, batch_size=20, rotate_bytes=4000, rotate_interval=0)
+               for _ in range(3)]
+
+    def write(number, writer):
+        for i in range(1000):
+            writer.submit(json.dumps({'timestamp': '2026-10-16T00:00:00', 'writer': number, 'i': i}),
+                          ('api_calls',))
+        writer.close()
+
+    threads = [threading.Thread(target=write, args=(n, w)) for n, w in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for thread in threading.enumerate():
+        if thread.name == 'log-compress':
+            thread.join()
+    assert sum(writer.rotations for writer in writers) > 3
+    entries = read_entries(tmp_path)
+    assert sorted((entry['writer'], entry['i']) for entry in entries) == \
+        [(n, i) for n in range(3) for i in range(1000)]
+
+def test_compress_pending_skips_recent_segments(tmp_path):
+    old = tmp_path / 'api_calls.20261015-000000.log'
+    recent = tmp_path / 'api_calls.20261016-000000.log'
+    for path in (old, recent):
+        path.write_text('{}\n')
+    hour_ago = time.time() - 3600
+    os.utime(old, (hour_ago, hour_ago))
+
+    assert compress_pending(tmp_path, min_age=60) == [old]
+
+def test_compress_segment_tolerates_a_compressed_segment(tmp_path):
+    segment = tmp_path / 'api_calls.20261015-000000.log'
+    segment.write_text('{}\n')
+    assert compress_segment(segment) == tmp_path / (segment.name + '.gz')
+    # Another process got there first
+    assert compress_segment(segment) is None
@@ -16,477 +16,171 @@ import socket
 import hashlib
 import threading
 
-# --- Configuration ---
-LOCAL_BACKUP_DIR = Path("./backups")
-DOWNLOADS_DIR = Path("./downloads")
-LOGS_DIR = Path("./logs")
+from wpaudit.audit import audit_logger
+from wpaudit.catalog import ARCHIVE, BACKUP, backup_catalog
+from wpaudit.cache import response_cache
+from wpaudit import archive, downloads, metrics
+from wpaudit.fileserver import DOWNLOAD_EVENTS, file_server
+from wpaudit.client import BulkExecutor, ProgressRelay, audit_site, connection_pool, get_client, run_sync
+from wpaudit.limiter import get_limiter
+from wpaudit.logfiles import LOG, list_segments, log_statistics, tail_lines
+from wpaudit.logindex import audit_index
+from wpaudit.telemetry import telemetry_store
+from wpaudit.tracing import TRACE, tracer
+from wpaudit.repository import REPOSITORY, chunk_repository
+from wpaudit.resilience import get_breaker
+from wpaudit.store import backup_store, link_or_copy
+from wpaudit.config import (
+    LOCAL_BACKUP_DIR, DOWNLOADS_DIR, LOGS_DIR, BULK_MAX_WORKERS, BULK_PER_HOST_LIMIT,
+    DOWNLOAD_MAX_WORKERS, DOWNLOAD_BANDWIDTH_LIMIT, CATALOG_PAGE_SIZE, ARCHIVE_THREADS,
+    ARCHIVE_MAX_LEVELS, INLINE_DOWNLOAD_MAX_BYTES
+)
 
-# Ensure directories exist
-LOCAL_BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
+# --- Audit Context ---
+def get_client_ip():
+    """Get client IP address"""
+    try:
+        # Try to get IP from Streamlit context
+        if hasattr(st, 'context') and hasattr(st.context, 'headers'):
+            return st.context.headers.get('X-Forwarded-For', '127.0.0.1')
+        return '127.0.0.1'
+    except:
+        return '127.0.0.1'
 
-# --- Audit Logging System ---
-class AuditLogger:
-    def __init__(self):
-        self.logs_dir = LOGS_DIR
-        self.setup_loggers()
-        
-    def setup_loggers(self):
-        """Set up different loggers for different event types"""
-        # Daily audit log
-        today = datetime.datetime.now().strftime('%Y-%m-%d')
-        
-        # Main audit logger
-        self.audit_logger = logging.getLogger('audit')
-        self.audit_logger.setLevel(logging.INFO)
-        audit_handler = logging.FileHandler(self.logs_dir / f"audit_{today}.log")
-        audit_formatter = logging.Formatter('%(message)s')
-        audit_handler.setFormatter(audit_formatter)
-        if not self.audit_logger.handlers:
-            self.audit_logger.addHandler(audit_handler)
-        
-        # Security events logger
-        self.security_logger = logging.getLogger('security')
-        self.security_logger.setLevel(logging.INFO)
-        security_handler = logging.FileHandler(self.logs_dir / "security_events.log")
-        security_formatter = logging.Formatter('%(message)s')
-        security_handler.setFormatter(security_formatter)
-        if not self.security_logger.handlers:
-            self.security_logger.addHandler(security_handler)
-        
-        # Bulk operations logger
-        self.bulk_logger = logging.getLogger('bulk_operations')
-        self.bulk_logger.setLevel(logging.INFO)
-        bulk_handler = logging.FileHandler(self.logs_dir / "bulk_operations.log")
-        bulk_formatter = logging.Formatter('%(message)s')
-        bulk_handler.setFormatter(bulk_formatter)
-        if not self.bulk_logger.handlers:
-            self.bulk_logger.addHandler(bulk_handler)
-        
-        # API calls logger
-        self.api_logger = logging.getLogger('api_calls')
-        self.api_logger.setLevel(logging.INFO)
-        api_handler = logging.FileHandler(self.logs_dir / "api_calls.log")
-        api_formatter = logging.Formatter('%(message)s')
-        api_handler.setFormatter(api_formatter)
-        if not self.api_logger.handlers:
-            self.api_logger.addHandler(api_handler)
-    
-    def get_client_ip(self):
-        """Get client IP address"""
-        try:
-            # Try to get IP from Streamlit context
-            if hasattr(st, 'context') and hasattr(st.context, 'headers'):
-                return st.context.headers.get('X-Forwarded-For', '127.0.0.1')
-            return '127.0.0.1'
-        except:
-            return '127.0.0.1'
-    
-    def get_session_id(self):
-        """Generate session ID"""
-        if 'session_id' not in st.session_state:
-            st.session_state.session_id = hashlib.md5(
-                f"{datetime.datetime.now().isoformat()}{self.get_client_ip()}".encode()
-            ).hexdigest()[:16]
-        return st.session_state.session_id
-    
-    def get_username(self):
-        """Get current username"""
-        if 'credentials' in st.session_state:
-            return st.session_state.credentials.get('user', 'unknown')
-        return 'anonymous'
-    
-    def log_auth_event(self, event_type, result, details=None):
-        """Log authentication events"""
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'event_type': 'AUTHENTICATION',
-            'action': event_type,
-            'username': self.get_username(),
-            'ip_address': self.get_client_ip(),
-            'session_id': self.get_session_id(),
-            'result': result,
-            'details': details or {},
-            'risk_level': 'HIGH' if result == 'FAILURE' else 'LOW'
-        }
-        
-        self.audit_logger.info(json.dumps(log_entry))
-        if result == 'FAILURE':
-            self.security_logger.info(json.dumps(log_entry))
-    
-    def log_site_access(self, site_name, action, result, details=None):
-        """Log site access events"""
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'event_type': 'SITE_ACCESS',
-            'username': self.get_username(),
-            'ip_address': self.get_client_ip(),
-            'session_id': self.get_session_id(),
-            'site_name': site_name,
-            'action': action,
-            'result': result,
-            'details': details or {},
-            'risk_level': 'MEDIUM' if 'UPDATE' in action else 'LOW'
-        }
-        
-        self.audit_logger.info(json.dumps(log_entry))
-        if result == 'FAILURE':
-            self.security_logger.info(json.dumps(log_entry))
-    
-    def log_bulk_operation(self, operation_type, site_count, results, details=None):
-        """Log bulk operations"""
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'event_type': 'BULK_OPERATION',
-            'username': self.get_username(),
-            'ip_address': self.get_client_ip(),
-            'session_id': self.get_session_id(),
-            'operation': operation_type,
-            'sites_affected': site_count,
-            'success_count': len(results.get('success', [])),
-            'failure_count': len(results.get('errors', [])),
-            'details': details or {},
-            'risk_level': 'HIGH'
-        }
-        
-        self.audit_logger.info(json.dumps(log_entry))
-        self.bulk_logger.info(json.dumps(log_entry))
-        
-        # Log security event if significant failures
-        if len(results.get('errors', [])) > site_count * 0.5:
-            self.security_logger.info(json.dumps({**log_entry, 'alert': 'HIGH_FAILURE_RATE'}))
-    
-    def log_api_call(self, endpoint, action, result, response_time=None, details=None):
-        """Log API calls"""
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'event_type': 'API_CALL',
-            'username': self.get_username(),
-            'ip_address': self.get_client_ip(),
-            'session_id': self.get_session_id(),
-            'endpoint': endpoint,
-            'action': action,
-            'result': result,
-            'response_time': response_time,
-            'details': details or {},
-            'risk_level': 'MEDIUM' if result == 'FAILURE' else 'LOW'
-        }
-        
-        self.api_logger.info(json.dumps(log_entry))
-        if result == 'FAILURE':
-            self.security_logger.info(json.dumps(log_entry))
-    
-    def log_file_operation(self, operation_type, file_path, result, details=None):
-        """Log file operations"""
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'event_type': 'FILE_OPERATION',
-            'username': self.get_username(),
-            'ip_address': self.get_client_ip(),
-            'session_id': self.get_session_id(),
-            'operation': operation_type,
-            'file_path': str(file_path),
-            'result': result,
-            'details': details or {},
-            'risk_level': 'LOW'
-        }
-        
-        self.audit_logger.info(json.dumps(log_entry))
-    
-    def log_export_operation(self, export_type, record_count, result, details=None):
-        """Log export operations"""
-        log_entry = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'event_type': 'EXPORT_OPERATION',
-            'username': self.get_username(),
-            'ip_address': self.get_client_ip(),
-            'session_id': self.get_session_id(),
-            'export_type': export_type,
-            'record_count': record_count,
-            'result': result,
-            'details': details or {},
-            'risk_level': 'MEDIUM'
-        }
-        
-        self.audit_logger.info(json.dumps(log_entry))
+def get_session_id():
+    """Generate session ID"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = hashlib.md5(
+            f"{datetime.datetime.now().isoformat()}{get_client_ip()}".encode()
+        ).hexdigest()[:16]
+    return st.session_state.session_id
 
-# Global audit logger instance
-audit_logger = AuditLogger()
+def bind_audit_context():
+    """Record the current Streamlit user, IP and session on audit entries"""
+    username = 'anonymous'
+    if 'credentials' in st.session_state:
+        username = st.session_state.credentials.get('user', 'unknown')
+    audit_logger.bind_context(username=username, ip_address=get_client_ip(), session_id=get_session_id())
 
 # --- Softaculous API Functions ---
+# Thin synchronous wrappers over the async client in wpaudit.client
+def current_client():
+    """Get the Softaculous client for the logged-in credentials"""
+    return get_client(st.session_state.credentials)
+
 def make_softaculous_request(act, post_data=None, additional_params=None):
     """Make authenticated request to Softaculous API"""
-    start_time = datetime.datetime.now()
-    
     # Get credentials from session state
     if 'credentials' not in st.session_state:
         audit_logger.log_api_call('softaculous', act, 'FAILURE', 
                                 details={'error': 'No credentials available'})
         return None, "Not authenticated"
     
-    creds = st.session_state.credentials
-    softaculous_path = "/frontend/jupiter/softaculous/index.live.php"
-    
-    base_url = f"https://{creds['user']}:{creds['pass']}@{creds['host']}:{creds['port']}{softaculous_path}"
-    
-    params = {
-        'act': act,
-        'api': 'serialize'
-    }
-    
-    if additional_params:
-        params.update(additional_params)
-    
-    try:
-        if post_data:
-            response = requests.post(base_url, params=params, data=post_data, 
-                                   verify=False, timeout=30)
-        else:
-            response = requests.get(base_url, params=params, 
-                                  verify=False, timeout=30)
-        
-        response_time = (datetime.datetime.now() - start_time).total_seconds()
-        
-        if response.status_code == 200:
-            # Parse serialized PHP response
-            import phpserialize
-            result = phpserialize.loads(response.content)
-            
-            audit_logger.log_api_call('softaculous', act, 'SUCCESS', 
-                                    response_time=response_time,
-                                    details={'params': params, 'response_size': len(response.content)})
-            return result, None
-        else:
-            audit_logger.log_api_call('softaculous', act, 'FAILURE', 
-                                    response_time=response_time,
-                                    details={'status_code': response.status_code, 'error': response.text})
-            return None, f"HTTP {response.status_code}: {response.text}"
-    
-    except Exception as e:
-        response_time = (datetime.datetime.now() - start_time).total_seconds()
-        audit_logger.log_api_call('softaculous', act, 'FAILURE', 
-                                response_time=response_time,
-                                details={'error': str(e)})
-        return None, str(e)
+    return run_sync(current_client().request(act, post_data, additional_params))
 
 def list_wordpress_installations():
     """List all WordPress installations"""
-    result, error = make_softaculous_request('wordpress')
-    if error:
-        return None, error
-    
-    installations = []
-    if result and 'installations' in result:
-        for insid, install_data in result['installations'].items():
-            installations.append({
-                'insid': insid,
-                'domain': install_data.get('softurl', ''),
-                'path': install_data.get('softpath', ''),
-                'version': install_data.get('ver', ''),
-                'user': install_data.get('cuser', ''),
-                'display_name': f"{install_data.get('softdomain', '')}/{install_data.get('softdirectory', '')}"
-            })
-    
-    return installations, None
+    return run_sync(current_client().list_wordpress_installations())
 
 def get_plugins_for_installation(insid):
     """Get all plugins for a specific WordPress installation"""
-    post_data = {
-        'insid': insid,
-        'type': 'plugins',
-        'list': '1'
-    }
-    
-    result, error = make_softaculous_request('wordpress', post_data)
-    if error:
-        audit_logger.log_site_access(f"Site_{insid}", 'PLUGIN_LIST', 'FAILURE', 
-                                   details={'error': error})
-        return None, error
-    
-    plugins = []
-    if result and 'plugins' in result:
-        for plugin_path, plugin_data in result['plugins'].items():
-            plugins.append({
-                'name': plugin_data.get('Name', 'Unknown'),
-                'slug': plugin_path,
-                'version': plugin_data.get('Version', ''),
-                'active': plugin_data.get('active', False),
-                'update_available': plugin_data.get('update_available', False),
-                'new_version': plugin_data.get('new_version', ''),
-                'description': plugin_data.get('Description', '')
-            })
-    
-    audit_logger.log_site_access(f"Site_{insid}", 'PLUGIN_LIST', 'SUCCESS', 
-                               details={'plugin_count': len(plugins)})
-    return plugins, None
+    return run_sync(current_client().get_plugins_for_installation(insid))
 
 def update_plugin(insid, plugin_slug=None):
     """Update a specific plugin or all plugins"""
-    post_data = {
-        'insid': insid,
-        'type': 'plugins'
-    }
-    
-    if plugin_slug:
-        post_data['slug'] = plugin_slug
-        post_data['update'] = '1'
-        action = f'PLUGIN_UPDATE_{plugin_slug}'
-    else:
-        post_data['bulk_update'] = '1'
-        action = 'PLUGIN_BULK_UPDATE'
-    
-    result, error = make_softaculous_request('wordpress', post_data)
-    
-    if error:
-        audit_logger.log_site_access(f"Site_{insid}", action, 'FAILURE', 
-                                   details={'error': error})
-    else:
-        audit_logger.log_site_access(f"Site_{insid}", action, 'SUCCESS', 
-                                   details={'plugin_slug': plugin_slug})
-    
-    return result, error
+    return run_sync(current_client().update_plugin(insid, plugin_slug))
 
 def activate_plugin(insid, plugin_slug):
     """Activate a plugin"""
-    post_data = {
-        'insid': insid,
-        'type': 'plugins',
-        'slug': plugin_slug,
-        'activate': '1'
-    }
-    
-    result, error = make_softaculous_request('wordpress', post_data)
-    
-    if error:
-        audit_logger.log_site_access(f"Site_{insid}", f'PLUGIN_ACTIVATE_{plugin_slug}', 'FAILURE', 
-                                   details={'error': error})
-    else:
-        audit_logger.log_site_access(f"Site_{insid}", f'PLUGIN_ACTIVATE_{plugin_slug}', 'SUCCESS')
-    
-    return result, error
+    return run_sync(current_client().activate_plugin(insid, plugin_slug))
 
 def deactivate_plugin(insid, plugin_slug):
     """Deactivate a plugin"""
-    post_data = {
-        'insid': insid,
-        'type': 'plugins',
-        'slug': plugin_slug,
-        'deactivate': '1'
-    }
-    
-    result, error = make_softaculous_request('wordpress', post_data)
-    
-    if error:
-        audit_logger.log_site_access(f"Site_{insid}", f'PLUGIN_DEACTIVATE_{plugin_slug}', 'FAILURE', 
-                                   details={'error': error})
-    else:
-        audit_logger.log_site_access(f"Site_{insid}", f'PLUGIN_DEACTIVATE_{plugin_slug}', 'SUCCESS')
-    
-    return result, error
+    return run_sync(current_client().deactivate_plugin(insid, plugin_slug))
 
 def install_plugin(insid, plugin_slug):
     """Install a plugin from WordPress.org"""
-    post_data = {
-        'insid': insid,
-        'type': 'plugins',
-        'slug': plugin_slug,
-        'install': '1'
-    }
-    
-    result, error = make_softaculous_request('wordpress', post_data)
-    return result, error
+    return run_sync(current_client().install_plugin(insid, plugin_slug))
 
 def create_backup(insid):
     """Create a backup for a WordPress installation"""
-    post_data = {
-        'backupins': '1',
-        'backup_dir': '1',
-        'backup_datadir': '1',
-        'backup_db': '1'
-    }
-    
-    result, error = make_softaculous_request('backup', post_data, {'insid': insid})
-    
-    if error:
-        audit_logger.log_site_access(f"Site_{insid}", 'BACKUP_CREATE', 'FAILURE', 
-                                   details={'error': error})
-    else:
-        audit_logger.log_site_access(f"Site_{insid}", 'BACKUP_CREATE', 'SUCCESS')
-    
-    return result, error
+    return run_sync(current_client().create_backup(insid))
 
 def list_backups():
     """List all backups"""
-    result, error = make_softaculous_request('backups')
-    return result, error
+    return run_sync(current_client().list_backups())
 
 def download_backup(backup_filename):
     """Download a backup file"""
-    params = {'download': backup_filename}
-    result, error = make_softaculous_request('backups', additional_params=params)
-    return result, error
+    return run_sync(current_client().download_backup(backup_filename))
 
 def delete_backup(backup_filename):
     """Delete a backup file"""
-    params = {'remove': backup_filename}
-    result, error = make_softaculous_request('backups', additional_params=params)
-    return result, error
+    return run_sync(current_client().delete_backup(backup_filename))
 
 def upgrade_wordpress_installation(insid):
     """Upgrade WordPress installation"""
-    post_data = {'softsubmit': '1'}
-    result, error = make_softaculous_request('upgrade', post_data, {'insid': insid})
-    return result, error
+    return run_sync(current_client().upgrade_wordpress_installation(insid))
 
-def download_backup_file(backup_filename):
+def download_backup_file(backup_filename, progress_callback=None):
     """Download a backup file to local machine"""
-    try:
-        # Get the backup file content via Softaculous API
-        params = {'download': backup_filename}
-        result, error = make_softaculous_request('backups', additional_params=params)
-        
-        if error:
-            audit_logger.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE', 
-                                          details={'error': error})
-            return None, error
-        
-        # Save to local backup directory
-        local_file_path = LOCAL_BACKUP_DIR / backup_filename
-        
-        # If result contains binary data, save it
-        if result and isinstance(result, bytes):
-            with open(local_file_path, 'wb') as f:
-                f.write(result)
-            
-            audit_logger.log_file_operation('BACKUP_DOWNLOAD', local_file_path, 'SUCCESS', 
-                                          details={'file_size': len(result)})
-            return local_file_path, None
+    relay = ProgressRelay(progress_callback)
+    return relay.run(downloads.download_backup_file(current_client(), backup_filename, relay))
+
+def file_download_button(kind, path, label="⬇️ Download", key=None, mime="application/octet-stream"):
+    """Download control that only reads the file when the user clicks it"""
+    path = Path(path)
+    # Streamed from the local file server, which also answers Range requests
+    if file_server.links_enabled and file_server.ensure_started():
+        st.link_button(label, file_server.url_for(kind, path.name))
+        return
+    
+    # Without it Streamlit holds the whole file in memory, so only small files go that way
+    if kind == REPOSITORY:
+        entry = chunk_repository.lookup(path.name)
+        size = entry['size'] if entry else 0
+    else:
+        size = path.stat().st_size if path.exists() else 0
+    if size > INLINE_DOWNLOAD_MAX_BYTES:
+        reason = f": {file_server.error}" if file_server.error else ""
+        st.caption(f"⚠️ {path.name} ({size / (1024*1024):.1f} MB) is too large to download "
+                   f"without the file server{reason}")
+        return
+    
+    # Let Streamlit call the reader on click instead of every rerun
+    context = audit_logger.get_context()
+    
+    def read_file():
+        audit_logger.bind_context(**context)
+        if kind == REPOSITORY:
+            data = b''.join(chunk_repository.iter_backup(path.name))
         else:
-            audit_logger.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE', 
-                                          details={'error': 'No backup data received'})
-            return None, "No backup data received"
-            
-    except Exception as e:
-        audit_logger.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE', 
-                                      details={'error': str(e)})
-        return None, str(e)
+            data = path.read_bytes()
+        audit_logger.log_file_operation(DOWNLOAD_EVENTS[kind], path, 'SUCCESS',
+                                        details={'file_size': len(data)})
+        return data
+    
+    st.download_button(label=label, data=read_file, file_name=path.name, mime=mime, key=key)
 
-def get_backup_file_info(backup_filename):
-    """Get information about a backup file"""
-    try:
-        file_path = LOCAL_BACKUP_DIR / backup_filename
-        if file_path.exists():
-            stat = file_path.stat()
-            return {
-                'name': backup_filename,
-                'size': stat.st_size,
-                'modified': datetime.datetime.fromtimestamp(stat.st_mtime),
-                'path': file_path
-            }
-        return None
-    except Exception:
-        return None
+# --- Local Catalog ---
+CATALOG_SORTS = {
+    "Newest first": ('mtime', True),
+    "Oldest first": ('mtime', False),
+    "Largest first": ('size', True),
+    "Name": ('name', False)
+}
+
+def catalog_page(kind, total, key_prefix):
+    """Sort and page controls for a catalog listing; returns the rows for the chosen page"""
+    page_count = max((total + CATALOG_PAGE_SIZE - 1) // CATALOG_PAGE_SIZE, 1)
+    col1, col2 = st.columns(2)
+    with col1:
+        sort_label = st.selectbox("Sort by", list(CATALOG_SORTS), key=f"{key_prefix}_sort")
+    with col2:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, value=1, step=1, key=f"{key_prefix}_page")
+    page = min(int(page), page_count)
+    sort, descending = CATALOG_SORTS[sort_label]
+    return backup_catalog.query(kind, sort, descending, CATALOG_PAGE_SIZE, (page - 1) * CATALOG_PAGE_SIZE)
 
 def export_sites_to_csv(installations):
     """Export WordPress installations to CSV format"""
@@ -541,68 +235,249 @@ def create_detailed_site_report(installations):
         report.append("")
     
     return "\n".join(report)
+
+def create_compressed_archive(backup_files, archive_name, compression_type='zip', level=None,
+                              threads=ARCHIVE_THREADS):
     """Create a compressed archive from multiple backup files"""
     try:
         archive_path = DOWNLOADS_DIR / f"{archive_name}.{compression_type}"
         
-        if compression_type == 'zip':
-            with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for backup_file in backup_files:
-                    file_path = LOCAL_BACKUP_DIR / backup_file
-                    if file_path.exists():
-                        zipf.write(file_path, backup_file)
-        
-        elif compression_type == 'tar.gz':
-            with tarfile.open(archive_path, 'w:gz') as tar:
-                for backup_file in backup_files:
-                    file_path = LOCAL_BACKUP_DIR / backup_file
-                    if file_path.exists():
-                        tar.add(file_path, arcname=backup_file)
+        # An archive with the same format, level and member contents already exists: link it
+        archive_key = backup_store.archive_key(backup_files, compression_type, level)
+        existing_archive = backup_store.find_archive(archive_key)
+        if existing_archive:
+            link_or_copy(existing_archive, archive_path)
+            backup_store.record_archive(archive_key, archive_path, backup_files)
+            return {'path': archive_path, 'reused': existing_archive.name}, None
+        
+        files = [(LOCAL_BACKUP_DIR / backup_file, backup_file) for backup_file in backup_files
+                 if (LOCAL_BACKUP_DIR / backup_file).exists()]
+        stats, error = archive.create_archive(files, archive_path, compression_type, level, threads)
+        if error:
+            audit_logger.log_file_operation('ARCHIVE_CREATE', archive_path, 'FAILURE', details={'error': error})
+            return None, error
         
-        return archive_path, None
+        audit_logger.log_file_operation('ARCHIVE_CREATE', archive_path, 'SUCCESS',
+                                        details={key: value for key, value in stats.items() if key != 'path'})
+        backup_store.record_archive(archive_key, archive_path, backup_files)
+        return stats, None
     
     except Exception as e:
         return None, str(e)
 
-def bulk_download_backups(backup_list, progress_callback=None):
+def archive_settings(key_prefix, compression_type):
+    """Compression level and thread controls for archive creation in the given format"""
+    max_level = ARCHIVE_MAX_LEVELS[compression_type]
+    with st.expander("⚙️ Archive settings"):
+        col1, col2 = st.columns(2)
+        with col1:
+            # Keyed by format so switching formats never carries over an out-of-range level
+            level = st.number_input("Compression level (0 = format default)", min_value=0, max_value=max_level,
+                                    value=0, key=f"{key_prefix}_{compression_type}_level",
+                                    help=f"{compression_type}: 1-{max_level}")
+        with col2:
+            threads = st.number_input("Compression threads", min_value=1, max_value=64,
+                                      value=ARCHIVE_THREADS, key=f"{key_prefix}_threads")
+    return {'level': level or None, 'threads': threads}
+
+def show_archive_result(result):
+    """Success message with compression throughput"""
+    archive_path = result['path']
+    if result.get('reused'):
+        st.success(f"✅ Archive created: {archive_path.name}")
+        st.caption(f"Same backups already archived at this level in {result['reused']}; "
+                   f"linked instead of recompressing")
+        return
+    st.success(f"✅ Archive created: {archive_path.name}")
+    st.caption(f"{result['bytes_in'] / (1024*1024):.1f} MB in {result['duration']:.1f}s "
+               f"({result['mb_per_s']:.1f} MB/s, {result['threads']} threads, level {result['level']}), "
+               f"{result['ratio']:.0%} of original size, "
+               f"{result['stored_members']} already-compressed members stored as-is")
+
+def bulk_download_backups(backup_list, progress_callback=None, max_workers=DOWNLOAD_MAX_WORKERS,
+                          bandwidth_limit=DOWNLOAD_BANDWIDTH_LIMIT, smallest_first=False, use_repository=False):
     """Download multiple backups from server"""
-    results = {'success': [], 'errors': []}
+    # Sizes and backup times come from the list_backups payload already in session state
+    metadata = downloads.backup_metadata(st.session_state.get('available_backups'))
+    sizes = {name: meta['size'] for name, meta in metadata.items()} if smallest_first else None
+    relay = ProgressRelay(progress_callback)
+    return relay.run(downloads.bulk_download_backups(current_client(), backup_list, relay,
+                                                     max_workers, bandwidth_limit, sizes,
+                                                     metadata=metadata,
+                                                     repository=chunk_repository if use_repository else None))
+
+def stream_backups_to_archive(backup_list, archive_name, compression_type, level=None, threads=ARCHIVE_THREADS,
+                              progress_callback=None, bandwidth_limit=DOWNLOAD_BANDWIDTH_LIMIT):
+    """Stream server backups straight into a new archive without keeping local copies"""
+    archive_path = DOWNLOADS_DIR / f"{archive_name}.{compression_type}"
+    metadata = downloads.backup_metadata(st.session_state.get('available_backups'))
+    relay = ProgressRelay(progress_callback)
+    result, error = relay.run(downloads.stream_backups_to_archive(
+        current_client(), backup_list, archive_path, compression_type, level, threads, relay,
+        metadata=metadata, bandwidth_limit=bandwidth_limit))
+    if result:
+        backup_store.record_archive(None, archive_path, backup_list)
+    return result, error
+
+def show_repository_ingest(ingested, errors=None):
+    """Dedup summary for backups just chunked into the repository"""
+    for backup_name, error in (errors or {}).items():
+        st.warning(f"🧩 Kept the full copy, repository ingest failed for {backup_name}: {error}")
+    if not ingested:
+        return
+    total_bytes = sum(stats['bytes'] for stats in ingested)
+    new_bytes = sum(stats['new_bytes'] for stats in ingested)
+    duration = sum(stats['duration'] for stats in ingested)
+    st.caption(f"🧩 Repository: {total_bytes / (1024*1024):.1f} MB ingested at "
+               f"{total_bytes / max(duration, 1e-6) / (1024*1024):.1f} MB/s, "
+               f"{(total_bytes - new_bytes) / (1024*1024):.1f} MB already stored as chunks")
+
+def make_download_progress(total_files):
+    """Overall progress bar plus one live status line per file"""
+    progress_bar = st.progress(0)
+    file_lines = {}
+    finished = set()
+    status_icons = {'queued': '⏳', 'downloading': '📥', 'done': '✅', 'skipped': '⏭️', 'failed': '❌'}
+    
+    def update_progress(filename, bytes_done, total_bytes, bytes_per_second, status):
+        if filename not in file_lines:
+            file_lines[filename] = st.empty()
+        if status in ('done', 'skipped', 'failed'):
+            finished.add(filename)
+            progress_bar.progress(len(finished) / total_files)
+        size_text = f"{bytes_done / (1024*1024):.1f}"
+        if total_bytes:
+            size_text += f" / {total_bytes / (1024*1024):.1f}"
+        file_lines[filename].text(f"{status_icons.get(status, '')} {filename}: {size_text} MB "
+                                  f"at {bytes_per_second / (1024*1024):.1f} MB/s")
+    
+    return update_progress
+
+# --- Bulk Operations ---
+def remember_trace(trace):
+    """Audit an exported bulk-run trace and keep it for the download link"""
+    if trace is None:
+        return
+    audit_logger.log_file_operation('TRACE_EXPORT', trace.path, 'SUCCESS',
+                                    details={'events': len(trace.events), 'dropped': trace.dropped})
+    st.session_state.last_trace = str(trace.path)
+
+def run_bulk_audit(domains, audit_options, max_workers=BULK_MAX_WORKERS, per_host_limit=BULK_PER_HOST_LIMIT):
+    """Run bulk audit on selected domains"""
+    total_sites = len(domains)
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    results = {
+        'success': [],
+        'errors': []
+    }
     
-    for i, backup_filename in enumerate(backup_list):
-        if progress_callback:
-            progress_callback(i, len(backup_list), backup_filename)
+    # Log start of bulk operation
+    audit_logger.log_bulk_operation('BULK_AUDIT_START', total_sites, 
+                                   {'success': [], 'errors': []}, 
+                                   details={'audit_options': audit_options,
+                                            'max_workers': max_workers,
+                                            'per_host_limit': per_host_limit})
+    
+    client = current_client()
+    executor = BulkExecutor(max_workers, per_host_limit)
+    site_fn = lambda domain: audit_site(client, domain, audit_options)
+    on_error = lambda domain, e: [(False, f"Unexpected error for {domain['display_name']}: {e}")]
+    
+    # Sites run concurrently on the event loop; results are collected
+    # on the script thread as each site finishes
+    site_results = executor.run(domains, site_fn, host=client.credentials['host'], on_error=on_error,
+                                operation='audit')
+    for completed, (domain, outcomes) in enumerate(site_results, 1):
+        with tracer.span('render', 'streamlit', site=domain['display_name']):
+            status_text.text(f"Processed {domain['display_name']} ({completed}/{total_sites})")
+            
+            for ok, message in outcomes:
+                if ok:
+                    st.success(f"✅ {message}")
+                    results['success'].append(message)
+                else:
+                    st.error(message)
+                    results['errors'].append(message)
+            
+            progress_bar.progress(completed / total_sites)
+    
+    # Log completion of bulk operation
+    audit_logger.log_bulk_operation('BULK_AUDIT_COMPLETE', total_sites, results, 
+                                   details={'audit_options': audit_options,
+                                            'max_workers': max_workers,
+                                            'per_host_limit': per_host_limit})
+    
+    # Show final results
+    status_text.text("Bulk audit complete!")
+    
+    with st.expander("📊 Bulk Audit Results Summary"):
+        st.write(f"**✅ Successful Operations:** {len(results['success'])}")
+        for success in results['success']:
+            st.write(f"• {success}")
         
-        local_file, error = download_backup_file(backup_filename)
-        if error:
-            results['errors'].append(f"{backup_filename}: {error}")
-        else:
-            results['success'].append(backup_filename)
+        if results['errors']:
+            st.write(f"**❌ Failed Operations:** {len(results['errors'])}")
+            for error in results['errors']:
+                st.write(f"• {error}")
+    
+    st.success("🎉 Bulk audit process completed!")
+
+def run_bulk_plugin_update(domains, max_workers=BULK_MAX_WORKERS, per_host_limit=BULK_PER_HOST_LIMIT):
+    """Run plugin updates on all selected domains"""
+    total_sites = len(domains)
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    success_count = 0
+    error_count = 0
+    results = {'success': [], 'errors': []}
+    
+    # Log start of bulk operation
+    audit_logger.log_bulk_operation('BULK_PLUGIN_UPDATE_START', total_sites, results,
+                                   details={'max_workers': max_workers,
+                                            'per_host_limit': per_host_limit})
+    
+    client = current_client()
+    executor = BulkExecutor(max_workers, per_host_limit)
+    
+    async def site_fn(domain):
+        with tracer.span('site', 'bulk', new_lane=True, site=domain['display_name'], insid=domain['insid']):
+            return await client.update_plugin(domain['insid'])
+    
+    on_error = lambda domain, e: (None, str(e))
+    
+    site_results = executor.run(domains, site_fn, host=client.credentials['host'], on_error=on_error,
+                                operation='plugin_update')
+    for completed, (domain, (result, error)) in enumerate(site_results, 1):
+        with tracer.span('render', 'streamlit', site=domain['display_name']):
+            status_text.text(f"Updated plugins for {domain['display_name']} ({completed}/{total_sites})")
+            
+            if error:
+                st.error(f"❌ Plugin update failed for {domain['display_name']}: {error}")
+                error_count += 1
+                results['errors'].append(f"{domain['display_name']}: {error}")
+            else:
+                st.success(f"✅ Plugins updated for {domain['display_name']}")
+                success_count += 1
+                results['success'].append(domain['display_name'])
+            
+            progress_bar.progress(completed / total_sites)
+    
+    # Log completion of bulk operation
+    audit_logger.log_bulk_operation('BULK_PLUGIN_UPDATE_COMPLETE', total_sites, results,
+                                   details={'max_workers': max_workers,
+                                            'per_host_limit': per_host_limit})
     
-    return results
+    status_text.text("Plugin updates complete!")
+    st.success(f"🎉 Plugin updates completed! ✅ {success_count} successful, ❌ {error_count} failed")
 
 # --- Authentication Functions ---
 def test_cpanel_connection(host, port, user, password):
     """Test if cPanel credentials work"""
-    try:
-        base_url = f"https://{user}:{password}@{host}:{port}/frontend/jupiter/softaculous/index.live.php"
-        params = {'act': 'home', 'api': 'json'}
-        
-        response = requests.get(base_url, params=params, verify=False, timeout=10)
-        
-        if response.status_code == 200:
-            audit_logger.log_auth_event('LOGIN_TEST', 'SUCCESS', 
-                                      details={'host': host, 'port': port, 'user': user})
-            return True
-        else:
-            audit_logger.log_auth_event('LOGIN_TEST', 'FAILURE', 
-                                      details={'host': host, 'port': port, 'user': user, 
-                                             'status_code': response.status_code})
-            return False
-    except Exception as e:
-        audit_logger.log_auth_event('LOGIN_TEST', 'FAILURE', 
-                                  details={'host': host, 'port': port, 'user': user, 
-                                         'error': str(e)})
-        return False
+    creds = {'host': host, 'port': port, 'user': user, 'pass': password}
+    return run_sync(get_client(creds).test_connection())
 
 def show_login_screen():
     """Show the login/configuration screen"""
@@ -637,6 +512,7 @@ def show_login_screen():
                         'user': user,
                         'pass': password
                     }
+                    bind_audit_context()
                     
                     # Log successful login
                     audit_logger.log_auth_event('LOGIN', 'SUCCESS', 
@@ -658,9 +534,83 @@ def show_main_app():
         st.write(f"**Host:** {st.session_state.credentials['host']}")
         st.write(f"**User:** {st.session_state.credentials['user']}")
         
+        pool_stats = connection_pool.stats(st.session_state.credentials)
+        st.write("### 🔌 Connection Pool")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Opened", pool_stats['opened'])
+        with col2:
+            st.metric("Reused", pool_stats['reused'])
+        
+        breaker_state = get_breaker(st.session_state.credentials['host']).snapshot()
+        breaker_icons = {'CLOSED': '🟢', 'HALF_OPEN': '🟡', 'OPEN': '🔴'}
+        st.write(f"**Circuit Breaker:** {breaker_icons.get(breaker_state['state'], '')} {breaker_state['state']} "
+                 f"({breaker_state['error_rate']:.0%} errors)")
+        
+        limiter_state = get_limiter(st.session_state.credentials['host']).snapshot()
+        st.write("### 🚦 Adaptive Concurrency")
+        st.metric("Concurrency Limit", limiter_state['limit'],
+                  help="In-flight Softaculous requests allowed; grows while latency is flat, halves on slowdowns or 429/503")
+        if len(limiter_state['history']) > 1:
+            st.line_chart({'limit': [entry['limit'] for entry in limiter_state['history']]})
+        with st.expander("Limit history"):
+            for entry in reversed(limiter_state['history'][-20:]):
+                changed_at = datetime.datetime.fromtimestamp(entry['timestamp']).strftime('%H:%M:%S')
+                st.write(f"{changed_at} → {entry['limit']} ({entry['reason']})")
+        
+        cache_stats = response_cache.stats()
+        st.write("### 🗃️ Response Cache")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Hits", cache_stats['hits'])
+        with col2:
+            st.metric("Misses", cache_stats['misses'])
+        st.caption(f"Hit rate {cache_stats['hit_rate']:.0%} · {cache_stats['entries']} entries · "
+                   f"{cache_stats['invalidations']} invalidated · {cache_stats['evictions']} evicted")
+        if st.button("🧹 Clear Cache"):
+            response_cache.clear()
+            st.rerun()
+        
+        st.write("### 📊 Metrics")
+        latency = metrics.api_request_seconds.summary(group_by=('act',))
+        if latency:
+            st.dataframe([{'act': row['act'], 'calls': row['count'], 'p50 (s)': round(row['p50'], 3),
+                           'p95 (s)': round(row['p95'], 3), 'p99 (s)': round(row['p99'], 3)} for row in latency],
+                         hide_index=True)
+        else:
+            st.caption("No Softaculous requests yet in this process")
+        requests_by_host = {}
+        for (act, host, result), count in metrics.api_requests.values().items():
+            totals = requests_by_host.setdefault(host, {'host': host, 'success': 0, 'failure': 0})
+            totals[result] += count
+        if requests_by_host:
+            st.dataframe(list(requests_by_host.values()), hide_index=True)
+        downloaded = sum(metrics.download_bytes.values().values())
+        archive_rates = metrics.archive_throughput.values()
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Downloaded", f"{downloaded / (1024*1024):.1f} MB")
+        with col2:
+            st.metric("Audit Queue", metrics.audit_queue_depth.values().get((), 0))
+        if archive_rates:
+            st.caption("Last archive: " + " · ".join(f"{fmt} {rate:.1f} MB/s"
+                                                     for (fmt,), rate in archive_rates.items()))
+        bulk_durations = metrics.bulk_operation_seconds.summary(percentiles=(50,))
+        if bulk_durations:
+            st.caption("Bulk operations: " + " · ".join(f"{row['operation']} ×{row['count']}, median {row['p50']:.1f}s"
+                                                        for row in bulk_durations))
+        if file_server.ensure_started() and file_server.metrics_url:
+            st.caption(f"[Prometheus endpoint]({file_server.metrics_url})")
+            if file_server.port_error:
+                st.caption(f"⚠️ {file_server.port_error}")
+        
         if st.button("🚪 Logout"):
             # Log logout event
-            audit_logger.log_auth_event('LOGOUT', 'SUCCESS')
+            audit_logger.log_auth_event('LOGOUT', 'SUCCESS', details={'connection_pool': pool_stats})
+            audit_logger.flush()
+            
+            # Tear down the keep-alive connections for this session
+            run_sync(current_client().close())
             
             for key in ['credentials', 'sftp_credentials', 'installations', 'selected_installation', 'plugins']:
                 if key in st.session_state:
@@ -670,6 +620,9 @@ def show_main_app():
 # --- Streamlit UI ---
 st.set_page_config(page_title="CLAS IT WordPress Audit", layout="wide")
 
+# Attribute audit entries from this run to the current user and session
+bind_audit_context()
+
 # Always show the title and instructions at the top
 st.title("🔧 CLAS IT WordPress Audit & Plugin Management Tool")
 st.markdown("### Enhanced with Advanced Download Options")
@@ -1136,6 +1089,20 @@ else:
         default=["Update all plugins", "Create backups"]
     )
     
+    # Concurrency settings
+    col1, col2 = st.columns(2)
+    with col1:
+        bulk_max_workers = st.number_input("Parallel sites", min_value=1, max_value=64,
+                                           value=BULK_MAX_WORKERS,
+                                           help="Maximum number of sites processed at the same time")
+    with col2:
+        bulk_per_host_limit = st.number_input("Parallel sites per cPanel host", min_value=1, max_value=64,
+                                              value=BULK_PER_HOST_LIMIT,
+                                              help="Maximum number of sites processed at the same time on one server")
+    record_trace = st.checkbox("🧵 Record a trace of the next bulk run",
+                               help="Saves every site, step and API call as Chrome trace JSON; "
+                                    "open it in ui.perfetto.dev or chrome://tracing for a flame chart")
+    
     # Bulk operation buttons
     col1, col2 = st.columns(2)
     
@@ -1144,11 +1111,21 @@ else:
             if not audit_options:
                 st.warning("Please select at least one audit step")
             else:
-                run_bulk_audit(selected_domains, audit_options)
+                with tracer.recording('bulk_audit', enabled=record_trace) as trace:
+                    run_bulk_audit(selected_domains, audit_options, bulk_max_workers, bulk_per_host_limit)
+                remember_trace(trace)
     
     with col2:
         if st.button("🔄 Update All Plugins (All Selected Domains)"):
-            run_bulk_plugin_update(selected_domains)
+            with tracer.recording('bulk_plugin_update', enabled=record_trace) as trace:
+                run_bulk_plugin_update(selected_domains, bulk_max_workers, bulk_per_host_limit)
+            remember_trace(trace)
+    
+    if 'last_trace' in st.session_state and Path(st.session_state.last_trace).is_file():
+        trace_path = Path(st.session_state.last_trace)
+        st.caption(f"🧵 Last trace: {trace_path.name} ({trace_path.stat().st_size / 1024:.0f} KB)")
+        file_download_button(TRACE, trace_path, "⬇️ Download Trace", key="download_last_trace",
+                             mime="application/json")
 
     st.markdown("---")
 
@@ -1201,90 +1178,133 @@ else:
             help="Select one or more backups to download"
         )
         
+        # Download scheduling
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            download_workers = st.number_input("Parallel downloads", min_value=1, max_value=16,
+                                               value=DOWNLOAD_MAX_WORKERS)
+        with col2:
+            bandwidth_mb = st.number_input("Bandwidth cap (MB/s, 0 = unlimited)", min_value=0.0,
+                                           value=DOWNLOAD_BANDWIDTH_LIMIT / (1024*1024), step=1.0)
+        with col3:
+            smallest_first = st.checkbox("Smallest backups first", value=True,
+                                         help="Start small backups before large ones so most finish sooner")
+        with col4:
+            use_repository = st.checkbox("Store in dedup repository", value=False,
+                                         help="Keep only chunks not already stored instead of full copies")
+        download_options = {
+            'max_workers': download_workers,
+            'bandwidth_limit': int(bandwidth_mb * 1024 * 1024),
+            'smallest_first': smallest_first,
+            'use_repository': use_repository
+        }
+        st.caption("Downloads are checked against the size the server reports. Softaculous sends no checksum, "
+                   "so contents are not verified; each file's SHA-256 is recorded in the audit log.")
+        
         # Download options
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             if st.button("📥 Download Selected") and selected_server_backups:
-                progress_bar = st.progress(0)
+                update_progress = make_download_progress(len(selected_server_backups))
                 status_text = st.empty()
                 
-                def update_progress(current, total, filename):
-                    progress_bar.progress(current / total)
-                    status_text.text(f"Downloading {filename} ({current+1}/{total})")
-                
                 with st.spinner("Downloading selected backups..."):
-                    results = bulk_download_backups(selected_server_backups, update_progress)
+                    results = bulk_download_backups(selected_server_backups, update_progress, **download_options)
                     
                     if results['success']:
                         st.success(f"✅ Downloaded {len(results['success'])} backups successfully!")
                         for backup in results['success']:
                             st.write(f"• {backup}")
                     
+                    if results['skipped']:
+                        st.info(f"⏭️ {len(results['skipped'])} backups already downloaded and unchanged")
+                    show_repository_ingest(results['repository'], results['repository_errors'])
+                    
                     if results['errors']:
                         st.error(f"❌ {len(results['errors'])} downloads failed:")
-                        for error in results['errors']:
-                            st.write(f"• {error}")
+                        for backup_name, error in results['errors'].items():
+                            st.write(f"• {backup_name}: {error}")
                 
                 status_text.text("Download complete!")
         
         with col2:
             if st.button("📥 Download All") and server_backup_list:
-                progress_bar = st.progress(0)
+                update_progress = make_download_progress(len(server_backup_list))
                 status_text = st.empty()
                 
-                def update_progress(current, total, filename):
-                    progress_bar.progress(current / total)
-                    status_text.text(f"Downloading {filename} ({current+1}/{total})")
-                
                 with st.spinner("Downloading all backups..."):
-                    results = bulk_download_backups(server_backup_list, update_progress)
+                    results = bulk_download_backups(server_backup_list, update_progress, **download_options)
                     
                     if results['success']:
                         st.success(f"✅ Downloaded {len(results['success'])} backups successfully!")
                     
+                    if results['skipped']:
+                        st.info(f"⏭️ {len(results['skipped'])} backups already downloaded and unchanged")
+                    show_repository_ingest(results['repository'], results['repository_errors'])
+                    
                     if results['errors']:
                         st.error(f"❌ {len(results['errors'])} downloads failed:")
-                        for error in results['errors']:
-                            st.write(f"• {error}")
+                        for backup_name, error in results['errors'].items():
+                            st.write(f"• {backup_name}: {error}")
                 
                 status_text.text("Download complete!")
         
         with col3:
-            compression_type = st.selectbox("Archive Format", ["zip", "tar.gz"], key="server_compression")
+            compression_type = st.selectbox("Archive Format", archive.available_formats(), key="server_compression")
+            server_archive_options = archive_settings("server_archive", compression_type)
+            
+            stream_to_archive = st.checkbox("Stream into archive (no local copies)", value=True,
+                                            help="Compress backups as they download instead of saving them first")
             
             if st.button("📦 Download as Archive") and selected_server_backups:
-                # First download the selected backups
-                with st.spinner("Downloading and compressing backups..."):
-                    results = bulk_download_backups(selected_server_backups)
-                    
-                    if results['success']:
-                        # Create compressed archive
-                        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                        archive_name = f"wordpress_backups_{timestamp}"
-                        
-                        archive_path, error = create_compressed_archive(
-                            results['success'], 
-                            archive_name, 
-                            compression_type
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                archive_name = f"wordpress_backups_{timestamp}"
+                
+                if stream_to_archive:
+                    update_progress = make_download_progress(len(selected_server_backups))
+                    with st.spinner("Streaming backups into archive..."):
+                        result, error = stream_backups_to_archive(
+                            selected_server_backups,
+                            archive_name,
+                            compression_type,
+                            progress_callback=update_progress,
+                            bandwidth_limit=download_options['bandwidth_limit'],
+                            **server_archive_options
                         )
+                    
+                    if error:
+                        st.error(f"Archive creation failed: {error}")
+                    else:
+                        show_archive_result(result)
+                        file_download_button(ARCHIVE, result['path'], f"⬇️ Download {result['path'].name}")
+                else:
+                    # First download the selected backups
+                    with st.spinner("Downloading and compressing backups..."):
+                        results = bulk_download_backups(selected_server_backups,
+                                                        **dict(download_options, use_repository=False))
+                        archive_members = results['success'] + results['skipped']
                         
-                        if error:
-                            st.error(f"Archive creation failed: {error}")
-                        else:
-                            st.success(f"✅ Archive created: {archive_path.name}")
+                        if archive_members:
+                            # Create compressed archive
+                            result, error = create_compressed_archive(
+                                archive_members, 
+                                archive_name, 
+                                compression_type,
+                                **server_archive_options
+                            )
                             
-                            # Provide download button for the archive
-                            with open(archive_path, 'rb') as f:
-                                st.download_button(
-                                    label=f"⬇️ Download {archive_path.name}",
-                                    data=f.read(),
-                                    file_name=archive_path.name,
-                                    mime="application/octet-stream"
-                                )
-                    
-                    if results['errors']:
-                        st.error(f"Some downloads failed: {len(results['errors'])} errors")
+                            if error:
+                                st.error(f"Archive creation failed: {error}")
+                            else:
+                                archive_path = result['path']
+                                show_archive_result(result)
+                                
+                                # Provide download button for the archive
+                                file_download_button(ARCHIVE, archive_path, f"⬇️ Download {archive_path.name}")
+                        
+                        if results['errors']:
+                            st.error(f"Some downloads failed: {len(results['errors'])} errors")
         
         with col4:
             if st.button("🗑️ Delete Selected") and selected_server_backups:
@@ -1321,8 +1341,17 @@ else:
         
         if st.button("📥 Download Manual Backup"):
             if backup_filename:
+                download_progress = st.progress(0)
+                download_status = st.empty()
+                
+                def show_download_progress(filename, bytes_done, total_bytes, bytes_per_second):
+                    if total_bytes:
+                        download_progress.progress(min(bytes_done / total_bytes, 1.0))
+                    download_status.text(f"{filename}: {bytes_done / (1024*1024):.1f} MB "
+                                         f"at {bytes_per_second / (1024*1024):.1f} MB/s")
+                
                 with st.spinner(f"Downloading {backup_filename}..."):
-                    local_file, error = download_backup_file(backup_filename)
+                    local_file, error = download_backup_file(backup_filename, show_download_progress)
                     if error:
                         st.error(f"Download failed: {error}")
                     else:
@@ -1345,21 +1374,15 @@ else:
     # Local backup file management
     st.subheader("📁 Local Backup File Management")
     
-    # Get local backup files
-    local_backups = list(LOCAL_BACKUP_DIR.glob("*"))
+    # Local backups come from the catalog; the directory is only rescanned when it changes
+    backup_catalog.reconcile(BACKUP)
+    total_local_backups = backup_catalog.count(BACKUP)
     
-    if local_backups:
-        st.write("**Downloaded backup files:**")
-        
-        # Create a list of backup info
-        backup_info = []
-        for backup in local_backups:
-            info = get_backup_file_info(backup.name)
-            if info:
-                backup_info.append(info)
+    if total_local_backups:
+        st.write(f"**Downloaded backup files:** {total_local_backups} "
+                 f"({backup_catalog.total_size(BACKUP) / (1024*1024):.1f} MB)")
         
-        # Sort by modification time (newest first)
-        backup_info.sort(key=lambda x: x['modified'], reverse=True)
+        backup_info = catalog_page(BACKUP, total_local_backups, "local_backups")
         
         # Multi-select for local backups
         selected_local_backups = st.multiselect(
@@ -1372,52 +1395,51 @@ else:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
+            zip_archive_options = archive_settings("local_zip", 'zip')
             if st.button("📦 Create ZIP Archive") and selected_local_backups:
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 archive_name = f"local_backups_{timestamp}"
                 
-                archive_path, error = create_compressed_archive(
+                result, error = create_compressed_archive(
                     selected_local_backups, 
                     archive_name, 
-                    'zip'
+                    'zip',
+                    **zip_archive_options
                 )
                 
                 if error:
                     st.error(f"Archive creation failed: {error}")
                 else:
-                    st.success(f"✅ ZIP archive created: {archive_path.name}")
+                    archive_path = result['path']
+                    show_archive_result(result)
                     
-                    with open(archive_path, 'rb') as f:
-                        st.download_button(
-                            label=f"⬇️ Download {archive_path.name}",
-                            data=f.read(),
-                            file_name=archive_path.name,
-                            mime="application/zip"
-                        )
+                    file_download_button(ARCHIVE, archive_path, f"⬇️ Download {archive_path.name}",
+                                         mime="application/zip")
         
         with col2:
-            if st.button("📦 Create TAR.GZ Archive") and selected_local_backups:
+            tar_format = st.selectbox("Tar compression",
+                                      [fmt for fmt in archive.available_formats() if fmt.startswith('tar.')],
+                                      key="local_tar_format")
+            tar_archive_options = archive_settings("local_tar", tar_format)
+            if st.button("📦 Create TAR Archive") and selected_local_backups:
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 archive_name = f"local_backups_{timestamp}"
                 
-                archive_path, error = create_compressed_archive(
+                result, error = create_compressed_archive(
                     selected_local_backups, 
                     archive_name, 
-                    'tar.gz'
+                    tar_format,
+                    **tar_archive_options
                 )
                 
                 if error:
                     st.error(f"Archive creation failed: {error}")
                 else:
-                    st.success(f"✅ TAR.GZ archive created: {archive_path.name}")
+                    archive_path = result['path']
+                    show_archive_result(result)
                     
-                    with open(archive_path, 'rb') as f:
-                        st.download_button(
-                            label=f"⬇️ Download {archive_path.name}",
-                            data=f.read(),
-                            file_name=archive_path.name,
-                            mime="application/gzip"
-                        )
+                    file_download_button(ARCHIVE, archive_path, f"⬇️ Download {archive_path.name}",
+                                         mime="application/gzip" if tar_format == 'tar.gz' else "application/zstd")
         
         with col3:
             if st.button("📥 Download Selected") and selected_local_backups:
@@ -1430,7 +1452,7 @@ else:
                     try:
                         file_path = LOCAL_BACKUP_DIR / backup_name
                         if file_path.exists():
-                            file_path.unlink()
+                            backup_store.remove(backup_name)
                             deleted_count += 1
                     except Exception as e:
                         st.error(f"Failed to delete {backup_name}: {e}")
@@ -1439,6 +1461,28 @@ else:
                     st.success(f"✅ Deleted {deleted_count} local backup files")
                     st.rerun()
         
+        if st.button("🧩 Move to Repository") and selected_local_backups:
+            ingested = []
+            with st.spinner("Chunking backups into the repository..."):
+                for backup_name in selected_local_backups:
+                    entry = backup_store.lookup(backup_name) or {}
+                    try:
+                        stats = chunk_repository.ingest(LOCAL_BACKUP_DIR / backup_name, backup_name,
+                                                        entry.get('server_mtime'))
+                    except Exception as e:
+                        st.error(f"Failed to move {backup_name}: {e}")
+                        audit_logger.log_file_operation('REPOSITORY_INGEST', backup_name, 'FAILURE',
+                                                        details={'error': str(e)})
+                        continue
+                    backup_store.remove(backup_name)
+                    ingested.append(stats)
+                    audit_logger.log_file_operation('REPOSITORY_INGEST', backup_name, 'SUCCESS',
+                                                    details={key: value for key, value in stats.items()
+                                                             if key != 'backup'})
+            if ingested:
+                st.success(f"✅ Moved {len(ingested)} backups into the repository")
+                show_repository_ingest(ingested)
+        
         # Display local backup files with individual download buttons
         st.write("**Individual File Downloads:**")
         for info in backup_info:
@@ -1450,47 +1494,74 @@ else:
             with col2:
                 # Individual download button
                 try:
-                    with open(info['path'], 'rb') as f:
-                        st.download_button(
-                            label="⬇️ Download",
-                            data=f.read(),
-                            file_name=info['name'],
-                            mime="application/octet-stream",
-                            key=f"download_{info['name']}"
-                        )
+                    file_download_button(BACKUP, info['path'], key=f"download_{info['name']}")
                 except Exception as e:
                     st.error(f"Error reading file: {e}")
     
     else:
         st.info("No local backup files found. Download backups from the server to see them here.")
 
+    # Deduplicated repository
+    repository_backups = chunk_repository.list_backups()
+    if repository_backups:
+        st.subheader("🧩 Deduplicated Repository")
+        repository_stats = chunk_repository.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Backups", repository_stats['backups'])
+        col2.metric("Stored", f"{repository_stats['stored_bytes'] / (1024*1024):.1f} MB",
+                    f"of {repository_stats['logical_bytes'] / (1024*1024):.1f} MB", delta_color="off")
+        col3.metric("Dedup ratio", f"{repository_stats['dedup_ratio']:.2f}×",
+                    f"{repository_stats['total_ratio']:.2f}× with compression", delta_color="off")
+        
+        for entry in repository_backups:
+            col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+            with col1:
+                st.write(f"🧩 {entry['name']} ({entry['size'] / (1024*1024):.1f} MB, "
+                         f"{entry['chunk_count']} chunks)")
+            with col2:
+                file_download_button(REPOSITORY, entry['name'], key=f"download_repository_{entry['name']}")
+            with col3:
+                if st.button("📁 Restore", key=f"restore_{entry['name']}"):
+                    try:
+                        # Restore next to the blobs so the store can move it in place
+                        restored = chunk_repository.restore(entry['name'],
+                                                            backup_store.store_dir / f"{entry['name']}.restore")
+                        backup_store.ingest(restored, entry['name'], entry['sha256'], entry['server_mtime'])
+                        audit_logger.log_file_operation('REPOSITORY_RESTORE', entry['name'], 'SUCCESS',
+                                                        details={'file_size': entry['size']})
+                        st.success(f"✅ Restored {entry['name']} to local backups")
+                    except Exception as e:
+                        st.error(f"Restore failed: {e}")
+                        audit_logger.log_file_operation('REPOSITORY_RESTORE', entry['name'], 'FAILURE',
+                                                        details={'error': str(e)})
+            with col4:
+                if st.button("🗑️ Remove", key=f"remove_repository_{entry['name']}"):
+                    chunk_repository.remove(entry['name'])
+                    audit_logger.log_file_operation('REPOSITORY_REMOVE', entry['name'], 'SUCCESS')
+                    st.rerun()
+
     # Display created archives
-    archive_files = list(DOWNLOADS_DIR.glob("*"))
-    if archive_files:
+    backup_catalog.reconcile(ARCHIVE)
+    total_archives = backup_catalog.count(ARCHIVE)
+    if total_archives:
         st.subheader("📦 Created Archives")
-        st.write("**Available compressed archives:**")
+        st.write(f"**Available compressed archives:** {total_archives}")
         
-        for archive in sorted(archive_files, key=os.path.getmtime, reverse=True):
-            file_size = archive.stat().st_size / (1024*1024)  # MB
-            mod_time = datetime.datetime.fromtimestamp(archive.stat().st_mtime)
+        for archive_info in catalog_page(ARCHIVE, total_archives, "archives"):
+            file_size = archive_info['size'] / (1024*1024)  # MB
+            mod_time = archive_info['modified']
             
             col1, col2 = st.columns([3, 1])
             with col1:
-                st.write(f"📦 {archive.name} ({file_size:.1f} MB) - {mod_time.strftime('%Y-%m-%d %H:%M')}")
+                st.write(f"📦 {archive_info['name']} ({file_size:.1f} MB) - {mod_time.strftime('%Y-%m-%d %H:%M')}")
+                if archive_info['members']:
+                    st.caption(f"Contains: {', '.join(archive_info['members'])}")
             with col2:
                 try:
-                    with open(archive, 'rb') as f:
-                        if st.download_button(
-                            label="⬇️ Download",
-                            data=f.read(),
-                            file_name=archive.name,
-                            mime="application/octet-stream",
-                            key=f"download_archive_{archive.name}"
-                        ):
-                            audit_logger.log_file_operation('ARCHIVE_DOWNLOAD', archive.name, 'SUCCESS')
+                    file_download_button(ARCHIVE, archive_info['path'], key=f"download_archive_{archive_info['name']}")
                 except Exception as e:
                     st.error(f"Error reading archive: {e}")
-                    audit_logger.log_file_operation('ARCHIVE_DOWNLOAD', archive.name, 'FAILURE', 
+                    audit_logger.log_file_operation('ARCHIVE_DOWNLOAD', archive_info['name'], 'FAILURE', 
                                                   details={'error': str(e)})
 
     # Audit Log Viewer Section
@@ -1516,13 +1587,12 @@ else:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("📖 View Recent Logs"):
+            # Entries are written in the background; make the file current before reading it
+            audit_logger.flush()
             try:
                 if selected_log_file.exists():
-                    with open(selected_log_file, 'r') as f:
-                        log_lines = f.readlines()
-                    
-                    # Show last 50 lines
-                    recent_logs = log_lines[-50:] if len(log_lines) > 50 else log_lines
+                    # Read backwards from the end, so cost does not grow with the file
+                    recent_logs = tail_lines(selected_log_file, 50)
                     
                     st.subheader(f"📋 Recent {log_type} Entries")
                     for line in recent_logs:
@@ -1539,52 +1609,140 @@ else:
     
     with col2:
         if st.button("📥 Download Log File"):
+            audit_logger.flush()
             try:
                 if selected_log_file.exists():
-                    with open(selected_log_file, 'r') as f:
-                        log_content = f.read()
-                    
-                    st.download_button(
-                        label=f"⬇️ Download {log_type} Log",
-                        data=log_content,
-                        file_name=selected_log_file.name,
-                        mime="text/plain"
-                    )
-                    
-                    audit_logger.log_file_operation('LOG_DOWNLOAD', selected_log_file.name, 'SUCCESS')
+                    # Streamed from disk when the link is followed
+                    file_download_button(LOG, selected_log_file, f"⬇️ Download {log_type} Log",
+                                         key="download_log_file", mime="text/plain")
                 else:
                     st.warning(f"No {log_type.lower()} log file found yet.")
             except Exception as e:
                 st.error(f"Error downloading log file: {e}")
                 audit_logger.log_file_operation('LOG_DOWNLOAD', selected_log_file.name, 'FAILURE', 
                                               details={'error': str(e)})
+    
+    log_segments = list_segments(selected_log_file)
+    if log_segments:
+        with st.expander(f"🗜️ Rotated {log_type} segments ({len(log_segments)})"):
+            for segment in log_segments:
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.write(f"{segment['name']} ({segment['size'] / (1024*1024):.1f} MB) - "
+                             f"rotated {segment['rotated'].strftime('%Y-%m-%d %H:%M')}")
+                with col2:
+                    file_download_button(LOG, segment['path'], key=f"download_segment_{segment['name']}",
+                                         mime="application/gzip" if segment['compressed'] else "text/plain")
+
+    # Indexed search across all daily audit logs
+    st.subheader("🔎 Search Audit Log")
+    today = datetime.date.today()
+    with st.form("audit_search"):
+        col1, col2 = st.columns(2)
+        with col1:
+            date_range = st.date_input("Date range", (today - datetime.timedelta(days=7), today),
+                                       key="audit_search_dates")
+        with col2:
+            search_page = st.number_input("Page", min_value=1, value=1, step=1, key="audit_search_page")
+        search_filters = {}
+        filter_columns = st.columns(4)
+        for column, (field, label) in zip(filter_columns, [('username', "User"), ('site_name', "Site"),
+                                                           ('event_type', "Event type"), ('session_id', "Session")]):
+            with column:
+                choice = st.selectbox(label, ["Any"] + audit_index.distinct_values(field),
+                                      key=f"audit_search_{field}")
+                if choice != "Any":
+                    search_filters[field] = choice
+        search_submitted = st.form_submit_button("🔎 Search")
+    
+    if search_submitted and len(date_range) == 2:
+        # Write out queued entries and index them before searching
+        audit_logger.flush()
+        audit_index.refresh()
+        search_start = datetime.datetime.combine(date_range[0], datetime.time.min).isoformat()
+        search_end = datetime.datetime.combine(date_range[1], datetime.time.max).isoformat()
+        search_results, more_results = audit_index.query(search_start, search_end, page=search_page, **search_filters)
+        st.session_state.audit_search_results = (search_page, search_results, more_results)
+    
+    if 'audit_search_results' in st.session_state:
+        search_page, search_results, more_results = st.session_state.audit_search_results
+        if search_results:
+            st.caption(f"Page {search_page}: {len(search_results)} entries"
+                       + (" (more on the next page)" if more_results else ""))
+            for log_entry in search_results:
+                with st.expander(f"{log_entry.get('timestamp', 'Unknown Time')} - {log_entry.get('event_type', 'Unknown')}"
+                                 f" - {log_entry.get('username', '')}"):
+                    st.json(log_entry)
+        else:
+            st.info("No audit entries match these filters.")
 
     # Log Statistics
     st.subheader("📊 Log Statistics")
     try:
-        log_stats = {}
-        for log_name, log_file in log_files.items():
-            log_path = LOGS_DIR / log_file
-            if log_path.exists():
-                with open(log_path, 'r') as f:
-                    line_count = sum(1 for line in f)
-                log_stats[log_name] = line_count
-            else:
-                log_stats[log_name] = 0
+        # Only bytes appended since the last rerun are read
+        file_stats = log_statistics.refresh(log_files.values())
+        log_stats = {log_name: file_stats[log_file] for log_name, log_file in log_files.items()}
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Main Audit Entries", log_stats.get("Main Audit", 0))
+            st.metric("Main Audit Entries", log_stats["Main Audit"]['lines'])
         with col2:
-            st.metric("Security Events", log_stats.get("Security Events", 0))
+            st.metric("Security Events", log_stats["Security Events"]['lines'])
         with col3:
-            st.metric("Bulk Operations", log_stats.get("Bulk Operations", 0))
+            st.metric("Bulk Operations", log_stats["Bulk Operations"]['lines'])
         with col4:
-            st.metric("API Calls", log_stats.get("API Calls", 0))
+            st.metric("API Calls", log_stats["API Calls"]['lines'])
+        
+        with st.expander("🔍 Breakdown by event type, result and risk level"):
+            for log_name, stats in log_stats.items():
+                if not stats['lines']:
+                    continue
+                st.write(f"**{log_name}**")
+                columns = st.columns(3)
+                for column, (field, label) in zip(columns, [('event_type', 'Event type'), ('result', 'Result'),
+                                                            ('risk_level', 'Risk level')]):
+                    counts = sorted(stats[field].items(), key=lambda item: item[1], reverse=True)
+                    with column:
+                        st.dataframe({label: [name for name, _ in counts], 'Entries': [n for _, n in counts]},
+                                     hide_index=True)
     
     except Exception as e:
         st.error(f"Error calculating log statistics: {e}")
 
+    # API call analytics from the typed telemetry store
+    st.subheader("📈 API Call Analytics")
+    # Picks up calls appended by other processes (e.g. the CLI) since the last look
+    with st.spinner("Reading new API calls..."):
+        telemetry_store.refresh()
+    telemetry_stats = telemetry_store.stats()
+    
+    if telemetry_stats['calls']:
+        analytics_periods = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "All time": None}
+        period_label = st.selectbox("Period", list(analytics_periods), key="analytics_period")
+        period_days = analytics_periods[period_label]
+        since = datetime.datetime.now() - datetime.timedelta(days=period_days) if period_days else None
+        st.caption(f"{telemetry_stats['calls']} API calls recorded since "
+                   f"{telemetry_stats['first'].strftime('%Y-%m-%d %H:%M')}")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Latency per act per day (seconds)**")
+            latency = telemetry_store.latency_percentiles(('day', 'act'), since=since)
+            if latency:
+                st.dataframe(latency, hide_index=True)
+        with col2:
+            st.write("**Failure rate per host**")
+            failures = telemetry_store.failure_rates('host', since=since)
+            if failures:
+                st.dataframe(failures, hide_index=True)
+        
+        st.write("**Bytes transferred per week**")
+        weekly = telemetry_store.bytes_transferred('week', since=since)
+        if weekly:
+            st.bar_chart({'MB': {row['week']: row['bytes'] / (1024*1024) for row in weekly}})
+    else:
+        st.info("No API calls recorded yet.")
+
     st.markdown("---")
     st.caption("Developed for CLAS IT AI in July Workshop – 2025")
     st.caption("✨ **Enhanced with Comprehensive Audit Logging**")
@@ -1592,111 +1750,3 @@ else:
     st.caption("📋 **Complete Activity Tracking & Monitoring**")
     st.caption("🔗 Uses Softaculous WordPress Manager API for all operations")
     st.caption("💾 **Audit logs stored in ./logs/ directory**")
-
-
-def run_bulk_audit(domains, audit_options):
-    """Run bulk audit on selected domains"""
-    total_sites = len(domains)
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    results = {
-        'success': [],
-        'errors': []
-    }
-    
-    # Log start of bulk operation
-    audit_logger.log_bulk_operation('BULK_AUDIT_START', total_sites, 
-                                   {'success': [], 'errors': []}, 
-                                   details={'audit_options': audit_options})
-    
-    for i, domain in enumerate(domains):
-        status_text.text(f"Processing {domain['display_name']} ({i+1}/{total_sites})")
-        
-        # Update plugins
-        if "Update all plugins" in audit_options:
-            st.write(f"🔄 Updating plugins for {domain['display_name']}...")
-            result, error = update_plugin(domain['insid'])
-            if error:
-                st.error(f"Plugin update failed for {domain['display_name']}: {error}")
-                results['errors'].append(f"Plugin update failed for {domain['display_name']}: {error}")
-            else:
-                st.success(f"✅ Plugins updated for {domain['display_name']}")
-                results['success'].append(f"Plugins updated for {domain['display_name']}")
-        
-        # Upgrade WordPress core
-        if "Upgrade WordPress core" in audit_options:
-            st.write(f"⚙️ Upgrading WordPress core for {domain['display_name']}...")
-            result, error = upgrade_wordpress_installation(domain['insid'])
-            if error:
-                st.error(f"Core upgrade failed for {domain['display_name']}: {error}")
-                results['errors'].append(f"Core upgrade failed for {domain['display_name']}: {error}")
-            else:
-                st.success(f"✅ WordPress core upgraded for {domain['display_name']}")
-                results['success'].append(f"WordPress core upgraded for {domain['display_name']}")
-        
-        # Create backups
-        if "Create backups" in audit_options:
-            st.write(f"💾 Creating backup for {domain['display_name']}...")
-            result, error = create_backup(domain['insid'])
-            if error:
-                st.error(f"Backup failed for {domain['display_name']}: {error}")
-                results['errors'].append(f"Backup failed for {domain['display_name']}: {error}")
-            else:
-                st.success(f"✅ Backup created for {domain['display_name']}")
-                results['success'].append(f"Backup created for {domain['display_name']}")
-        
-        progress_bar.progress((i + 1) / total_sites)
-    
-    # Log completion of bulk operation
-    audit_logger.log_bulk_operation('BULK_AUDIT_COMPLETE', total_sites, results, 
-                                   details={'audit_options': audit_options})
-    
-    # Show final results
-    status_text.text("Bulk audit complete!")
-    
-    with st.expander("📊 Bulk Audit Results Summary"):
-        st.write(f"**✅ Successful Operations:** {len(results['success'])}")
-        for success in results['success']:
-            st.write(f"• {success}")
-        
-        if results['errors']:
-            st.write(f"**❌ Failed Operations:** {len(results['errors'])}")
-            for error in results['errors']:
-                st.write(f"• {error}")
-    
-    st.success("🎉 Bulk audit process completed!")
-
-def run_bulk_plugin_update(domains):
-    """Run plugin updates on all selected domains"""
-    total_sites = len(domains)
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    success_count = 0
-    error_count = 0
-    results = {'success': [], 'errors': []}
-    
-    # Log start of bulk operation
-    audit_logger.log_bulk_operation('BULK_PLUGIN_UPDATE_START', total_sites, results)
-    
-    for i, domain in enumerate(domains):
-        status_text.text(f"Updating plugins for {domain['display_name']} ({i+1}/{total_sites})")
-        
-        result, error = update_plugin(domain['insid'])
-        if error:
-            st.error(f"❌ Plugin update failed for {domain['display_name']}: {error}")
-            error_count += 1
-            results['errors'].append(f"{domain['display_name']}: {error}")
-        else:
-            st.success(f"✅ Plugins updated for {domain['display_name']}")
-            success_count += 1
-            results['success'].append(domain['display_name'])
-        
-        progress_bar.progress((i + 1) / total_sites)
-    
-    # Log completion of bulk operation
-    audit_logger.log_bulk_operation('BULK_PLUGIN_UPDATE_COMPLETE', total_sites, results)
-    
-    status_text.text("Plugin updates complete!")
-    st.success(f"🎉 Plugin updates completed! ✅ {success_count} successful, ❌ {error_count} failed")
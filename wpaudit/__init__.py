@@ -0,0 +1,31 @@
+"""Streamlit-free core of the CLAS IT WordPress audit tool"""
+import importlib
+
+from .audit import AuditLogger, AuditWriter, audit_logger
+from .client import (
+    SoftaculousClient, ConnectionPool, BulkExecutor, EventLoopThread, ProgressRelay,
+    audit_site, connection_pool, event_loop, get_client, run_sync
+)
+from .limiter import AdaptiveLimiter, get_limiter
+from .metrics import MetricsRegistry, metrics_registry
+from .phpdecode import DecodeError
+from .resilience import CircuitBreaker, CircuitOpenError, get_breaker
+from .cache import ResponseCache, response_cache
+from .store import BackupStore, backup_store
+from .catalog import BackupCatalog, backup_catalog
+from .archive import ArchiveWriter, ParallelGzipWriter, available_formats, create_archive
+from .tracing import Tracer, tracer
+
+# The chunk repository needs numpy, and the file server serves repository
+# backups; both load on first use so the CLI and plain imports stay light
+_LAZY_EXPORTS = {
+    'ChunkRepository': 'repository',
+    'chunk_repository': 'repository',
+    'FileServer': 'fileserver',
+    'file_server': 'fileserver'
+}
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,324 @@
+"""Streaming archive engine: zip, tar.gz with parallel gzip, tar.zst with multi-threaded zstd"""
+import collections
+import concurrent.futures
+import contextlib
+import os
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # tar.zst is offered only when zstandard is installed
+    zstandard = None
+
+from .config import ARCHIVE_LEVELS, ARCHIVE_MAX_LEVELS, ARCHIVE_THREADS, ARCHIVE_BLOCK_SIZE, DOWNLOAD_CHUNK_SIZE
+from .metrics import record_archive
+
+ARCHIVE_FORMATS = ('zip', 'tar.gz', 'tar.zst')
+
+# Magic numbers of formats that will not shrink further (gzip, zip, zstd, xz, bzip2, 7z)
+COMPRESSED_MAGIC = (b'\x1f\x8b', b'PK\x03\x04', b'\x28\xb5\x2f\xfd', b'\xfd7zXZ', b'BZh', b'7z\xbc\xaf')
+COMPRESSED_SUFFIXES = ('.gz', '.tgz', '.zip', '.zst', '.xz', '.bz2', '.7z')
+
+def available_formats():
+    """Archive formats usable with the installed libraries"""
+    return [fmt for fmt in ARCHIVE_FORMATS if fmt != 'tar.zst' or zstandard is not None]
+
+def is_compressed_name(name):
+    return str(name).lower().endswith(COMPRESSED_SUFFIXES)
+
+def is_compressed_file(path):
+    """Sniff the leading bytes for a compressed container format"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+    except OSError:
+        return is_compressed_name(path)
+    return head.startswith(COMPRESSED_MAGIC)
+
+# --- Parallel gzip ---
+def _deflate_block(block, level, dictionary):
+    """Raw-deflate one block, primed with the tail of the previous block, ending on a byte boundary"""
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+class ParallelGzipWriter:
+    """pigz-style gzip stream: fixed-size blocks deflated concurrently, written in order
+
+    zlib releases the GIL while compressing, so blocks compress in parallel on
+    a thread pool. Each block is primed with the previous 32 KiB so the ratio
+    stays close to single-threaded gzip. Blocks written while
+    set_compressible(False) is in effect are stored rather than deflated.
+    """
+    def __init__(self, fileobj, level=6, threads=ARCHIVE_THREADS, block_size=ARCHIVE_BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = max(1, int(threads or 1))
+        self.block_size = block_size
+        self.compressible = True
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.threads, thread_name_prefix='pgzip')
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._dictionary = b''
+        self._crc = 0
+        self._size = 0
+        # Header: magic, deflate, no flags, mtime, no extra flags, unknown OS
+        self.fileobj.write(b'\x1f\x8b\x08\x00' + struct.pack('<I', int(time.time())) + b'\x00\xff')
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def set_compressible(self, compressible):
+        """Start a new block and deflate (True) or store (False) from here on"""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        self.compressible = compressible
+
+    def _submit(self, block):
+        level = self.level if self.compressible else 0
+        self._pending.append(self._executor.submit(_deflate_block, block, level, self._dictionary))
+        self._dictionary = block[-32768:]
+        # Bound memory: at most two blocks per thread in flight
+        while len(self._pending) > self.threads * 2:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def flush(self):
+        pass
+
+    def discard(self):
+        """Drop pending blocks without writing them"""
+        self._buffer.clear()
+        self._pending.clear()
+        self._executor.shutdown(cancel_futures=True)
+
+    def close(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().result())
+        self._executor.shutdown()
+        # Empty final block, then CRC-32 and length of the uncompressed data
+        self.fileobj.write(zlib.compressobj(self.level, zlib.DEFLATED, -15).flush(zlib.Z_FINISH))
+        self.fileobj.write(struct.pack('<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+
+# --- Archive writer ---
+class _TarMember:
+    """Writes one tar member's data straight into the archive stream"""
+    def __init__(self, writer, size):
+        self.writer = writer
+        self.size = size
+        self.written = 0
+
+    def write(self, data):
+        if self.written + len(data) > self.size:
+            raise ValueError(f"Member data exceeds declared size of {self.size} bytes")
+        self.writer._emit(data)
+        self.writer._count(len(data))
+        self.written += len(data)
+        return len(data)
+
+    def close(self):
+        if self.written != self.size:
+            raise ValueError(f"Member truncated: {self.written} of {self.size} bytes")
+        remainder = self.size % tarfile.BLOCKSIZE
+        if remainder:
+            self.writer._emit(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+class _ZipMember:
+    def __init__(self, writer, handle):
+        self.writer = writer
+        self.handle = handle
+
+    def write(self, data):
+        self.handle.write(data)
+        self.writer._count(len(data))
+        return len(data)
+
+    def close(self):
+        self.handle.close()
+
+class ArchiveWriter:
+    """Writes a zip, tar.gz or tar.zst archive member by member
+
+    Members can come from local files (add_file) or be streamed in chunks
+    (open_member). Already-compressed members are stored rather than
+    recompressed: zip stores them, tar.gz emits stored deflate blocks, and
+    zstd stores incompressible blocks raw on its own.
+    """
+    def __init__(self, path, compression_type='zip', level=None, threads=ARCHIVE_THREADS, progress_callback=None):
+        if compression_type not in available_formats():
+            raise ValueError(f"Unsupported archive format: {compression_type}")
+        self.path = Path(path)
+        self.compression_type = compression_type
+        self.level = ARCHIVE_LEVELS[compression_type] if level is None else int(level)
+        if not 0 <= self.level <= ARCHIVE_MAX_LEVELS[compression_type]:
+            raise ValueError(f"Compression level for {compression_type} must be 0-"
+                             f"{ARCHIVE_MAX_LEVELS[compression_type]}, got {self.level}")
+        self.threads = max(1, int(threads or 1))
+        self.progress_callback = progress_callback
+        self.members = 0
+        self.stored_members = 0
+        self.bytes_in = 0
+        self.started = time.monotonic()
+        self._last_report = 0.0
+        self._raw = None
+        self._zip = None
+        self._gzip = None
+        self._out = None
+        self._tar_offset = 0
+
+        if compression_type == 'zip':
+            self._zip = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True,
+                                        compresslevel=self.level)
+            return
+
+        self._raw = open(self.path, 'wb')
+        if compression_type == 'tar.gz':
+            self._gzip = ParallelGzipWriter(self._raw, self.level, self.threads)
+            self._out = self._gzip
+        else:
+            compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads)
+            self._out = compressor.stream_writer(self._raw, closefd=False)
+
+    def _count(self, byte_count):
+        self.bytes_in += byte_count
+        now = time.monotonic()
+        if self.progress_callback is not None and now - self._last_report >= 0.25:
+            self._last_report = now
+            self.progress_callback(self.bytes_in, self.bytes_per_second)
+
+    def _emit(self, data):
+        self._out.write(data)
+        self._tar_offset += len(data)
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes_in / max(time.monotonic() - self.started, 1e-6)
+
+    @contextlib.contextmanager
+    def open_member(self, arcname, size, compressible=True, mtime=None):
+        """Writable handle for one member; tar formats need the exact size up front"""
+        self.members += 1
+        if not compressible:
+            self.stored_members += 1
+
+        if self._zip is not None:
+            if compressible:
+                handle = self._zip.open(arcname, 'w', force_zip64=size is None or size >= zipfile.ZIP64_LIMIT)
+            else:
+                info = zipfile.ZipInfo(arcname, time.localtime(mtime or time.time())[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                info.external_attr = 0o644 << 16
+                handle = self._zip.open(info, 'w', force_zip64=size is None or size >= zipfile.ZIP64_LIMIT)
+            member = _ZipMember(self, handle)
+        else:
+            if size is None:
+                raise ValueError(f"Size of {arcname} is unknown; tar members need it up front")
+            info = tarfile.TarInfo(arcname)
+            info.size = size
+            info.mtime = int(mtime or time.time())
+            info.mode = 0o644
+            if self._gzip is not None:
+                self._gzip.set_compressible(compressible)
+            self._emit(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+            member = _TarMember(self, size)
+
+        yield member
+        member.close()
+
+    def add_file(self, path, arcname=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        path = Path(path)
+        stat = path.stat()
+        compressible = not is_compressed_file(path)
+        if self._zip is not None:
+            # ZipFile.write keeps the file's timestamp and honours the archive's level
+            self._zip.write(path, arcname or path.name,
+                            compress_type=None if compressible else zipfile.ZIP_STORED)
+            self.members += 1
+            self.stored_members += 0 if compressible else 1
+            self._count(stat.st_size)
+            return
+        with self.open_member(arcname or path.name, stat.st_size, compressible, stat.st_mtime) as member, \
+                open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                member.write(chunk)
+
+    def close(self):
+        """Finish the archive and return its stats"""
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            # End-of-archive marker: two zero blocks, padded to a full record
+            self._emit(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+            remainder = self._tar_offset % tarfile.RECORDSIZE
+            if remainder:
+                self._emit(tarfile.NUL * (tarfile.RECORDSIZE - remainder))
+            self._out.close()
+            self._raw.close()
+        stats = self.stats()
+        record_archive(stats)
+        return stats
+
+    def abort(self):
+        """Close and delete a partially written archive"""
+        if self._zip is not None:
+            fileobj = self._zip.fp
+            with contextlib.suppress(Exception):
+                self._zip.close()
+            if fileobj is not None:
+                # ZipFile.close refuses to run while a member is still open for writing
+                fileobj.close()
+                self._zip.fp = None
+        else:
+            if self._gzip is not None:
+                self._gzip.discard()
+            self._raw.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    def stats(self):
+        duration = max(time.monotonic() - self.started, 1e-6)
+        bytes_out = self.path.stat().st_size if self.path.exists() else 0
+        return {
+            'path': self.path,
+            'format': self.compression_type,
+            'level': self.level,
+            'threads': self.threads,
+            'members': self.members,
+            'stored_members': self.stored_members,
+            'bytes_in': self.bytes_in,
+            'bytes_out': bytes_out,
+            'ratio': bytes_out / self.bytes_in if self.bytes_in else 0.0,
+            'duration': round(duration, 3),
+            'mb_per_s': self.bytes_in / duration / (1024 * 1024)
+        }
+
+def create_archive(files, archive_path, compression_type='zip', level=None, threads=ARCHIVE_THREADS,
+                   progress_callback=None):
+    """Archive local files given as (path, arcname) pairs; returns (stats, error)"""
+    try:
+        writer = ArchiveWriter(archive_path, compression_type, level, threads, progress_callback)
+    except Exception as e:
+        return None, str(e)
+    try:
+        for path, arcname in files:
+            writer.add_file(path, arcname)
+        return writer.close(), None
+    except Exception as e:
+        writer.abort()
+        return None, str(e)
@@ -0,0 +1,395 @@
+"""Audit logging for authentication, site access, bulk, API and file events"""
+import contextvars
+import datetime
+import hashlib
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+from .config import (
+    LOGS_DIR, AUDIT_QUEUE_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_BATCH_SIZE, LOG_ROTATE_BYTES, LOG_ROTATE_INTERVAL
+)
+from .filelock import file_lock
+from .logfiles import compress_in_background, compress_pending, lock_path, rotate, segment_started
+
+# Files for the non-daily log streams
+LOG_FILES = {
+    'security': "security_events.log",
+    'bulk_operations': "bulk_operations.log",
+    'api_calls': "api_calls.log"
+}
+
+# Identity (username, IP, session) of whoever triggered the current work.
+# Context variables follow work onto worker threads and event loop tasks.
+_audit_context = contextvars.ContextVar('audit_context', default=None)
+
+# Fallback session id for work not bound to a UI session (e.g. headless runs)
+_process_session_id = hashlib.md5(
+    f"{datetime.datetime.now().isoformat()}{os.getpid()}".encode()
+).hexdigest()[:16]
+
+# --- Background Writer ---
+class AuditWriter:
+    """Appends serialised entries to the log files from a background thread
+
+    Callers only enqueue a line; the writer thread gathers entries for up to
+    flush_interval seconds (or batch_size entries) and appends them per file
+    in one write. When the queue is full, callers wait rather than drop audit
+    entries. A log that grows past rotate_bytes or spans rotate_interval
+    seconds is renamed to a timestamped segment and gzipped in the background.
+    Writes and rotation hold the logs directory's lock file, and a handle
+    whose file another process rotated away is reopened before writing.
+    """
+    def __init__(self, logs_dir=LOGS_DIR, queue_size=AUDIT_QUEUE_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 batch_size=AUDIT_BATCH_SIZE, rotate_bytes=LOG_ROTATE_BYTES, rotate_interval=LOG_ROTATE_INTERVAL):
+        self.logs_dir = Path(logs_dir)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.rotations = 0
+        # Called as listener(stream, path, lines) on the writer thread after each append
+        self.listeners = []
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._files = {}
+        self._started = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def log_path(self, stream):
+        """File for a log stream; the main audit log rolls over daily"""
+        if stream == 'audit':
+            return self.logs_dir / f"audit_{datetime.datetime.now().strftime('%Y-%m-%d')}.log"
+        return self.logs_dir / LOG_FILES[stream]
+
+    def submit(self, line, streams):
+        """Queue one serialised entry for the given streams"""
+        if self._thread is None:
+            self._start()
+        if self._closed:
+            with self._lock:
+                self._write_batch([(line, streams)])
+            return
+        self._queue.put((line, streams))
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None and not self._closed:
+                compress_pending(self.logs_dir)
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is on disk"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Flush and stop the writer; later entries are written synchronously"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put((None, None))
+            self._thread.join()
+        with self._lock:
+            self._write_pending()
+
+    def _run(self):
+        while True:
+            # Collect for up to flush_interval after the first entry; a flush or stop marker writes at once
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if self._write_batch(batch):
+                return
+
+    def _write_pending(self):
+        """Write entries queued after the thread stopped (shutdown stragglers)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write_batch(batch)
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+
+    def _write_batch(self, batch):
+        """Append a batch grouped by file; returns True on a stop marker"""
+        lines = {}
+        waiters = []
+        stop = False
+        for line, target in batch:
+            if line is None:
+                if target is None:
+                    stop = True
+                else:
+                    waiters.append(target)
+                continue
+            for stream in target:
+                lines.setdefault(stream, []).append(line)
+
+        written = []
+        if lines:
+            with file_lock(lock_path(self.logs_dir)):
+                for stream, stream_lines in lines.items():
+                    path = self.log_path(stream)
+                    try:
+                        handle = self._handle_for(stream, path)
+                        handle.write("\n".join(stream_lines) + "\n")
+                        handle.flush()
+                        self.written += len(stream_lines)
+                    except OSError as e:
+                        # Keep the writer alive so callers never block on a dead queue
+                        self._files.pop(stream, None)
+                        self.errors += 1
+                        print(f"Audit log write to {path} failed: {e}", file=sys.stderr)
+                        continue
+                    written.append((stream, path, stream_lines))
+
+        for stream, path, stream_lines in written:
+            for listener in self.listeners:
+                try:
+                    listener(stream, path, stream_lines)
+                except Exception as e:
+                    print(f"Audit log listener failed: {e}", file=sys.stderr)
+
+        for waiter in waiters:
+            waiter.set()
+        return stop
+
+    def _handle_for(self, stream, path):
+        """Open file for a stream, rotating it first when it is due"""
+        now = datetime.datetime.now()
+        handle = self._files.get(stream)
+        if handle is not None and handle.name != str(path):
+            # The daily audit log rolled over; the previous day's file is complete
+            handle.close()
+            del self._files[stream]
+            compress_in_background(handle.name)
+            handle = None
+        if handle is not None and not _is_open_at(handle, path):
+            # Another process rotated the file away; its segment is theirs to compress
+            handle.close()
+            del self._files[stream]
+            handle = None
+        if handle is None:
+            handle = self._files[stream] = open(path, 'a', encoding='utf-8')
+            self._started[stream] = segment_started(path) or now
+
+        # Other processes append too, so ask the file rather than our own position
+        size = os.fstat(handle.fileno()).st_size
+        too_big = self.rotate_bytes and size >= self.rotate_bytes
+        too_old = self.rotate_interval and (now - self._started[stream]).total_seconds() >= self.rotate_interval
+        if (too_big or too_old) and size:
+            handle.close()
+            rotate(path, now)
+            self.rotations += 1
+            handle = self._files[stream] = open(path, 'a', encoding='utf-8')
+            self._started[stream] = now
+        return handle
+
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'written': self.written, 'errors': self.errors,
+                'rotations': self.rotations}
+
+def _is_open_at(handle, path):
+    """Whether an open log handle still refers to the file at path"""
+    try:
+        return os.fstat(handle.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+# --- Audit Logging System ---
+class AuditLogger:
+    def __init__(self, logs_dir=LOGS_DIR):
+        self.logs_dir = Path(logs_dir)
+        self.writer = AuditWriter(self.logs_dir)
+
+    def _emit(self, log_entry, *streams):
+        """Serialise an entry once and hand it to the writer"""
+        self.writer.submit(json.dumps(log_entry), streams)
+
+    def flush(self, timeout=None):
+        """Wait for queued entries to reach disk (e.g. before reading logs or at logout)"""
+        return self.writer.flush(timeout)
+
+    def close(self):
+        self.writer.close()
+    
+    def bind_context(self, username=None, ip_address=None, session_id=None):
+        """Bind the identity recorded on audit entries for the current context"""
+        _audit_context.set({
+            'username': username or 'anonymous',
+            'ip_address': ip_address or '127.0.0.1',
+            'session_id': session_id or _process_session_id
+        })
+    
+    def get_context(self):
+        """Get the identity bound to the current context"""
+        context = _audit_context.get()
+        if context is None:
+            return {'username': 'anonymous', 'ip_address': '127.0.0.1', 'session_id': _process_session_id}
+        return context
+    
+    def get_client_ip(self):
+        """Get client IP address"""
+        return self.get_context()['ip_address']
+    
+    def get_session_id(self):
+        """Get session ID"""
+        return self.get_context()['session_id']
+    
+    def get_username(self):
+        """Get current username"""
+        return self.get_context()['username']
+    
+    def log_auth_event(self, event_type, result, details=None):
+        """Log authentication events"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'AUTHENTICATION',
+            'action': event_type,
+            **self.get_context(),
+            'result': result,
+            'details': details or {},
+            'risk_level': 'HIGH' if result == 'FAILURE' else 'LOW'
+        }
+        
+        if result == 'FAILURE':
+            self._emit(log_entry, 'audit', 'security')
+        else:
+            self._emit(log_entry, 'audit')
+    
+    def log_site_access(self, site_name, action, result, details=None):
+        """Log site access events"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'SITE_ACCESS',
+            **self.get_context(),
+            'site_name': site_name,
+            'action': action,
+            'result': result,
+            'details': details or {},
+            'risk_level': 'MEDIUM' if 'UPDATE' in action else 'LOW'
+        }
+        
+        if result == 'FAILURE':
+            self._emit(log_entry, 'audit', 'security')
+        else:
+            self._emit(log_entry, 'audit')
+    
+    def log_bulk_operation(self, operation_type, site_count, results, details=None):
+        """Log bulk operations"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'BULK_OPERATION',
+            **self.get_context(),
+            'operation': operation_type,
+            'sites_affected': site_count,
+            'success_count': len(results.get('success', [])),
+            'failure_count': len(results.get('errors', [])),
+            'details': details or {},
+            'risk_level': 'HIGH'
+        }
+        
+        self._emit(log_entry, 'audit', 'bulk_operations')
+        
+        # Log security event if significant failures
+        if len(results.get('errors', [])) > site_count * 0.5:
+            self._emit({**log_entry, 'alert': 'HIGH_FAILURE_RATE'}, 'security')
+    
+    def log_api_call(self, endpoint, action, result, response_time=None, details=None, host=None):
+        """Log API calls"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'API_CALL',
+            **self.get_context(),
+            'endpoint': endpoint,
+            'host': host,
+            'action': action,
+            'result': result,
+            'response_time': response_time,
+            'details': details or {},
+            'risk_level': 'MEDIUM' if result == 'FAILURE' else 'LOW'
+        }
+        
+        if result == 'FAILURE':
+            self._emit(log_entry, 'api_calls', 'security')
+        else:
+            self._emit(log_entry, 'api_calls')
+    
+    def log_circuit_breaker(self, host, old_state, new_state, details=None):
+        """Log circuit breaker state transitions"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'CIRCUIT_BREAKER',
+            **self.get_context(),
+            'host': host,
+            'old_state': old_state,
+            'new_state': new_state,
+            'details': details or {},
+            'risk_level': 'HIGH' if new_state == 'OPEN' else 'MEDIUM'
+        }
+        
+        if new_state == 'OPEN':
+            self._emit(log_entry, 'audit', 'api_calls', 'security')
+        else:
+            self._emit(log_entry, 'audit', 'api_calls')
+    
+    def log_file_operation(self, operation_type, file_path, result, details=None):
+        """Log file operations"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'FILE_OPERATION',
+            **self.get_context(),
+            'operation': operation_type,
+            'file_path': str(file_path),
+            'result': result,
+            'details': details or {},
+            'risk_level': 'LOW'
+        }
+        
+        self._emit(log_entry, 'audit')
+    
+    def log_export_operation(self, export_type, record_count, result, details=None):
+        """Log export operations"""
+        log_entry = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'event_type': 'EXPORT_OPERATION',
+            **self.get_context(),
+            'export_type': export_type,
+            'record_count': record_count,
+            'result': result,
+            'details': details or {},
+            'risk_level': 'MEDIUM'
+        }
+        
+        self._emit(log_entry, 'audit')
+
+# Global audit logger instance
+audit_logger = AuditLogger()
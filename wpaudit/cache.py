@@ -0,0 +1,93 @@
+"""TTL + LRU cache for read-only Softaculous responses"""
+import collections
+import threading
+import time
+
+from .config import CACHE_MAX_ENTRIES, CACHE_TTLS
+
+class ResponseCache:
+    """LRU cache of API responses with per-entry TTLs and tag-based invalidation"""
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(scope, act, params=None, post_data=None, variant=None):
+        """Key a response by credential scope (host, user), act, parameters and decoded form"""
+        params = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        post_data = tuple(sorted((str(k), str(v)) for k, v in (post_data or {}).items()))
+        return (scope, act, params, post_data, variant)
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, tag = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, tag):
+        """Store a value under a tag such as ('plugins', insid); the tag kind picks the TTL"""
+        ttl = self.ttls.get(tag[0], 0)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl, tag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, scope, tag):
+        """Drop every entry for a credential scope carrying the given tag"""
+        with self._lock:
+            stale = [key for key, (_, _, entry_tag) in self._entries.items()
+                     if key[0] == scope and entry_tag == tag]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def invalidate_scope(self, scope):
+        """Drop every entry for a credential scope"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == scope]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries)
+            }
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,191 @@
+"""SQLite catalog of local backups and created archives"""
+import datetime
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from .config import LOCAL_BACKUP_DIR, DOWNLOADS_DIR, CATALOG_PATH
+
+BACKUP = 'backup'
+ARCHIVE = 'archive'
+
+SORT_COLUMNS = ('mtime', 'size', 'name')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT,
+    insid TEXT,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS files_by_mtime ON files (kind, mtime);
+CREATE INDEX IF NOT EXISTS files_by_size ON files (kind, size);
+CREATE TABLE IF NOT EXISTS archive_members (
+    archive TEXT NOT NULL,
+    member TEXT NOT NULL,
+    PRIMARY KEY (archive, member)
+);
+CREATE INDEX IF NOT EXISTS archive_members_by_member ON archive_members (member);
+CREATE TABLE IF NOT EXISTS scans (
+    kind TEXT PRIMARY KEY,
+    dir_mtime_ns INTEGER NOT NULL
+);
+"""
+
+def is_partial_download(path):
+    """True for in-progress download files (.part data, sidecars, temp files)"""
+    name = Path(path).name
+    return name.startswith('.') or name.endswith(('.part', '.part.json', '.part.json.tmp'))
+
+class BackupCatalog:
+    """Indexed metadata for LOCAL_BACKUP_DIR and DOWNLOADS_DIR
+
+    Writers (downloads, the backup store, archive creation) update rows as they
+    go; reconcile() rescans a directory only when its mtime has changed, which
+    catches files added or removed outside the tool.
+    """
+    def __init__(self, db_path=CATALOG_PATH, directories=None):
+        self.db_path = Path(db_path)
+        self.directories = directories or {BACKUP: Path(LOCAL_BACKUP_DIR), ARCHIVE: Path(DOWNLOADS_DIR)}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    # --- Incremental updates ---
+    def record(self, kind, path, sha256=None, insid=None):
+        """Insert or refresh one file from its current stat"""
+        path = Path(path)
+        stat = path.stat()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO files (kind, name, size, mtime, sha256, insid) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (kind, name) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+                    "sha256 = COALESCE(excluded.sha256, files.sha256), insid = COALESCE(excluded.insid, files.insid)",
+                    (kind, path.name, stat.st_size, stat.st_mtime, sha256, insid))
+
+    def record_archive(self, path, members):
+        """Catalog an archive along with the backups it contains"""
+        self.record(ARCHIVE, path)
+        name = Path(path).name
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM archive_members WHERE archive = ?", (name,))
+                conn.executemany("INSERT OR IGNORE INTO archive_members (archive, member) VALUES (?, ?)",
+                                 [(name, member) for member in members])
+
+    def remove(self, kind, name):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM files WHERE kind = ? AND name = ?", (kind, name))
+                if kind == ARCHIVE:
+                    conn.execute("DELETE FROM archive_members WHERE archive = ?", (name,))
+
+    # --- Reconciliation ---
+    def reconcile(self, kind, force=False):
+        """Sync the catalog with its directory if the directory changed; returns True if it rescanned"""
+        directory = self.directories[kind]
+        try:
+            dir_mtime_ns = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime_ns = 0
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT dir_mtime_ns FROM scans WHERE kind = ?", (kind,)).fetchone()
+            if not force and row is not None and row['dir_mtime_ns'] == dir_mtime_ns:
+                return False
+
+            known = {r['name']: (r['size'], r['mtime'])
+                     for r in conn.execute("SELECT name, size, mtime FROM files WHERE kind = ?", (kind,))}
+            seen = set()
+            changed = []
+            if dir_mtime_ns:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if is_partial_download(entry.name) or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        seen.add(entry.name)
+                        if known.get(entry.name) != (stat.st_size, stat.st_mtime):
+                            changed.append((kind, entry.name, stat.st_size, stat.st_mtime))
+            vanished = [(kind, name) for name in known if name not in seen]
+
+            with conn:
+                conn.executemany(
+                    "INSERT INTO files (kind, name, size, mtime) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (kind, name) DO UPDATE SET size = excluded.size, mtime = excluded.mtime",
+                    changed)
+                conn.executemany("DELETE FROM files WHERE kind = ? AND name = ?", vanished)
+                if kind == ARCHIVE:
+                    conn.executemany("DELETE FROM archive_members WHERE archive = ?",
+                                     [(name,) for _, name in vanished])
+                conn.execute("INSERT OR REPLACE INTO scans (kind, dir_mtime_ns) VALUES (?, ?)",
+                             (kind, dir_mtime_ns))
+            return True
+
+    # --- Queries ---
+    def count(self, kind):
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM files WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def total_size(self, kind):
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def query(self, kind, sort='mtime', descending=True, limit=50, offset=0):
+        """One page of catalog rows as dicts (name, size, modified, path, sha256, insid)"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {sort}")
+        order = 'DESC' if descending else 'ASC'
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                f"SELECT name, size, mtime, sha256, insid FROM files WHERE kind = ? "
+                f"ORDER BY {sort} {order}, name ASC LIMIT ? OFFSET ?",
+                (kind, int(limit), int(offset))).fetchall()
+            page = []
+            for row in rows:
+                item = {
+                    'name': row['name'],
+                    'size': row['size'],
+                    'modified': datetime.datetime.fromtimestamp(row['mtime']),
+                    'path': self.directories[kind] / row['name'],
+                    'sha256': row['sha256'],
+                    'insid': row['insid']
+                }
+                if kind == ARCHIVE:
+                    item['members'] = [r['member'] for r in conn.execute(
+                        "SELECT member FROM archive_members WHERE archive = ? ORDER BY member", (row['name'],))]
+                else:
+                    item['archives'] = [r['archive'] for r in conn.execute(
+                        "SELECT archive FROM archive_members WHERE member = ? ORDER BY archive", (row['name'],))]
+                page.append(item)
+            return page
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Global catalog for LOCAL_BACKUP_DIR and DOWNLOADS_DIR
+backup_catalog = BackupCatalog()
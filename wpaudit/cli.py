@@ -0,0 +1,317 @@
+"""Headless batch runner: python -m wpaudit <command>
+
+Lists installations, runs plugin updates, core upgrades and backups across
+a filtered set of sites, and downloads backups, printing JSON results on
+stdout. It drives the same client, BulkExecutor and AuditLogger as the
+Streamlit app without importing Streamlit, so it starts fast from cron.
+
+Credentials come from --host/--port/--user or CPANEL_HOST, CPANEL_PORT,
+CPANEL_USER and CPANEL_PASS, read from the environment or a .env file.
+The password is never taken on the command line.
+"""
+import argparse
+import datetime
+import fnmatch
+import getpass
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from . import downloads
+from .audit import audit_logger
+from .client import BulkExecutor, audit_site, get_client, run_sync
+from .config import BULK_MAX_WORKERS, BULK_PER_HOST_LIMIT, DOWNLOAD_MAX_WORKERS, DOWNLOAD_BANDWIDTH_LIMIT
+from .tracing import tracer
+
+# Exit statuses
+EXIT_OK = 0
+EXIT_FAILURES = 1  # The run finished but some sites or backups failed
+EXIT_ERROR = 2  # Bad credentials or arguments, or the listing itself failed
+
+# --step name -> audit_site option
+STEPS = {
+    'plugins': "Update all plugins",
+    'core': "Upgrade WordPress core",
+    'backup': "Create backups"
+}
+
+# --- Credentials ---
+def read_env_file(path):
+    """KEY=VALUE pairs of a .env file; blank lines and # comments are skipped"""
+    values = {}
+    path = Path(path)
+    if not path.is_file():
+        return values
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        key = key.strip()
+        if key.startswith('export '):
+            key = key[len('export '):].strip()
+        values[key] = value.strip().strip('\'"')
+    return values
+
+def load_credentials(args):
+    """Client credentials from arguments, the environment and the .env file, in that order"""
+    env = read_env_file(args.env_file) if args.env_file else {}
+    env.update(os.environ)
+    creds = {
+        'host': args.host or env.get('CPANEL_HOST'),
+        'port': str(args.port or env.get('CPANEL_PORT') or 2083),
+        'user': args.user or env.get('CPANEL_USER'),
+        'pass': env.get('CPANEL_PASS')
+    }
+    if not creds['pass'] and sys.stdin.isatty():
+        creds['pass'] = getpass.getpass(f"cPanel password for {creds['user']}@{creds['host']}: ")
+    scheme = env.get('CPANEL_SCHEME')
+    if scheme:
+        creds['scheme'] = scheme
+    missing = [name for name, key in (('CPANEL_HOST', 'host'), ('CPANEL_USER', 'user'), ('CPANEL_PASS', 'pass'))
+               if not creds[key]]
+    if missing:
+        return None, f"Missing credentials: {', '.join(missing)}"
+    return creds, None
+
+# --- Site selection ---
+def site_matches(installation, patterns):
+    """True when any glob matches the site's display name, URL, domain or insid"""
+    display_name = installation['display_name']
+    candidates = (display_name, display_name.rstrip('/'), installation['domain'], installation['insid'])
+    return any(fnmatch.fnmatch(candidate.lower(), pattern.lower())
+               for pattern in patterns for candidate in candidates)
+
+def filter_installations(installations, args):
+    """Installations selected by --site/--exclude/--insid/--owner/--version/--limit"""
+    selected = []
+    for installation in installations:
+        if args.site and not site_matches(installation, args.site):
+            continue
+        if args.exclude and site_matches(installation, args.exclude):
+            continue
+        if args.insid and installation['insid'] not in args.insid:
+            continue
+        if args.owner and installation['user'] not in args.owner:
+            continue
+        if args.version and not any(fnmatch.fnmatch(installation['version'], pattern) for pattern in args.version):
+            continue
+        selected.append(installation)
+    return selected[:args.limit] if args.limit else selected
+
+# --- Output ---
+class ResultWriter:
+    """Machine-readable output: one JSON document, or JSON Lines streamed as results arrive"""
+    def __init__(self, stream, output_format='json'):
+        self.stream = stream
+        self.output_format = output_format
+        self.records = []
+
+    def record(self, record):
+        if self.output_format == 'jsonl':
+            self.stream.write(json.dumps({'type': 'result', **record}, default=str) + '\n')
+            self.stream.flush()
+        else:
+            self.records.append(record)
+
+    def finish(self, summary):
+        if self.output_format == 'jsonl':
+            self.stream.write(json.dumps({'type': 'summary', **summary}, default=str) + '\n')
+        else:
+            json.dump({'summary': summary, 'results': self.records}, self.stream, indent=2, default=str)
+            self.stream.write('\n')
+        self.stream.flush()
+
+def progress(args, message):
+    """Human-readable progress on stderr, so stdout stays machine-readable"""
+    if not args.quiet:
+        print(message, file=sys.stderr, flush=True)
+
+# --- Commands ---
+def command_list(client, args, writer):
+    """Print the selected installations"""
+    installations, error = run_sync(client.list_wordpress_installations())
+    if error:
+        return None, error
+    selected = filter_installations(installations, args)
+    for installation in selected:
+        writer.record(installation)
+    return {'command': 'list', 'installations': len(installations), 'selected': len(selected)}, None
+
+def command_run(client, args, writer):
+    """Run the chosen steps on every selected installation concurrently"""
+    installations, error = run_sync(client.list_wordpress_installations())
+    if error:
+        return None, error
+    domains = filter_installations(installations, args)
+    audit_options = [STEPS[step] for step in args.step]
+    summary = {'command': 'run', 'steps': args.step, 'sites': len(domains), 'dry_run': args.dry_run,
+               'sites_ok': 0, 'sites_failed': 0, 'succeeded': 0, 'failed': 0}
+    if args.dry_run:
+        for domain in domains:
+            writer.record({'insid': domain['insid'], 'site': domain['display_name'], 'planned': args.step})
+        return summary, None
+
+    results = {'success': [], 'errors': []}
+    details = {'audit_options': audit_options, 'max_workers': args.workers, 'per_host_limit': args.per_host,
+               'source': 'cli'}
+    audit_logger.log_bulk_operation('BULK_AUDIT_START', len(domains), results, details=details)
+
+    executor = BulkExecutor(args.workers, args.per_host)
+    site_fn = lambda domain: audit_site(client, domain, audit_options)
+    on_error = lambda domain, e: [(False, f"Unexpected error for {domain['display_name']}: {e}")]
+    site_results = executor.run(domains, site_fn, host=client.credentials['host'], on_error=on_error,
+                                operation='cli_run')
+    for completed, (domain, outcomes) in enumerate(site_results, 1):
+        ok = all(outcome_ok for outcome_ok, message in outcomes)
+        for outcome_ok, message in outcomes:
+            results['success' if outcome_ok else 'errors'].append(message)
+        summary['sites_ok' if ok else 'sites_failed'] += 1
+        writer.record({'insid': domain['insid'], 'site': domain['display_name'], 'ok': ok,
+                       'outcomes': [{'ok': outcome_ok, 'message': message} for outcome_ok, message in outcomes]})
+        progress(args, f"[{completed}/{len(domains)}] {'ok  ' if ok else 'FAIL'} {domain['display_name']}")
+
+    audit_logger.log_bulk_operation('BULK_AUDIT_COMPLETE', len(domains), results, details=details)
+    summary['succeeded'] = len(results['success'])
+    summary['failed'] = len(results['errors'])
+    return summary, None
+
+def command_download(client, args, writer):
+    """Download server backups of the selected installations into the local store"""
+    listing, error = run_sync(client.list_backups())
+    if error:
+        return None, error
+    metadata = downloads.backup_metadata(listing)
+
+    names = sorted(metadata)
+    if args.backup:
+        names = [name for name in names if any(fnmatch.fnmatch(name, pattern) for pattern in args.backup)]
+    if args.site or args.exclude or args.insid or args.owner or args.version or args.limit:
+        installations, error = run_sync(client.list_wordpress_installations())
+        if error:
+            return None, error
+        insids = {installation['insid'] for installation in filter_installations(installations, args)}
+        names = [name for name in names if metadata[name]['insid'] in insids]
+    if args.since_hours:
+        cutoff = time.time() - args.since_hours * 3600
+        names = [name for name in names if (metadata[name]['mtime'] or 0) >= cutoff]
+    if args.latest:
+        newest = {}
+        for name in sorted(names, key=lambda name: metadata[name]['mtime'] or 0, reverse=True):
+            newest.setdefault(metadata[name]['insid'], []).append(name)
+        names = sorted(name for group in newest.values() for name in group[:args.latest])
+
+    summary = {'command': 'download', 'backups': len(names), 'dry_run': args.dry_run}
+    if args.dry_run:
+        for name in names:
+            writer.record({'backup': name, **metadata[name], 'planned': True})
+        return summary, None
+
+    def on_progress(filename, bytes_done, total_bytes, bytes_per_second, status):
+        if status in ('done', 'skipped', 'failed'):
+            progress(args, f"{status:8} {filename}")
+
+    started = time.perf_counter()
+    results = run_sync(downloads.bulk_download_backups(
+        client, names, on_progress, args.workers, args.bandwidth_limit, downloads.backup_sizes(listing),
+        dest_dir=args.dest, metadata=metadata))
+    elapsed = time.perf_counter() - started
+
+    for status, group in (('downloaded', results['success']), ('skipped', results['skipped'])):
+        for name in group:
+            writer.record({'backup': name, 'status': status, **metadata[name]})
+    for name, error in results['errors'].items():
+        writer.record({'backup': name, 'status': 'failed', 'error': error, **metadata.get(name, {})})
+
+    downloaded_bytes = sum(metadata[name]['size'] for name in results['success'])
+    summary.update({'downloaded': len(results['success']), 'skipped': len(results['skipped']),
+                    'failed': len(results['errors']), 'bytes': downloaded_bytes, 'seconds': round(elapsed, 3),
+                    'mb_per_s': round(downloaded_bytes / max(elapsed, 1e-6) / (1024 * 1024), 1)})
+    return summary, None
+
+COMMANDS = {'list': command_list, 'run': command_run, 'download': command_download}
+
+# --- Arguments ---
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m wpaudit', description=__doc__.splitlines()[0])
+    connection = argparse.ArgumentParser(add_help=False)
+    group = connection.add_argument_group("connection")
+    group.add_argument('--host', help="cPanel host (default: $CPANEL_HOST)")
+    group.add_argument('--port', help="cPanel port (default: $CPANEL_PORT or 2083)")
+    group.add_argument('--user', help="cPanel user (default: $CPANEL_USER); the password comes from $CPANEL_PASS")
+    group.add_argument('--env-file', default='.env', help="File with CPANEL_* settings (default: .env)")
+
+    output = connection.add_argument_group("output")
+    output.add_argument('--format', choices=['json', 'jsonl'], default='json',
+                        help="One JSON document, or one JSON object per line with a final summary line")
+    output.add_argument('--output', '-o', type=Path, help="Write results to this file instead of stdout")
+    output.add_argument('--quiet', '-q', action='store_true', help="No progress lines on stderr")
+    output.add_argument('--trace', action='store_true', help="Record a Chrome trace of the run under logs/traces")
+
+    selection = connection.add_argument_group("site selection")
+    selection.add_argument('--site', action='append', metavar='GLOB',
+                           help="Only sites whose domain, URL or insid matches (repeatable)")
+    selection.add_argument('--exclude', action='append', metavar='GLOB', help="Skip matching sites (repeatable)")
+    selection.add_argument('--insid', action='append', help="Only this installation id (repeatable)")
+    selection.add_argument('--owner', action='append', help="Only installations of this cPanel user (repeatable)")
+    selection.add_argument('--version', action='append', metavar='GLOB',
+                           help="Only WordPress versions matching, e.g. '5.*' (repeatable)")
+    selection.add_argument('--limit', type=int, help="At most this many sites")
+
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', parents=[connection], help="List WordPress installations")
+
+    run = commands.add_parser('run', parents=[connection], help="Update plugins, upgrade core or back up sites")
+    run.add_argument('--step', action='append', choices=list(STEPS), required=True,
+                     help="Step to run on every selected site (repeatable): " + ", ".join(STEPS))
+    run.add_argument('--workers', type=int, default=BULK_MAX_WORKERS, help="Sites processed in parallel")
+    run.add_argument('--per-host', type=int, default=BULK_PER_HOST_LIMIT, help="Parallel sites per cPanel host")
+    run.add_argument('--dry-run', action='store_true', help="Print the selected sites without changing them")
+
+    download = commands.add_parser('download', parents=[connection], help="Download server backups")
+    download.add_argument('--backup', action='append', metavar='GLOB', help="Only backups whose name matches")
+    download.add_argument('--latest', type=int, metavar='N', help="Only the newest N backups of each site")
+    download.add_argument('--since-hours', type=float, help="Only backups made in the last N hours")
+    download.add_argument('--dest', type=Path, help="Backup directory (default: the app's backups/)")
+    download.add_argument('--workers', type=int, default=DOWNLOAD_MAX_WORKERS, help="Backups downloaded in parallel")
+    download.add_argument('--bandwidth-limit', type=int, default=DOWNLOAD_BANDWIDTH_LIMIT,
+                          help="Aggregate bytes/second (0 = unlimited)")
+    download.add_argument('--dry-run', action='store_true', help="Print the selected backups without downloading")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stream = open(args.output, 'w') if args.output else sys.stdout
+    writer = ResultWriter(stream, args.format)
+    try:
+        creds, error = load_credentials(args)
+        if error:
+            writer.finish({'command': args.command, 'error': error})
+            return EXIT_ERROR
+
+        audit_logger.bind_context(username=creds['user'])
+        client = get_client(creds)
+        started = datetime.datetime.now()
+        try:
+            with tracer.recording(f"cli {args.command}", enabled=args.trace) as trace:
+                summary, error = COMMANDS[args.command](client, args, writer)
+        finally:
+            run_sync(client.close())
+
+        if error:
+            writer.finish({'command': args.command, 'error': error})
+            return EXIT_ERROR
+        summary.setdefault('seconds', round((datetime.datetime.now() - started).total_seconds(), 3))
+        summary.update({'host': creds['host'], 'started': started.isoformat()})
+        if trace is not None:
+            audit_logger.log_file_operation('TRACE_EXPORT', trace.path, 'SUCCESS',
+                                            details={'events': len(trace.events), 'dropped': trace.dropped})
+            summary['trace'] = str(trace.path)
+        writer.finish(summary)
+        return EXIT_FAILURES if summary.get('failed') or summary.get('sites_failed') else EXIT_OK
+    finally:
+        audit_logger.flush()
+        if stream is not sys.stdout:
+            stream.close()
@@ -0,0 +1,701 @@
+"""Native asyncio Softaculous client shared by the Streamlit UI and headless runners"""
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import datetime
+import hashlib
+import queue
+import threading
+
+import aiohttp
+
+from .audit import audit_logger
+from .cache import ResponseCache, response_cache
+from . import phpdecode
+from .limiter import get_limiter
+from .metrics import record_api_call, track_bulk_operation
+from .resilience import (
+    RETRYABLE_STATUS_CODES, CircuitOpenError, backoff_delay, get_breaker, parse_retry_after
+)
+from .tracing import tracer
+from .config import (
+    SOFTACULOUS_PATH, REQUEST_TIMEOUT, CONNECTION_TEST_TIMEOUT, RETRY_MAX_ATTEMPTS,
+    HTTP_POOL_SIZE, HTTP_KEEPALIVE, BULK_MAX_WORKERS, BULK_PER_HOST_LIMIT
+)
+
+# --- Background Event Loop ---
+class EventLoopThread:
+    """Event loop running in a daemon thread, used by synchronous callers"""
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the loop thread if it is not running yet"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, name='softaculous-event-loop', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future"""
+        self.start()
+        future = concurrent.futures.Future()
+
+        # Run the task in the caller's context so audit identity carries over
+        context = contextvars.copy_context()
+
+        def start_task():
+            if not future.set_running_or_notify_cancel():
+                coro.close()
+                return
+            task = self.loop.create_task(coro)
+
+            def copy_result(task):
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+
+            task.add_done_callback(copy_result)
+
+        self.loop.call_soon_threadsafe(start_task, context=context)
+        return future
+
+    def run(self, coro):
+        """Run a coroutine on the loop and wait for its result"""
+        return self.submit(coro).result()
+
+# Global event loop shared by every synchronous caller
+event_loop = EventLoopThread()
+
+def run_sync(coro):
+    """Run a client coroutine from synchronous code"""
+    return event_loop.run(coro)
+
+class ProgressRelay:
+    """Hands progress events raised on the event loop to the calling thread"""
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._events = queue.Queue()
+
+    def __call__(self, *args):
+        # Called from the event loop; never touches the UI directly
+        if self.callback is not None:
+            self._events.put(args)
+
+    def _drain(self):
+        while True:
+            try:
+                args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            self.callback(*args)
+
+    def run(self, coro):
+        """Run a coroutine, delivering its progress events on this thread"""
+        future = event_loop.submit(coro)
+        while True:
+            try:
+                result = future.result(timeout=0.1)
+                break
+            except concurrent.futures.TimeoutError:
+                if self.callback is not None:
+                    self._drain()
+        if self.callback is not None:
+            self._drain()
+        return result
+
+# --- HTTP Connection Pool ---
+def credentials_key(creds):
+    """Build the pool key for a credential set and host"""
+    password_hash = hashlib.sha256(str(creds.get('pass', '')).encode()).hexdigest()[:16]
+    return (creds['host'], str(creds['port']), creds['user'], password_hash)
+
+class ConnectionPool:
+    """Shared keep-alive HTTP sessions, one per credential set and host"""
+    def __init__(self, pool_size=HTTP_POOL_SIZE, keepalive=HTTP_KEEPALIVE):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self._sessions = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _trace_config(self, counters):
+        """Count new vs. reused connections for one pool entry"""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_create(session, ctx, params):
+            counters['opened'] += 1
+
+        async def on_reuse(session, ctx, params):
+            counters['reused'] += 1
+
+        async def on_request(session, ctx, params):
+            counters['requests'] += 1
+
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        trace_config.on_request_start.append(on_request)
+        return trace_config
+
+    def get_session(self, creds):
+        """Get (or create) the pooled session for a credential set; call from the event loop"""
+        key = credentials_key(creds)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or session.closed:
+                counters = self._counters.setdefault(key, {'opened': 0, 'reused': 0, 'requests': 0})
+                connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                                 limit_per_host=self.pool_size,
+                                                 force_close=not self.keepalive,
+                                                 ssl=False)
+                session = aiohttp.ClientSession(connector=connector,
+                                                auth=aiohttp.BasicAuth(creds['user'], creds['pass']),
+                                                trace_configs=[self._trace_config(counters)])
+                self._sessions[key] = session
+            return session
+
+    def stats(self, creds):
+        """Connection counters (opened vs. reused) for a credential set"""
+        with self._lock:
+            counters = self._counters.get(credentials_key(creds), {'opened': 0, 'reused': 0, 'requests': 0})
+            return dict(counters)
+
+    async def close(self, creds):
+        """Close the pooled session for a credential set and keep its counters"""
+        with self._lock:
+            session = self._sessions.pop(credentials_key(creds), None)
+        if session is not None:
+            await session.close()
+
+    async def close_all(self):
+        """Close every pooled session"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            await session.close()
+
+# Global connection pool instance
+connection_pool = ConnectionPool()
+
+# --- Softaculous API Client ---
+class SoftaculousClient:
+    """Async Softaculous API client for one set of cPanel credentials"""
+    def __init__(self, credentials, pool=None, audit=None, limiter=None, breaker=None, cache=None):
+        self.credentials = credentials
+        self.pool = pool or connection_pool
+        self.audit = audit or audit_logger
+        self.limiter = limiter or get_limiter(credentials['host'])
+        self.breaker = breaker or get_breaker(credentials['host'])
+        self.cache = cache or response_cache
+
+    @property
+    def cache_scope(self):
+        creds = self.credentials
+        return (creds['host'], str(creds['port']), creds['user'])
+
+    def invalidate(self, *tags):
+        """Drop cached listings affected by a successful mutation"""
+        for tag in tags:
+            self.cache.invalidate(self.cache_scope, tag)
+
+    @property
+    def base_url(self):
+        creds = self.credentials
+        # 'scheme' is only set for local stand-ins such as the benchmark mock server
+        return f"{creds.get('scheme', 'https')}://{creds['host']}:{creds['port']}{SOFTACULOUS_PATH}"
+
+    def _log_call(self, act, result, response_time=None, details=None):
+        """Audit-log one request attempt and count it in the process metrics"""
+        host = self.credentials['host']
+        record_api_call(act, host, result == 'SUCCESS', response_time)
+        with tracer.span('audit.log_api_call', 'logging'):
+            self.audit.log_api_call('softaculous', act, result, host=host, response_time=response_time,
+                                    details=details)
+
+    async def request(self, act, post_data=None, additional_params=None, idempotent=False, cache_tag=None,
+                      decode=phpdecode.loads):
+        """Make authenticated request to Softaculous API
+
+        decode turns the serialized body into the result; the default gives
+        nested dicts with str keys, phpdecode.installations and
+        phpdecode.plugins give the final records directly.
+        """
+        with tracer.span('softaculous.request', 'softaculous', act=act):
+            return await self._request(act, post_data, additional_params, idempotent, cache_tag, decode)
+
+    async def _request(self, act, post_data, additional_params, idempotent, cache_tag, decode):
+        params = {
+            'act': act,
+            'api': 'serialize'
+        }
+
+        if additional_params:
+            params.update(additional_params)
+
+        # Serve read-only listings from the cache when fresh
+        cache_key = None
+        if cache_tag is not None:
+            cache_key = ResponseCache.make_key(self.cache_scope, act, params, post_data, decode.__name__)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached, None
+
+        # Only read-only acts are safe to send more than once
+        attempts = RETRY_MAX_ATTEMPTS if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                self.breaker.allow_request()
+            except CircuitOpenError as e:
+                self._log_call(act, 'FAILURE', details={'error': str(e), 'circuit': self.breaker.state,
+                                                        'attempt': attempt + 1})
+                return None, str(e)
+
+            recorded = False
+            try:
+                with tracer.span('softaculous.send', 'softaculous', act=act, attempt=attempt + 1) as span:
+                    result, error, status_code, retry_after = await self._send(act, params, post_data, attempt,
+                                                                               decode)
+                    span['status_code'] = status_code
+
+                # 4xx other than 429 means the server is up and answering
+                transport_failed = status_code is None or status_code >= 500 or status_code == 429
+                self.breaker.record(success=not (error and transport_failed))
+                recorded = True
+            finally:
+                if not recorded:
+                    # Cancelled mid-request: free a half-open probe slot so the breaker can probe again
+                    self.breaker.release()
+
+            if not error and cache_key is not None:
+                self.cache.put(cache_key, result, cache_tag)
+
+            retryable = status_code is None or status_code in RETRYABLE_STATUS_CODES
+            if not error or not retryable or attempt == attempts - 1:
+                return result, error
+
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+    async def _send(self, act, params, post_data, attempt, decode):
+        """Send one request attempt, returning (result, error, status_code, retry_after)"""
+        # Wait for a slot under the host's adaptive concurrency limit
+        with tracer.span('limiter.wait', 'softaculous'):
+            await self.limiter.acquire()
+        start_time = datetime.datetime.now()
+        released = False
+        status_code = None
+        try:
+            session = self.pool.get_session(self.credentials)
+            timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            query = {k: str(v) for k, v in params.items()}
+            if post_data:
+                form = {k: str(v) for k, v in post_data.items()}
+                response_ctx = session.post(self.base_url, params=query, data=form, timeout=timeout)
+            else:
+                response_ctx = session.get(self.base_url, params=query, timeout=timeout)
+
+            async with response_ctx as response:
+                status_code = response.status
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                content = await response.read()
+
+            response_time = (datetime.datetime.now() - start_time).total_seconds()
+            self.limiter.release(act, response_time, status_code, failed=status_code >= 500)
+            released = True
+            concurrency = {'limit': int(self.limiter.limit), 'in_flight': self.limiter.in_flight}
+
+            if status_code == 200:
+                # Parse serialized PHP response
+                with tracer.span('decode', 'parse', decoder=decode.__name__, bytes=len(content)):
+                    result = decode(content)
+
+                self._log_call(act, 'SUCCESS', response_time=response_time,
+                               details={'params': params, 'response_size': len(content),
+                                        'concurrency': concurrency, 'attempt': attempt + 1})
+                return result, None, status_code, None
+            else:
+                text = content.decode('utf-8', errors='replace')
+                self._log_call(act, 'FAILURE', response_time=response_time,
+                               details={'status_code': status_code, 'error': text,
+                                        'concurrency': concurrency, 'attempt': attempt + 1})
+                return None, f"HTTP {status_code}: {text}", status_code, retry_after
+
+        except Exception as e:
+            response_time = (datetime.datetime.now() - start_time).total_seconds()
+            if not released:
+                # Failed before a response arrived (timeout, connection error)
+                self.limiter.release(act, failed=True)
+                released = True
+            error = str(e) or type(e).__name__
+            self._log_call(act, 'FAILURE', response_time=response_time,
+                           details={'error': error,
+                                    'concurrency': {'limit': int(self.limiter.limit),
+                                                    'in_flight': self.limiter.in_flight},
+                                    'attempt': attempt + 1})
+            # status_code stays None unless a response arrived (e.g. it failed to parse)
+            return None, error, status_code, None
+        finally:
+            if not released:
+                # Cancelled while in flight
+                self.limiter.release(act, failed=True)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, act, additional_params=None, headers=None):
+        """Open a streaming GET for large bodies (backup files); yields the aiohttp response"""
+        params = {
+            'act': act,
+            'api': 'serialize'
+        }
+
+        if additional_params:
+            params.update(additional_params)
+
+        self.breaker.allow_request()
+
+        # The limiter slot only covers time-to-first-byte; transfer time says
+        # nothing about server load and is bounded by the download scheduler
+        limiter_act = f'{act}:stream'
+        start_time = datetime.datetime.now()
+        acquired = released = recorded = False
+        try:
+            await self.limiter.acquire()
+            acquired = True
+            start_time = datetime.datetime.now()
+            session = self.pool.get_session(self.credentials)
+            # No total timeout: only fail when the connection stalls
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+            query = {k: str(v) for k, v in params.items()}
+            async with session.get(self.base_url, params=query, headers=headers, timeout=timeout) as response:
+                first_byte_time = (datetime.datetime.now() - start_time).total_seconds()
+                self.limiter.release(limiter_act, first_byte_time, response.status,
+                                     failed=response.status >= 500)
+                released = True
+                self.breaker.record(success=response.status < 500 and response.status != 429)
+                recorded = True
+                self._log_call(act, 'SUCCESS' if response.status < 400 else 'FAILURE',
+                               response_time=first_byte_time,
+                               details={'params': params, 'status_code': response.status,
+                                        'streaming': True, 'content_length': response.content_length})
+                yield response
+        except Exception as e:
+            if not recorded:
+                if acquired and not released:
+                    self.limiter.release(limiter_act, failed=True)
+                    released = True
+                self.breaker.record(success=False)
+                recorded = True
+                self._log_call(act, 'FAILURE', response_time=(datetime.datetime.now() - start_time).total_seconds(),
+                               details={'params': params, 'streaming': True,
+                                        'error': str(e) or type(e).__name__})
+            raise
+        finally:
+            if acquired and not released:
+                self.limiter.release(limiter_act, failed=True)
+            if not recorded:
+                # Cancelled before the response: free a half-open probe slot so the breaker can probe again
+                self.breaker.release()
+
+    async def test_connection(self):
+        """Test if the cPanel credentials work"""
+        creds = self.credentials
+        try:
+            session = self.pool.get_session(creds)
+            timeout = aiohttp.ClientTimeout(total=CONNECTION_TEST_TIMEOUT)
+            params = {'act': 'home', 'api': 'json'}
+            async with session.get(self.base_url, params=params, timeout=timeout) as response:
+                status_code = response.status
+                await response.read()
+
+            if status_code == 200:
+                self.audit.log_auth_event('LOGIN_TEST', 'SUCCESS',
+                                          details={'host': creds['host'], 'port': creds['port'],
+                                                   'user': creds['user']})
+                return True
+            else:
+                self.audit.log_auth_event('LOGIN_TEST', 'FAILURE',
+                                          details={'host': creds['host'], 'port': creds['port'],
+                                                   'user': creds['user'], 'status_code': status_code})
+                await self.pool.close(creds)
+                return False
+        except Exception as e:
+            self.audit.log_auth_event('LOGIN_TEST', 'FAILURE',
+                                      details={'host': creds['host'], 'port': creds['port'],
+                                               'user': creds['user'], 'error': str(e) or type(e).__name__})
+            await self.pool.close(creds)
+            return False
+
+    async def close(self):
+        """Tear down the pooled connections and cached responses for these credentials"""
+        await self.pool.close(self.credentials)
+        self.cache.invalidate_scope(self.cache_scope)
+
+    async def list_wordpress_installations(self):
+        """List all WordPress installations"""
+        result, error = await self.request('wordpress', idempotent=True, cache_tag=('installations',),
+                                           decode=phpdecode.installations)
+        if error:
+            return None, error
+
+        # Records come from the cache too; hand out copies
+        return [dict(installation) for installation in result], None
+
+    async def get_plugins_for_installation(self, insid):
+        """Get all plugins for a specific WordPress installation"""
+        post_data = {
+            'insid': insid,
+            'type': 'plugins',
+            'list': '1'
+        }
+
+        result, error = await self.request('wordpress', post_data, idempotent=True,
+                                           cache_tag=('plugins', str(insid)), decode=phpdecode.plugins)
+        if error:
+            self.audit.log_site_access(f"Site_{insid}", 'PLUGIN_LIST', 'FAILURE',
+                                       details={'error': error})
+            return None, error
+
+        plugins = [dict(plugin) for plugin in result]
+
+        self.audit.log_site_access(f"Site_{insid}", 'PLUGIN_LIST', 'SUCCESS',
+                                   details={'plugin_count': len(plugins)})
+        return plugins, None
+
+    async def update_plugin(self, insid, plugin_slug=None):
+        """Update a specific plugin or all plugins"""
+        post_data = {
+            'insid': insid,
+            'type': 'plugins'
+        }
+
+        if plugin_slug:
+            post_data['slug'] = plugin_slug
+            post_data['update'] = '1'
+            action = f'PLUGIN_UPDATE_{plugin_slug}'
+        else:
+            post_data['bulk_update'] = '1'
+            action = 'PLUGIN_BULK_UPDATE'
+
+        result, error = await self.request('wordpress', post_data)
+
+        if error:
+            self.audit.log_site_access(f"Site_{insid}", action, 'FAILURE',
+                                       details={'error': error})
+        else:
+            self.invalidate(('plugins', str(insid)))
+            self.audit.log_site_access(f"Site_{insid}", action, 'SUCCESS',
+                                       details={'plugin_slug': plugin_slug})
+
+        return result, error
+
+    async def activate_plugin(self, insid, plugin_slug):
+        """Activate a plugin"""
+        post_data = {
+            'insid': insid,
+            'type': 'plugins',
+            'slug': plugin_slug,
+            'activate': '1'
+        }
+
+        result, error = await self.request('wordpress', post_data)
+
+        if error:
+            self.audit.log_site_access(f"Site_{insid}", f'PLUGIN_ACTIVATE_{plugin_slug}', 'FAILURE',
+                                       details={'error': error})
+        else:
+            self.invalidate(('plugins', str(insid)))
+            self.audit.log_site_access(f"Site_{insid}", f'PLUGIN_ACTIVATE_{plugin_slug}', 'SUCCESS')
+
+        return result, error
+
+    async def deactivate_plugin(self, insid, plugin_slug):
+        """Deactivate a plugin"""
+        post_data = {
+            'insid': insid,
+            'type': 'plugins',
+            'slug': plugin_slug,
+            'deactivate': '1'
+        }
+
+        result, error = await self.request('wordpress', post_data)
+
+        if error:
+            self.audit.log_site_access(f"Site_{insid}", f'PLUGIN_DEACTIVATE_{plugin_slug}', 'FAILURE',
+                                       details={'error': error})
+        else:
+            self.invalidate(('plugins', str(insid)))
+            self.audit.log_site_access(f"Site_{insid}", f'PLUGIN_DEACTIVATE_{plugin_slug}', 'SUCCESS')
+
+        return result, error
+
+    async def install_plugin(self, insid, plugin_slug):
+        """Install a plugin from WordPress.org"""
+        post_data = {
+            'insid': insid,
+            'type': 'plugins',
+            'slug': plugin_slug,
+            'install': '1'
+        }
+
+        result, error = await self.request('wordpress', post_data)
+        if not error:
+            self.invalidate(('plugins', str(insid)))
+        return result, error
+
+    async def create_backup(self, insid):
+        """Create a backup for a WordPress installation"""
+        post_data = {
+            'backupins': '1',
+            'backup_dir': '1',
+            'backup_datadir': '1',
+            'backup_db': '1'
+        }
+
+        result, error = await self.request('backup', post_data, {'insid': insid})
+
+        if error:
+            self.audit.log_site_access(f"Site_{insid}", 'BACKUP_CREATE', 'FAILURE',
+                                       details={'error': error})
+        else:
+            self.invalidate(('backups',))
+            self.audit.log_site_access(f"Site_{insid}", 'BACKUP_CREATE', 'SUCCESS')
+
+        return result, error
+
+    async def list_backups(self):
+        """List all backups"""
+        result, error = await self.request('backups', idempotent=True, cache_tag=('backups',))
+        return result, error
+
+    async def download_backup(self, backup_filename):
+        """Download a backup file"""
+        params = {'download': backup_filename}
+        result, error = await self.request('backups', additional_params=params, idempotent=True)
+        return result, error
+
+    async def delete_backup(self, backup_filename):
+        """Delete a backup file"""
+        params = {'remove': backup_filename}
+        result, error = await self.request('backups', additional_params=params)
+        if not error:
+            self.invalidate(('backups',))
+        return result, error
+
+    async def upgrade_wordpress_installation(self, insid):
+        """Upgrade WordPress installation"""
+        post_data = {'softsubmit': '1'}
+        result, error = await self.request('upgrade', post_data, {'insid': insid})
+        if not error:
+            # A core upgrade changes the listed version and can change plugin updates
+            self.invalidate(('installations',), ('plugins', str(insid)))
+        return result, error
+
+# --- Bulk Execution Engine ---
+class BulkExecutor:
+    """Bounded fan-out of per-site coroutines with global and per-host caps"""
+    def __init__(self, max_workers=BULK_MAX_WORKERS, per_host_limit=BULK_PER_HOST_LIMIT):
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+
+    async def iter_completed(self, domains, site_fn, host=None, on_error=None):
+        """Run site_fn(domain) for each domain, yielding (domain, result) as sites complete"""
+        global_semaphore = asyncio.Semaphore(self.max_workers)
+        host_semaphores = {}
+
+        def host_semaphore(domain):
+            site_host = host(domain) if callable(host) else host
+            if site_host not in host_semaphores:
+                host_semaphores[site_host] = asyncio.Semaphore(self.per_host_limit)
+            return host_semaphores[site_host]
+
+        async def run_site(domain):
+            # Wait for the host first, so sites queued behind a busy host hold no global slot
+            async with host_semaphore(domain):
+                async with global_semaphore:
+                    try:
+                        return domain, await site_fn(domain)
+                    except Exception as e:
+                        if on_error is None:
+                            raise
+                        return domain, on_error(domain, e)
+
+        for next_done in asyncio.as_completed([run_site(domain) for domain in domains]):
+            yield await next_done
+
+    def run(self, domains, site_fn, host=None, on_error=None, operation='bulk'):
+        """Synchronous generator over iter_completed, driven by the shared event loop"""
+        completed = queue.Queue()
+
+        async def pump():
+            async for item in self.iter_completed(domains, site_fn, host, on_error):
+                completed.put(item)
+
+        with track_bulk_operation(operation, len(domains)) as site_done:
+            future = event_loop.submit(pump())
+            remaining = len(domains)
+            while remaining:
+                try:
+                    item = completed.get(timeout=0.1)
+                except queue.Empty:
+                    if future.done() and completed.empty():
+                        # Surface errors from the fan-out itself
+                        future.result()
+                        break
+                    continue
+                remaining -= 1
+                site_done()
+                yield item
+            future.result()
+
+async def audit_site(client, domain, audit_options):
+    """Run the selected audit steps for one site, returning (ok, message) pairs"""
+    with tracer.span('site', 'bulk', new_lane=True, site=domain['display_name'], insid=domain['insid']):
+        return await _audit_site_steps(client, domain, audit_options)
+
+async def _audit_site_steps(client, domain, audit_options):
+    outcomes = []
+
+    # Update plugins
+    if "Update all plugins" in audit_options:
+        with tracer.span('step update_plugins', 'bulk'):
+            result, error = await client.update_plugin(domain['insid'])
+        if error:
+            outcomes.append((False, f"Plugin update failed for {domain['display_name']}: {error}"))
+        else:
+            outcomes.append((True, f"Plugins updated for {domain['display_name']}"))
+
+    # Upgrade WordPress core
+    if "Upgrade WordPress core" in audit_options:
+        with tracer.span('step upgrade_core', 'bulk'):
+            result, error = await client.upgrade_wordpress_installation(domain['insid'])
+        if error:
+            outcomes.append((False, f"Core upgrade failed for {domain['display_name']}: {error}"))
+        else:
+            outcomes.append((True, f"WordPress core upgraded for {domain['display_name']}"))
+
+    # Create backups
+    if "Create backups" in audit_options:
+        with tracer.span('step create_backup', 'bulk'):
+            result, error = await client.create_backup(domain['insid'])
+        if error:
+            outcomes.append((False, f"Backup failed for {domain['display_name']}: {error}"))
+        else:
+            outcomes.append((True, f"Backup created for {domain['display_name']}"))
+
+    return outcomes
+
+# --- Client Registry ---
+def get_client(credentials):
+    """Get a client for a credential set (connections are pooled per credential set)"""
+    return SoftaculousClient(credentials)
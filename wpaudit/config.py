@@ -0,0 +1,117 @@
+"""Shared configuration for the WordPress audit tool"""
+import os
+from pathlib import Path
+
+# --- Configuration ---
+LOCAL_BACKUP_DIR = Path("./backups")
+DOWNLOADS_DIR = Path("./downloads")
+LOGS_DIR = Path("./logs")
+
+# Softaculous API endpoint (relative to the cPanel host)
+SOFTACULOUS_PATH = "/frontend/jupiter/softaculous/index.live.php"
+REQUEST_TIMEOUT = 30  # Seconds per Softaculous API call
+CONNECTION_TEST_TIMEOUT = 10  # Seconds for the login connection test
+
+# HTTP connection pooling for Softaculous/cPanel requests
+HTTP_POOL_SIZE = 10  # Max keep-alive connections per credential set and host
+HTTP_KEEPALIVE = True  # Reuse TCP/TLS connections between requests
+
+# Bulk operation concurrency
+BULK_MAX_WORKERS = 8  # Global cap on sites processed in parallel
+BULK_PER_HOST_LIMIT = 4  # Cap on parallel sites per cPanel host
+
+# Adaptive (AIMD) concurrency limit on in-flight requests per cPanel host
+CONCURRENCY_INITIAL = 4  # Starting limit
+CONCURRENCY_MIN = 1  # Never go below this many in-flight requests
+CONCURRENCY_MAX = 32  # Never go above this many in-flight requests (also capped at HTTP_POOL_SIZE)
+CONCURRENCY_LATENCY_TOLERANCE = 2.0  # Back off when recent latency exceeds baseline by this factor
+CONCURRENCY_BACKOFF_FACTOR = 0.5  # Multiply the limit by this on overload
+CONCURRENCY_DECREASE_COOLDOWN = 1.0  # Seconds between consecutive backoffs
+CONCURRENCY_HISTORY_SIZE = 200  # Limit changes kept for the UI
+
+# Retries for idempotent Softaculous acts (jittered exponential backoff)
+RETRY_MAX_ATTEMPTS = 3  # Total attempts, including the first
+RETRY_BASE_DELAY = 0.5  # Seconds; doubles with each attempt
+RETRY_MAX_DELAY = 8.0  # Upper bound on a single backoff sleep
+
+# Per-host circuit breaker
+BREAKER_WINDOW = 20  # Recent calls used to compute the error rate
+BREAKER_MIN_CALLS = 10  # Calls needed before the breaker may open
+BREAKER_ERROR_THRESHOLD = 0.5  # Error rate that opens the breaker
+BREAKER_RESET_TIMEOUT = 30.0  # Seconds to stay open before probing
+BREAKER_HALF_OPEN_PROBES = 1  # Concurrent probe requests while half-open
+
+# Response cache for read-only acts (seconds per entry kind; 0 disables)
+CACHE_TTLS = {
+    'installations': 300,  # act=wordpress installation list
+    'plugins': 120,  # act=wordpress plugin list for one installation
+    'backups': 60  # act=backups list
+}
+CACHE_MAX_ENTRIES = 512  # LRU bound across all credential sets
+
+# Audit log writer (entries are queued and written by a background thread)
+AUDIT_QUEUE_SIZE = 10000  # Entries buffered before log calls wait for the writer
+AUDIT_FLUSH_INTERVAL = 1.0  # Seconds an entry may wait to be batched with later ones
+AUDIT_BATCH_SIZE = 500  # Entries written per batch at most
+LOG_ROTATE_BYTES = 64 * 1024 * 1024  # Start a new segment once a log reaches this size (0 = never)
+LOG_ROTATE_INTERVAL = 24 * 3600  # Seconds of entries per segment (0 = never)
+LOG_COMPRESS_MIN_AGE = 60  # Seconds a leftover segment must sit unmodified before startup gzips it
+
+# Audit log query index
+LOG_INDEX_PATH = LOGS_DIR / ".index.db"
+LOG_INDEX_BLOCK_ENTRIES = 256  # Entries per indexed block; queries scan only matching blocks
+LOG_QUERY_PAGE_SIZE = 50
+
+# API call telemetry store
+TELEMETRY_PATH = LOGS_DIR / ".telemetry.db"
+
+# Span tracing (opt-in per bulk run)
+TRACES_DIR = LOGS_DIR / "traces"
+TRACE_MAX_EVENTS = 500000  # Spans kept per recording; later ones are counted as dropped
+
+# Backup downloads
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes held in memory per download
+DOWNLOAD_PROGRESS_INTERVAL = 0.25  # Seconds between progress callbacks
+DOWNLOAD_CHECKPOINT_BYTES = 8 * 1024 * 1024  # Flush and record the resume offset this often
+DOWNLOAD_RESUME_ATTEMPTS = 3  # Resume attempts within one download call
+DOWNLOAD_MAX_WORKERS = 3  # Backups downloaded in parallel
+DOWNLOAD_BANDWIDTH_LIMIT = 0  # Aggregate bytes/second across downloads (0 = unlimited)
+
+# Archive settings
+ARCHIVE_LEVELS = {'zip': 6, 'tar.gz': 6, 'tar.zst': 3}  # Default compression level per format
+ARCHIVE_MAX_LEVELS = {'zip': 9, 'tar.gz': 9, 'tar.zst': 22}  # Highest level each format accepts
+ARCHIVE_THREADS = os.cpu_count() or 1
+ARCHIVE_BLOCK_SIZE = 1024 * 1024  # Parallel gzip block size
+ARCHIVE_PIPELINE_BUFFER = 32 * 1024 * 1024  # Bytes buffered between download and compression
+
+# Deduplicating repository settings
+REPOSITORY_DIR = LOCAL_BACKUP_DIR / ".repository"
+REPOSITORY_CHUNK_MIN = 16 * 1024
+REPOSITORY_CHUNK_AVG = 64 * 1024
+REPOSITORY_CHUNK_MAX = 256 * 1024
+REPOSITORY_COMPRESSION_LEVEL = 3
+
+# Local catalog settings
+CATALOG_PATH = LOCAL_BACKUP_DIR / ".store" / "catalog.db"
+CATALOG_PAGE_SIZE = 25
+
+# Local file server settings (streams backup and archive downloads, serves /metrics)
+FILE_SERVER_ENABLED = True
+FILE_SERVER_HOST = "127.0.0.1"
+# Fixed so Prometheus can scrape /metrics from a static config; override with
+# WPAUDIT_FILE_SERVER_PORT (0 = any free port). If the port is taken the
+# endpoint falls back to a free one and the sidebar says so.
+FILE_SERVER_PORT = int(os.environ.get('WPAUDIT_FILE_SERVER_PORT', 9184))
+# URL browsers reach the endpoint at (e.g. through a reverse proxy). When unset,
+# download links point at FILE_SERVER_HOST:port, which suits a browser on the
+# same machine as the app.
+FILE_SERVER_PUBLIC_URL = None
+FILE_SERVER_TOKEN_TTL = 3600  # Seconds a download link stays valid
+# Largest file Streamlit may serve from memory when the file server is unavailable
+INLINE_DOWNLOAD_MAX_BYTES = 256 * 1024 * 1024
+METRICS_ENDPOINT_ENABLED = True  # Serve Prometheus-format metrics at /metrics on the same endpoint
+
+# Ensure directories exist
+LOCAL_BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
+LOGS_DIR.mkdir(parents=True, exist_ok=True)
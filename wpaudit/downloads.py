@@ -0,0 +1,659 @@
+"""Streaming, constant-memory, resumable backup downloads"""
+import asyncio
+import base64
+import concurrent.futures
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+
+import aiohttp
+
+from .archive import COMPRESSED_MAGIC, ArchiveWriter
+from .config import (
+    LOCAL_BACKUP_DIR, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_PROGRESS_INTERVAL,
+    DOWNLOAD_CHECKPOINT_BYTES, DOWNLOAD_RESUME_ATTEMPTS, DOWNLOAD_MAX_WORKERS, DOWNLOAD_BANDWIDTH_LIMIT,
+    ARCHIVE_THREADS, ARCHIVE_PIPELINE_BUFFER
+)
+from .metrics import download_bytes, track_bulk_operation
+from .resilience import backoff_delay
+from .store import BackupStore, backup_store
+
+def local_backup_path(backup_filename, dest_dir=None):
+    """Where a server backup is stored locally (never outside dest_dir)"""
+    return Path(dest_dir or LOCAL_BACKUP_DIR) / Path(backup_filename).name
+
+class TransferMeter:
+    """Tracks bytes transferred and reports throughput at a bounded rate"""
+    def __init__(self, filename, total_bytes=None, progress_callback=None,
+                 interval=DOWNLOAD_PROGRESS_INTERVAL, initial_bytes=0):
+        self.filename = filename
+        self.total_bytes = total_bytes
+        self.progress_callback = progress_callback
+        self.interval = interval
+        self.initial_bytes = initial_bytes
+        self.bytes_done = initial_bytes
+        self.started = time.monotonic()
+        self._last_report = 0.0
+
+    @property
+    def elapsed(self):
+        return max(time.monotonic() - self.started, 1e-6)
+
+    @property
+    def bytes_per_second(self):
+        return (self.bytes_done - self.initial_bytes) / self.elapsed
+
+    def add(self, byte_count):
+        self.bytes_done += byte_count
+        download_bytes.inc(byte_count)
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self.filename, self.bytes_done, self.total_bytes, self.bytes_per_second)
+
+class BandwidthLimiter:
+    """Token bucket shared by concurrent downloads to cap their combined throughput"""
+    def __init__(self, bytes_per_second, burst=None):
+        self.rate = float(bytes_per_second or 0)
+        # Allow at most a quarter-second burst above the cap
+        self.capacity = float(burst or max(self.rate / 4, DOWNLOAD_CHUNK_SIZE))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def consume(self, byte_count):
+        """Account for transferred bytes, sleeping when over budget"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= byte_count
+        if self.tokens < 0:
+            # Each caller sleeps off the debt outstanding when it finished its chunk
+            await asyncio.sleep(-self.tokens / self.rate)
+
+def part_paths(final_path):
+    """The .part file and its JSON sidecar for a download in progress"""
+    part_path = final_path.with_name(final_path.name + '.part')
+    return part_path, part_path.with_name(part_path.name + '.json')
+
+def read_sidecar(sidecar_path):
+    try:
+        with open(sidecar_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_sidecar(sidecar_path, state):
+    """Atomically record resume state (offset and validators)"""
+    temp_path = sidecar_path.with_name(sidecar_path.name + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, sidecar_path)
+
+def parse_content_range(value):
+    """Parse 'bytes start-end/total' into (start, total); total may be None"""
+    match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', value or '')
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), (None if total == '*' else int(total))
+
+def parse_sha256_digest(headers):
+    """Expected SHA-256 (hex) from a Digest or Repr-Digest header, if the server sends one"""
+    for header in ('Repr-Digest', 'Digest'):
+        for item in (headers.get(header) or '').split(','):
+            name, _, value = item.strip().partition('=')
+            if name.lower() == 'sha-256' and value:
+                try:
+                    return base64.b64decode(value.strip(':')).hex()
+                except ValueError:
+                    return None
+    return None
+
+def hash_file_prefix(path, length, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """SHA-256 state over the first `length` bytes of a file"""
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+class DownloadInterrupted(Exception):
+    """The transfer stopped part-way; the .part file can be resumed"""
+
+async def _transfer(client, backup_filename, part_path, sidecar_path, progress_callback, chunk_size, throttle):
+    """One attempt at fetching the backup into part_path, resuming when possible"""
+    loop = asyncio.get_running_loop()
+    state = read_sidecar(sidecar_path) if part_path.exists() else None
+    offset = 0
+    headers = {}
+    if state and state.get('backup_filename') == backup_filename and (state.get('etag') or state.get('last_modified')):
+        # Trust only bytes recorded as flushed in the sidecar
+        offset = min(state.get('offset', 0), part_path.stat().st_size)
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = state.get('etag') or state['last_modified']
+
+    async with client.stream('backups', {'download': backup_filename}, headers=headers) as response:
+        if response.status == 206:
+            start, total_bytes = parse_content_range(response.headers.get('Content-Range'))
+            if start != offset:
+                # Forget the resume point so the next attempt starts from zero
+                sidecar_path.unlink()
+                raise DownloadInterrupted(f"Server resumed at byte {start}, expected {offset}")
+            total_bytes = total_bytes or state.get('total_bytes')
+            resumed = True
+        elif response.status == 200:
+            # No range support, or the file changed since the last attempt: start over
+            offset = 0
+            total_bytes = response.content_length
+            resumed = False
+        elif response.status == 416 and state and offset and offset == state.get('total_bytes'):
+            # Everything was already fetched before the interruption
+            digest = await loop.run_in_executor(None, hash_file_prefix, part_path, offset)
+            return state, digest, TransferMeter(backup_filename, offset, progress_callback, initial_bytes=offset)
+        else:
+            text = (await response.content.read(1024)).decode('utf-8', errors='replace')
+            raise RuntimeError(f"HTTP {response.status}: {text}")
+
+        state = {
+            'backup_filename': backup_filename,
+            'offset': offset,
+            'total_bytes': total_bytes,
+            'etag': response.headers.get('ETag') if not resumed else state.get('etag'),
+            'last_modified': response.headers.get('Last-Modified') if not resumed else state.get('last_modified'),
+            'expected_sha256': parse_sha256_digest(response.headers) or (state or {}).get('expected_sha256'),
+            'updated': datetime.datetime.now().isoformat()
+        }
+        write_sidecar(sidecar_path, state)
+
+        digest = (await loop.run_in_executor(None, hash_file_prefix, part_path, offset)
+                  if resumed else hashlib.sha256())
+        meter = TransferMeter(backup_filename, total_bytes, progress_callback, initial_bytes=offset)
+
+        with open(part_path, 'r+b' if resumed else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            unsynced = 0
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    # Write and hash off the event loop; the next chunk is not read until this one is on disk
+                    await loop.run_in_executor(None, _write_chunk, f, digest, chunk)
+                    meter.add(len(chunk))
+                    if throttle is not None:
+                        await throttle.consume(len(chunk))
+                    unsynced += len(chunk)
+                    if unsynced >= DOWNLOAD_CHECKPOINT_BYTES:
+                        await loop.run_in_executor(None, _checkpoint, f, sidecar_path, state, meter.bytes_done)
+                        unsynced = 0
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await loop.run_in_executor(None, _checkpoint, f, sidecar_path, state, meter.bytes_done)
+                raise DownloadInterrupted(str(e) or type(e).__name__)
+            await loop.run_in_executor(None, _checkpoint, f, sidecar_path, state, meter.bytes_done)
+
+    meter.report()
+    return state, digest, meter
+
+def _write_chunk(f, digest, chunk):
+    f.write(chunk)
+    digest.update(chunk)
+
+def _checkpoint(f, sidecar_path, state, offset):
+    """Make written bytes durable, then record them in the sidecar"""
+    f.flush()
+    os.fsync(f.fileno())
+    state['offset'] = offset
+    state['updated'] = datetime.datetime.now().isoformat()
+    write_sidecar(sidecar_path, state)
+
+def store_for(dest_dir=None):
+    """The content-addressed store backing a download directory"""
+    if dest_dir is None or Path(dest_dir) == Path(LOCAL_BACKUP_DIR):
+        return backup_store
+    return BackupStore(dest_dir)
+
+async def download_backup_file(client, backup_filename, progress_callback=None, dest_dir=None,
+                               chunk_size=DOWNLOAD_CHUNK_SIZE, attempts=DOWNLOAD_RESUME_ATTEMPTS, throttle=None,
+                               server_mtime=None, insid=None, store=None):
+    """Stream a server backup to LOCAL_BACKUP_DIR, holding at most one chunk in memory
+
+    progress_callback(filename, bytes_done, total_bytes, bytes_per_second) is
+    called as chunks arrive. Data lands in a .part file whose sidecar records
+    the flushed offset and the server's validators, so an interrupted
+    transfer resumes with a Range request (here or on a later call). Once it
+    verifies, the file moves into the content-addressed store and appears
+    under its final name as a link to the stored blob.
+
+    Verification checks the size against Content-Length/Content-Range. The
+    SHA-256 is only compared when the server sends a Digest or Repr-Digest
+    header, which Softaculous does not, so in practice only the size is
+    verified; the computed SHA-256 is recorded in the audit log and store.
+    """
+    audit = client.audit
+    store = store or store_for(dest_dir)
+    final_path = local_backup_path(backup_filename, dest_dir)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path, sidecar_path = part_paths(final_path)
+    started = time.monotonic()
+
+    try:
+        for attempt in range(attempts):
+            resumed_from = read_sidecar(sidecar_path) if part_path.exists() else None
+            try:
+                state, digest, meter = await _transfer(client, backup_filename, part_path, sidecar_path,
+                                                       progress_callback, chunk_size, throttle)
+                break
+            except (DownloadInterrupted, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == attempts - 1:
+                    raise
+                audit.log_file_operation('BACKUP_DOWNLOAD_RESUME', backup_filename, 'FAILURE',
+                                         details={'error': str(e) or type(e).__name__, 'attempt': attempt + 1,
+                                                  'offset': (read_sidecar(sidecar_path) or {}).get('offset', 0)})
+                await asyncio.sleep(backoff_delay(attempt))
+
+        size = part_path.stat().st_size
+        if size == 0:
+            audit.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE',
+                                     details={'error': 'No backup data received'})
+            return None, "No backup data received"
+
+        if state.get('total_bytes') is not None and size != state['total_bytes']:
+            error = f"Incomplete download: {size} of {state['total_bytes']} bytes"
+            audit.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE',
+                                     details={'error': error})
+            return None, error
+
+        sha256 = digest.hexdigest()
+        if state.get('expected_sha256') and sha256 != state['expected_sha256']:
+            # Corrupt: throw the partial data away so the next attempt starts clean
+            part_path.unlink()
+            sidecar_path.unlink()
+            error = f"Checksum mismatch: expected {state['expected_sha256']}, got {sha256}"
+            audit.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE',
+                                     details={'error': error})
+            return None, error
+
+        final_path, deduplicated = await asyncio.get_running_loop().run_in_executor(
+            None, store.ingest, part_path, backup_filename, sha256, server_mtime, insid)
+        sidecar_path.unlink()
+
+        duration = max(time.monotonic() - started, 1e-6)
+        audit.log_file_operation('BACKUP_DOWNLOAD', final_path, 'SUCCESS',
+                                 details={'file_size': size,
+                                          'sha256': sha256,
+                                          'checksum_verified': bool(state.get('expected_sha256')),
+                                          'resumed_from': (resumed_from or {}).get('offset', 0),
+                                          'deduplicated': deduplicated,
+                                          'duration': round(duration, 3),
+                                          'bytes_per_second': round(meter.bytes_per_second)})
+        return final_path, None
+
+    except Exception as e:
+        # The .part file and sidecar are kept so a later call can resume
+        error = str(e) or type(e).__name__
+        audit.log_file_operation('BACKUP_DOWNLOAD', backup_filename, 'FAILURE',
+                                 details={'error': error})
+        return None, error
+
+def backup_metadata(backups):
+    """Map backup name -> {'size', 'mtime', 'insid'} from a list_backups payload
+
+    Handles both {name: info} and {insid: {name: info}} layouts, with str or
+    bytes keys. Entries without a usable size are skipped; a missing backup
+    time is reported as None.
+    """
+    metadata = {}
+
+    def text(value):
+        return value.decode('utf-8', errors='replace') if isinstance(value, bytes) else str(value)
+
+    def field(info, *names):
+        for name in names:
+            for key in (name, name.encode()):
+                if info.get(key) is not None:
+                    return info[key]
+        return None
+
+    def as_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def walk(mapping, insid=None):
+        for name, info in (mapping or {}).items():
+            if not isinstance(info, dict):
+                continue
+            size = field(info, 'size')
+            if size is not None:
+                source = field(info, 'insid') or insid
+                if as_int(size) is not None:
+                    metadata[text(name)] = {
+                        'size': as_int(size),
+                        'mtime': as_int(field(info, 'btime', 'mtime', 'time')),
+                        'insid': text(source) if source is not None else None
+                    }
+            else:
+                walk(info, text(name))
+
+    walk(backups)
+    return metadata
+
+def backup_sizes(backups):
+    """Map backup name -> size in bytes from a list_backups payload"""
+    return {name: meta['size'] for name, meta in backup_metadata(backups).items()}
+
+def order_downloads(backup_list, sizes=None):
+    """Shortest job first: known sizes ascending, unknown sizes last in list order"""
+    if not sizes:
+        return list(backup_list)
+    position = {name: i for i, name in enumerate(backup_list)}
+    return sorted(backup_list, key=lambda name: (name not in sizes, sizes.get(name, 0), position[name]))
+
+async def bulk_download_backups(client, backup_list, progress_callback=None, max_workers=DOWNLOAD_MAX_WORKERS,
+                                bandwidth_limit=DOWNLOAD_BANDWIDTH_LIMIT, sizes=None, dest_dir=None,
+                                metadata=None, repository=None):
+    """Download several backups in parallel under a shared bandwidth ceiling
+
+    progress_callback(filename, bytes_done, total_bytes, bytes_per_second, status)
+    is called per file, with status 'queued', 'downloading', 'done', 'skipped'
+    or 'failed'. Passing sizes (see backup_sizes) starts the smallest backups
+    first to minimise mean completion time. Passing metadata (see
+    backup_metadata) skips backups whose name, size and server mtime already
+    match the local store. With a repository (see ChunkRepository), each
+    download is chunked into it and the full local copy is dropped; a
+    backup whose ingest fails is still downloaded and is also listed in
+    'repository_errors'. 'errors' and 'repository_errors' map backup names
+    to error messages.
+    """
+    results = {'success': [], 'skipped': [], 'errors': {}, 'repository': [], 'repository_errors': {}}
+    metadata = metadata or {}
+    store = store_for(dest_dir)
+    throttle = BandwidthLimiter(bandwidth_limit) if bandwidth_limit else None
+    semaphore = asyncio.Semaphore(max(1, int(max_workers)))
+
+    pending = []
+    for backup_filename in backup_list:
+        meta = metadata.get(backup_filename)
+        if meta and store.is_current(backup_filename, meta['size'], meta['mtime']):
+            results['skipped'].append(backup_filename)
+        elif meta and repository is not None and repository.has(backup_filename, meta['size'], meta['mtime']):
+            results['skipped'].append(backup_filename)
+        else:
+            pending.append(backup_filename)
+    ordered = order_downloads(pending, sizes)
+
+    def report(filename, bytes_done, total_bytes, bytes_per_second, status):
+        if progress_callback is not None:
+            progress_callback(filename, bytes_done, total_bytes, bytes_per_second, status)
+
+    async def download_one(backup_filename):
+        try:
+            await download_into_store(backup_filename)
+        finally:
+            download_done()
+
+    async def download_into_store(backup_filename):
+        async with semaphore:
+            last_rate = {'bytes_per_second': 0}
+
+            def on_progress(name, done, total, rate):
+                last_rate['bytes_per_second'] = rate
+                report(name, done, total, rate, 'downloading')
+
+            listing = metadata.get(backup_filename, {})
+            local_file, error = await download_backup_file(
+                client, backup_filename, on_progress, dest_dir=dest_dir, throttle=throttle,
+                server_mtime=listing.get('mtime'), insid=listing.get('insid'), store=store)
+            if error:
+                results['errors'][backup_filename] = error
+                report(backup_filename, 0, None, 0, 'failed')
+                return
+
+            size = local_file.stat().st_size
+            if repository is not None:
+                try:
+                    stats = await asyncio.get_running_loop().run_in_executor(
+                        None, repository.ingest, local_file, backup_filename, listing.get('mtime'))
+                except Exception as e:
+                    # Keep the full copy; the backup is still usable locally
+                    results['repository_errors'][backup_filename] = str(e)
+                    client.audit.log_file_operation('REPOSITORY_INGEST', backup_filename, 'FAILURE',
+                                                    details={'error': str(e)})
+                else:
+                    store.remove(backup_filename)
+                    results['repository'].append(stats)
+                    client.audit.log_file_operation('REPOSITORY_INGEST', backup_filename, 'SUCCESS',
+                                                    details={key: value for key, value in stats.items()
+                                                             if key != 'backup'})
+            results['success'].append(backup_filename)
+            report(backup_filename, size, size, last_rate['bytes_per_second'], 'done')
+
+    for backup_filename in results['skipped']:
+        size = metadata[backup_filename]['size']
+        report(backup_filename, size, size, 0, 'skipped')
+    for backup_filename in ordered:
+        report(backup_filename, 0, (sizes or {}).get(backup_filename), 0, 'queued')
+
+    # Tasks are created in schedule order, so the semaphore admits them smallest first
+    with track_bulk_operation('download', len(ordered)) as download_done:
+        await asyncio.gather(*[download_one(backup_filename) for backup_filename in ordered])
+    return results
+
+# --- Server-to-archive pipeline ---
+def _drain_into_archive(writer, feed, consumed=None):
+    """Worker thread: apply queued member events to the archive writer
+
+    consumed, if given, is called after each event is taken off the queue so
+    the producer can hand out another buffer slot.
+    """
+    member = None
+    member_scope = contextlib.ExitStack()
+    error = None
+    while True:
+        kind, payload = feed.get()
+        if consumed is not None:
+            consumed()
+        if kind == 'done':
+            break
+        if error is not None:
+            # Keep draining so the producer never blocks on a full queue
+            continue
+        try:
+            if kind == 'begin':
+                arcname, size, compressible, mtime = payload
+                member = member_scope.enter_context(writer.open_member(arcname, size, compressible, mtime))
+            elif kind == 'data':
+                member.write(payload)
+            elif kind == 'end':
+                member_scope.close()
+                member = None
+            elif kind == 'file':
+                writer.add_file(*payload)
+            elif kind == 'abort':
+                raise RuntimeError(payload)
+        except Exception as e:
+            error = e
+    if error is not None:
+        writer.abort()
+        return None, str(error) or type(error).__name__
+    return writer.close(), None
+
+async def _stream_member(client, backup_filename, put, meter, size_hint=None, mtime=None,
+                         chunk_size=DOWNLOAD_CHUNK_SIZE, attempts=DOWNLOAD_RESUME_ATTEMPTS, throttle=None):
+    """Feed one server backup into the archive queue, resuming with Range if the stream drops"""
+    offset = 0
+    validator = None
+    expected_sha256 = None
+    digest = hashlib.sha256()
+    begun = False
+
+    async def begin(first_chunk, size):
+        # Sniff the first bytes so already-compressed backups are stored, not recompressed
+        await put(('begin', (backup_filename, size, not first_chunk.startswith(COMPRESSED_MAGIC), mtime)))
+
+    for attempt in range(attempts):
+        headers = {}
+        if offset:
+            headers = {'Range': f'bytes={offset}-', 'If-Range': validator}
+        try:
+            async with client.stream('backups', {'download': backup_filename}, headers=headers) as response:
+                if offset:
+                    start, _ = parse_content_range(response.headers.get('Content-Range'))
+                    if response.status != 206 or start != offset:
+                        raise RuntimeError(f"Server could not resume {backup_filename} at byte {offset}")
+                elif response.status == 200:
+                    size = response.content_length if response.content_length is not None else size_hint
+                    meter.total_bytes = size
+                    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                    expected_sha256 = parse_sha256_digest(response.headers)
+                else:
+                    text = (await response.content.read(1024)).decode('utf-8', errors='replace')
+                    raise RuntimeError(f"HTTP {response.status}: {text}")
+
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    if not begun:
+                        await begin(chunk, size)
+                        begun = True
+                    digest.update(chunk)
+                    await put(('data', chunk))
+                    offset += len(chunk)
+                    meter.add(len(chunk))
+                    if throttle is not None:
+                        await throttle.consume(len(chunk))
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == attempts - 1 or (offset and not validator):
+                raise DownloadInterrupted(str(e) or type(e).__name__)
+            client.audit.log_file_operation('BACKUP_DOWNLOAD_RESUME', backup_filename, 'FAILURE',
+                                            details={'error': str(e) or type(e).__name__,
+                                                     'attempt': attempt + 1, 'offset': offset,
+                                                     'pipeline': True})
+            await asyncio.sleep(backoff_delay(attempt))
+
+    if not begun:
+        await begin(b'', size)
+    if expected_sha256 and digest.hexdigest() != expected_sha256:
+        raise RuntimeError(f"Checksum mismatch for {backup_filename}")
+    await put(('end', None))
+    meter.report()
+    return offset
+
+async def stream_backups_to_archive(client, backup_list, archive_path, compression_type='zip', level=None,
+                                    threads=ARCHIVE_THREADS, progress_callback=None, metadata=None,
+                                    bandwidth_limit=DOWNLOAD_BANDWIDTH_LIMIT, buffer_bytes=ARCHIVE_PIPELINE_BUFFER,
+                                    chunk_size=DOWNLOAD_CHUNK_SIZE, store=None):
+    """Stream server backups straight into an archive without saving them first
+
+    Network chunks go through a bounded in-memory queue to a worker thread that
+    compresses them into the open archive, so transfer and compression overlap
+    and at most buffer_bytes are held between them. Backups already current in
+    the local store are added from disk instead. tar formats need each size
+    up front, which comes from Content-Length or the list_backups metadata.
+    progress_callback has the same signature as for bulk_download_backups.
+    Returns (stats, error).
+    """
+    loop = asyncio.get_running_loop()
+    metadata = metadata or {}
+    store = store or backup_store
+    throttle = BandwidthLimiter(bandwidth_limit) if bandwidth_limit else None
+    audit = client.audit
+
+    try:
+        writer = ArchiveWriter(archive_path, compression_type, level, threads)
+    except Exception as e:
+        return None, str(e)
+
+    # The queue itself is unbounded so control events never block; member events
+    # first take one of the buffer slots, which the worker hands back as it drains
+    feed = queue.SimpleQueue()
+    slots = asyncio.Semaphore(max(2, buffer_bytes // chunk_size))
+    drained = concurrent.futures.Future()
+
+    def consumed():
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(slots.release)
+
+    def drain():
+        try:
+            drained.set_result(_drain_into_archive(writer, feed, consumed))
+        except BaseException as e:
+            drained.set_exception(e)
+
+    # A dedicated thread: the compressor must never wait for a slot in the shared executor
+    threading.Thread(target=drain, name='archive-stream', daemon=True).start()
+
+    async def put(item):
+        # Waits on the event loop while the compressor is behind
+        await slots.acquire()
+        feed.put(item)
+
+    def report(filename, bytes_done, total_bytes, bytes_per_second, status):
+        if progress_callback is not None:
+            progress_callback(filename, bytes_done, total_bytes, bytes_per_second, status)
+
+    network_bytes = 0
+    local_members = 0
+    error = None
+    for backup_filename in backup_list:
+        report(backup_filename, 0, metadata.get(backup_filename, {}).get('size'), 0, 'queued')
+
+    with track_bulk_operation('archive_stream', len(backup_list)) as member_done:
+        try:
+            for backup_filename in backup_list:
+                listing = metadata.get(backup_filename, {})
+                try:
+                    if listing and store.is_current(backup_filename, listing.get('size'), listing.get('mtime')):
+                        local_path = store.local_path(backup_filename)
+                        await put(('file', (local_path, backup_filename)))
+                        local_members += 1
+                        member_done()
+                        report(backup_filename, listing['size'], listing['size'], 0, 'skipped')
+                        continue
+
+                    meter = TransferMeter(
+                        backup_filename, listing.get('size'),
+                        lambda name, done, total, rate: report(name, done, total, rate, 'downloading'))
+                    network_bytes += await _stream_member(client, backup_filename, put, meter, listing.get('size'),
+                                                          listing.get('mtime'), chunk_size, throttle=throttle)
+                    member_done()
+                    report(backup_filename, meter.bytes_done, meter.bytes_done, meter.bytes_per_second, 'done')
+                except Exception as e:
+                    error = f"{backup_filename}: {str(e) or type(e).__name__}"
+                    report(backup_filename, 0, None, 0, 'failed')
+                    feed.put(('abort', error))
+                    break
+        except BaseException as e:
+            # Cancelled mid-stream: the worker still has to discard the partial archive
+            feed.put(('abort', str(e) or type(e).__name__))
+            raise
+        finally:
+            feed.put(('done', None))
+        stats, writer_error = await asyncio.wrap_future(drained)
+        error = error or writer_error
+
+    if error:
+        audit.log_file_operation('ARCHIVE_STREAM', archive_path, 'FAILURE', details={'error': error})
+        return None, error
+
+    stats.update({'network_bytes': network_bytes, 'local_members': local_members})
+    audit.log_file_operation('ARCHIVE_STREAM', archive_path, 'SUCCESS',
+                             details={key: value for key, value in stats.items() if key != 'path'})
+    return stats, None
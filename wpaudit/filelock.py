@@ -0,0 +1,33 @@
+"""Advisory file locks for state shared by the Streamlit app and the CLI"""
+import contextlib
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows: only in-process locks apply there
+    fcntl = None
+
+@contextlib.contextmanager
+def file_lock(path, shared=False, blocking=True):
+    """Hold an flock on path (created if missing) for the duration of the block
+
+    Yields True once the lock is held. With blocking=False it yields False
+    instead of waiting when another holder has it. Each call opens its own
+    descriptor, so the lock also excludes other threads of this process.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is None:
+            yield True
+            return
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(f.fileno(), operation if blocking else operation | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,211 @@
+"""Local HTTP endpoint that streams backups and archives on demand"""
+import asyncio
+import secrets
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+from aiohttp import web
+
+from .audit import audit_logger
+from .catalog import ARCHIVE, BACKUP
+from .client import run_sync
+from .logfiles import LOG
+from .metrics import CONTENT_TYPE, metrics_registry
+from .repository import REPOSITORY, chunk_repository
+from .tracing import TRACE
+from .config import (
+    LOCAL_BACKUP_DIR, DOWNLOADS_DIR, LOGS_DIR, TRACES_DIR, DOWNLOAD_CHUNK_SIZE,
+    FILE_SERVER_ENABLED, FILE_SERVER_HOST, FILE_SERVER_PORT, FILE_SERVER_PUBLIC_URL, FILE_SERVER_TOKEN_TTL,
+    METRICS_ENDPOINT_ENABLED
+)
+
+# Audit event per file kind served
+DOWNLOAD_EVENTS = {BACKUP: 'LOCAL_BACKUP_DOWNLOAD', ARCHIVE: 'ARCHIVE_DOWNLOAD',
+                   REPOSITORY: 'REPOSITORY_DOWNLOAD', LOG: 'LOG_DOWNLOAD', TRACE: 'TRACE_DOWNLOAD'}
+
+class FileServer:
+    """Serves files through short-lived per-session links
+
+    The endpoint listens on FILE_SERVER_HOST. Links point there directly, which
+    works for a browser on the same machine; set public_url when the endpoint
+    is exposed elsewhere (e.g. behind a reverse proxy).
+
+    Bytes are only read when a browser requests a link. aiohttp's FileResponse
+    answers Range/If-Range requests and uses sendfile where the platform
+    supports it, so memory use stays flat regardless of file size.
+    """
+    def __init__(self, host=FILE_SERVER_HOST, port=FILE_SERVER_PORT, public_url=FILE_SERVER_PUBLIC_URL,
+                 roots=None, token_ttl=FILE_SERVER_TOKEN_TTL, audit=None, repository=None):
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self.roots = roots or {BACKUP: Path(LOCAL_BACKUP_DIR), ARCHIVE: Path(DOWNLOADS_DIR), LOG: Path(LOGS_DIR),
+                               TRACE: Path(TRACES_DIR)}
+        self.token_ttl = token_ttl
+        self.audit = audit or audit_logger
+        self.repository = repository or chunk_repository
+        self.base_url = None
+        self.bound_port = None
+        self.port_error = None
+        self.error = None
+        self._runner = None
+        self._tokens = {}
+        self._issued = {}
+        self._lock = threading.Lock()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/files/{token}/{name}', self._handle)
+        if METRICS_ENDPOINT_ENABLED:
+            app.router.add_get('/metrics', self._metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        try:
+            await site.start()
+        except OSError:
+            if not self.port:
+                await runner.cleanup()
+                raise
+            # Port taken (e.g. by a second instance): downloads still work, scrapes need the new port
+            site = web.TCPSite(runner, self.host, 0)
+            try:
+                await site.start()
+            except OSError:
+                await runner.cleanup()
+                raise
+            self.port_error = (f"Port {self.port} was unavailable, so the endpoint is on "
+                               f"{site._server.sockets[0].getsockname()[1]}")
+        self.bound_port = site._server.sockets[0].getsockname()[1]
+        self._runner = runner
+        self.base_url = (self.public_url or f"http://{self.host}:{self.bound_port}").rstrip('/')
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            self.base_url = None
+            self.bound_port = None
+
+    @property
+    def links_enabled(self):
+        """True unless the endpoint is disabled or failed to start"""
+        return FILE_SERVER_ENABLED and self.error is None
+
+    def ensure_started(self):
+        """Start the endpoint on the shared event loop once; False if it is disabled or failed"""
+        with self._lock:
+            if self.base_url is not None:
+                return True
+            if not FILE_SERVER_ENABLED or self.error is not None:
+                return False
+            try:
+                run_sync(self.start())
+                return True
+            except OSError as e:
+                self.error = str(e)
+                return False
+
+    def url_for(self, kind, name):
+        """Link that streams one file, bound to the caller's audit identity"""
+        context = self.audit.get_context()
+        now = time.monotonic()
+        with self._lock:
+            for token in [t for t, grant in self._tokens.items() if grant['expires'] <= now]:
+                grant = self._tokens.pop(token)
+                self._issued.pop((grant['kind'], grant['name'], grant['context']['session_id']), None)
+
+            issued_key = (kind, name, context['session_id'])
+            token = self._issued.get(issued_key)
+            if token is None:
+                token = secrets.token_urlsafe(24)
+                self._tokens[token] = {'kind': kind, 'name': name, 'context': context,
+                                       'expires': now + self.token_ttl}
+                self._issued[issued_key] = token
+        return f"{self.base_url}/files/{token}/{urllib.parse.quote(name)}"
+
+    @property
+    def metrics_url(self):
+        """Where the metrics endpoint is served, or None if it is off"""
+        if self.base_url is None or not METRICS_ENDPOINT_ENABLED:
+            return None
+        return f"{self.base_url}/metrics"
+
+    async def _metrics(self, request):
+        return web.Response(body=metrics_registry.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    async def _handle(self, request):
+        with self._lock:
+            grant = self._tokens.get(request.match_info['token'])
+        if grant is None or grant['expires'] <= time.monotonic() or grant['name'] != request.match_info['name']:
+            raise web.HTTPNotFound()
+
+        context = grant['context']
+        self.audit.bind_context(context['username'], context['ip_address'], context['session_id'])
+        if grant['kind'] == REPOSITORY:
+            return await self._stream_from_repository(request, grant['name'])
+        path = self.roots[grant['kind']] / Path(grant['name']).name
+        event_type = DOWNLOAD_EVENTS[grant['kind']]
+        if not path.is_file():
+            self.audit.log_file_operation(event_type, grant['name'], 'FAILURE',
+                                          details={'error': 'File not found'})
+            raise web.HTTPNotFound()
+
+        self.audit.log_file_operation(event_type, path, 'SUCCESS',
+                                      details={'file_size': path.stat().st_size,
+                                               'range': request.headers.get('Range')})
+        disposition = f"attachment; filename*=UTF-8''{urllib.parse.quote(path.name)}"
+        return web.FileResponse(path, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                                headers={'Content-Disposition': disposition,
+                                         'Content-Type': 'application/octet-stream'})
+
+    async def _stream_from_repository(self, request, name):
+        """Reassemble a repository backup chunk by chunk, honouring a single byte range"""
+        event_type = DOWNLOAD_EVENTS[REPOSITORY]
+        entry = self.repository.lookup(name)
+        if entry is None:
+            self.audit.log_file_operation(event_type, name, 'FAILURE', details={'error': 'Backup not in repository'})
+            raise web.HTTPNotFound()
+
+        size = entry['size']
+        try:
+            requested = request.http_range
+        except ValueError:
+            requested = slice(None, None)
+        start, end = requested.start, requested.stop
+        if start is not None and start < 0:
+            start, end = max(size + start, 0), size
+        start = start or 0
+        end = size if end is None else min(end, size)
+        if requested.start is not None and start >= size:
+            raise web.HTTPRequestRangeNotSatisfiable(headers={'Content-Range': f"bytes */{size}"})
+
+        self.audit.log_file_operation(event_type, name, 'SUCCESS',
+                                      details={'file_size': size, 'range': request.headers.get('Range')})
+        partial = requested.start is not None or requested.stop is not None
+        response = web.StreamResponse(status=206 if partial else 200, headers={
+            'Content-Disposition': f"attachment; filename*=UTF-8''{urllib.parse.quote(name)}",
+            'Content-Type': 'application/octet-stream',
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{entry["sha256"]}"'
+        })
+        response.content_length = end - start
+        if partial:
+            response.headers['Content-Range'] = f"bytes {start}-{end - 1}/{size}"
+        await response.prepare(request)
+
+        # Chunk reads and decompression happen off the event loop
+        loop = asyncio.get_running_loop()
+        chunks = self.repository.iter_backup(name, start, end)
+        while True:
+            data = await loop.run_in_executor(None, next, chunks, None)
+            if data is None:
+                break
+            await response.write(data)
+        await response.write_eof()
+        return response
+
+# Global file server, started on first use
+file_server = FileServer()
@@ -0,0 +1,137 @@
+"""AIMD concurrency limiter driven by observed Softaculous response times"""
+import asyncio
+import collections
+import threading
+import time
+
+from .config import (
+    CONCURRENCY_INITIAL, CONCURRENCY_MIN, CONCURRENCY_MAX,
+    CONCURRENCY_LATENCY_TOLERANCE, CONCURRENCY_BACKOFF_FACTOR,
+    CONCURRENCY_DECREASE_COOLDOWN, CONCURRENCY_HISTORY_SIZE, HTTP_POOL_SIZE
+)
+
+# Status codes that mean the server wants us to slow down
+OVERLOAD_STATUS_CODES = (429, 503)
+
+class AdaptiveLimiter:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests"""
+    def __init__(self, initial=CONCURRENCY_INITIAL, min_limit=CONCURRENCY_MIN, max_limit=CONCURRENCY_MAX,
+                 latency_tolerance=CONCURRENCY_LATENCY_TOLERANCE, backoff_factor=CONCURRENCY_BACKOFF_FACTOR,
+                 decrease_cooldown=CONCURRENCY_DECREASE_COOLDOWN, history_size=CONCURRENCY_HISTORY_SIZE):
+        self.min_limit = min_limit
+        # More in-flight requests than pooled connections would only queue in the pool
+        self.max_limit = max(min(max_limit, HTTP_POOL_SIZE), min_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self.history = collections.deque(maxlen=history_size)
+        self._baselines = {}
+        self._recent = {}
+        self._last_decrease = 0.0
+        self._waiters = collections.deque()
+        self._record('start')
+
+    def _record(self, reason):
+        self.history.append({'timestamp': time.time(), 'limit': int(self.limit), 'reason': reason})
+
+    def _wake_waiters(self):
+        capacity = int(self.limit) - self.in_flight
+        while capacity > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                capacity -= 1
+
+    async def acquire(self):
+        """Wait for a free slot under the current limit"""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Woken and cancelled before running: pass the slot on
+                    self._wake_waiters()
+                raise
+        self.in_flight += 1
+
+    def release(self, act, response_time=None, status_code=None, failed=False):
+        """Free a slot and adjust the limit from the observed outcome"""
+        # Only a limit that is actually being used has earned an increase
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight = max(self.in_flight - 1, 0)
+
+        if status_code in OVERLOAD_STATUS_CODES:
+            self._decrease(f'HTTP {status_code}')
+        elif failed or response_time is None:
+            self._decrease('error')
+        elif self._latency_rising(act, response_time):
+            self._decrease('latency')
+        elif saturated:
+            self._increase()
+
+        self._wake_waiters()
+
+    def _latency_rising(self, act, response_time):
+        """Compare recent latency for this act against its long-run baseline"""
+        baseline = self._baselines.get(act)
+        if baseline is None:
+            self._baselines[act] = response_time
+            self._recent[act] = response_time
+            return False
+
+        recent = 0.7 * self._recent[act] + 0.3 * response_time
+        self._recent[act] = recent
+        # The baseline follows improvements quickly but creeps up slowly, so a
+        # gradual slowdown under rising load still registers as congestion
+        weight = 0.3 if response_time < baseline else 0.01
+        self._baselines[act] = (1 - weight) * baseline + weight * response_time
+        return recent > baseline * self.latency_tolerance
+
+    def _increase(self):
+        old_limit = int(self.limit)
+        # +1 slot per full window of successful requests
+        self.limit = min(self.limit + 1.0 / max(self.limit, 1.0), float(self.max_limit))
+        if int(self.limit) != old_limit:
+            self._record('increase')
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        # Back off at most once per cooldown so one burst does not collapse the limit
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        old_limit = int(self.limit)
+        self.limit = max(self.limit * self.backoff_factor, float(self.min_limit))
+        if int(self.limit) != old_limit:
+            self._record(f'decrease ({reason})')
+
+    def snapshot(self):
+        """Current limit, in-flight and waiting counts, and limit history"""
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'waiting': len(self._waiters),
+            'history': list(self.history)
+        }
+
+# --- Limiter Registry ---
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(host):
+    """Get the shared limiter for a cPanel host"""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter()
+        return _limiters[host]
+
+def limiters():
+    """Snapshot of the limiter registry, by host"""
+    with _limiters_lock:
+        return dict(_limiters)
@@ -0,0 +1,243 @@
+"""Log segments: rotation into gzip files, tail reads from the end, segment listings"""
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from .config import LOGS_DIR, LOG_COMPRESS_MIN_AGE
+from .filelock import file_lock
+
+# File server kind for log files and segments
+LOG = 'log'
+
+# Rotated segment: <stem>.<YYYYmmdd-HHMMSS>.log, gzipped to .log.gz once compressed
+SEGMENT_PATTERN = re.compile(r'^(?P<stem>.+)\.(?P<stamp>\d{8}-\d{6})(?:-(?P<seq>\d+))?\.log(?P<gz>\.gz)?$')
+DAILY_AUDIT_PATTERN = re.compile(r'^audit_(?P<day>\d{4}-\d{2}-\d{2})\.log$')
+
+# The app and the CLI append to the same logs. Writers hold this lock while
+# appending, and rotation and compression hold it while renaming or removing
+# files, so no process writes into a segment that is being gzipped.
+LOCK_NAME = '.rotate.lock'
+
+def lock_path(logs_dir):
+    return Path(logs_dir) / LOCK_NAME
+
+def segment_started(path):
+    """When a log file's first entry was written; None for an empty or unreadable file"""
+    try:
+        with open(path, 'rb') as f:
+            first_line = f.readline()
+        return datetime.datetime.fromisoformat(json.loads(first_line)['timestamp'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def rotate(path, now=None):
+    """Rename an active log to a timestamped segment and compress it in the background
+
+    The caller holds the lock from lock_path().
+    """
+    path = Path(path)
+    stamp = (now or datetime.datetime.now()).strftime('%Y%m%d-%H%M%S')
+    segment = path.with_name(f"{path.stem}.{stamp}.log")
+    counter = 1
+    while segment.exists() or segment.with_name(segment.name + '.gz').exists():
+        segment = path.with_name(f"{path.stem}.{stamp}-{counter}.log")
+        counter += 1
+    os.replace(path, segment)
+    compress_in_background(segment)
+    return segment
+
+def compress_segment(path):
+    """Gzip a closed log file next to itself and remove the original
+
+    Returns None if the file is already gone (another process compressed it).
+    """
+    path = Path(path)
+    target = path.with_name(path.name + '.gz')
+    temp_path = path.with_name(path.name + '.gz.tmp')
+    with file_lock(lock_path(path.parent)):
+        try:
+            source = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with source, gzip.open(temp_path, 'wb', compresslevel=6) as compressed:
+            shutil.copyfileobj(source, compressed, 1024 * 1024)
+        os.replace(temp_path, target)
+        path.unlink()
+    return target
+
+def compress_in_background(path):
+    threading.Thread(target=compress_segment, args=(path,), name='log-compress', daemon=True).start()
+
+def compress_pending(logs_dir=LOGS_DIR, today=None, min_age=LOG_COMPRESS_MIN_AGE):
+    """Compress segments left uncompressed by a restart and daily audit logs from earlier days
+
+    Files modified within min_age seconds are left alone: another process may
+    still be writing or compressing them, and a later start picks them up.
+    """
+    today = (today or datetime.date.today()).isoformat()
+    cutoff = time.time() - min_age
+    pending = []
+    for entry in os.scandir(logs_dir):
+        segment = SEGMENT_PATTERN.match(entry.name)
+        daily = DAILY_AUDIT_PATTERN.match(entry.name)
+        if not ((segment and not segment['gz']) or (daily and daily['day'] < today)):
+            continue
+        try:
+            if entry.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        pending.append(Path(entry.path))
+    for path in pending:
+        compress_in_background(path)
+    return pending
+
+def list_segments(path):
+    """Compressed and pending segments rotated out of an active log, newest first"""
+    path = Path(path)
+    segments = []
+    try:
+        entries = list(os.scandir(path.parent))
+    except FileNotFoundError:
+        return segments
+    for entry in entries:
+        match = SEGMENT_PATTERN.match(entry.name)
+        if match and match['stem'] == path.stem:
+            segments.append({'name': entry.name, 'path': Path(entry.path), 'size': entry.stat().st_size,
+                             'rotated': datetime.datetime.strptime(match['stamp'], '%Y%m%d-%H%M%S'),
+                             'seq': int(match['seq'] or 0), 'compressed': bool(match['gz'])})
+    return sorted(segments, key=lambda segment: (segment['rotated'], segment['seq']), reverse=True)
+
+def tail_lines(path, count=50, block_size=64 * 1024):
+    """Last count lines of a file, read backwards from the end in blocks"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b''
+        # One extra newline guarantees the first kept line is complete
+        while position > 0 and data.count(b'\n') <= count:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.splitlines()
+    if position > 0:
+        lines = lines[1:]
+    return [line.decode('utf-8', errors='replace') for line in lines[-count:]]
+
+# --- Incremental statistics ---
+STAT_FIELDS = ('event_type', 'result', 'risk_level')
+
+class LogStatistics:
+    """Running entry counts per log file, updated from the bytes appended since the last look
+
+    For each file the state records its inode, the offset of the last complete
+    line counted, and totals by event_type, result and risk_level. It is
+    persisted so a restart does not rescan. A new inode or a shrunken file
+    (rotation) starts the counts over, matching what the active file holds.
+    """
+    def __init__(self, logs_dir=LOGS_DIR, state_path=None):
+        self.logs_dir = Path(logs_dir)
+        self.state_path = Path(state_path) if state_path else self.logs_dir / '.stats.json'
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _load(self):
+        if self._state is None:
+            try:
+                with open(self.state_path, 'r') as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+        return self._state
+
+    def _save(self):
+        temp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(temp_path, self.state_path)
+
+    @staticmethod
+    def _empty(inode):
+        return {'inode': inode, 'offset': 0, 'lines': 0, **{field: {} for field in STAT_FIELDS}}
+
+    def _update(self, path, entry, block_size=4 * 1024 * 1024):
+        """Count complete lines appended since entry['offset']; returns True if anything changed"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size == entry['offset']:
+            return False
+
+        counted = False
+        with open(path, 'rb') as f:
+            f.seek(entry['offset'])
+            remaining = stat.st_size - entry['offset']
+            carry = b''
+            while remaining > 0:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                data = carry + block
+                # A partially written last line waits for the next refresh
+                end = data.rfind(b'\n') + 1
+                carry = data[end:]
+                if end:
+                    self._count(data[:end], entry)
+                    entry['offset'] += end
+                    counted = True
+        return counted
+
+    @staticmethod
+    def _count(data, entry):
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            entry['lines'] += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            for field in STAT_FIELDS:
+                value = record.get(field)
+                if value is not None:
+                    entry[field][value] = entry[field].get(value, 0) + 1
+
+    def refresh(self, file_names):
+        """Current counts for each named log file in logs_dir"""
+        results = {}
+        with self._lock:
+            state = self._load()
+            changed = False
+            for name in file_names:
+                path = self.logs_dir / name
+                try:
+                    inode = os.stat(path).st_ino
+                except FileNotFoundError:
+                    results[name] = self._empty(None)
+                    changed = state.pop(name, None) is not None or changed
+                    continue
+                entry = state.get(name)
+                if entry is None or entry['inode'] != inode or os.stat(path).st_size < entry['offset']:
+                    entry = state[name] = self._empty(inode)
+                    changed = True
+                changed = self._update(path, entry) or changed
+                results[name] = {key: (dict(value) if isinstance(value, dict) else value)
+                                 for key, value in entry.items()}
+            # Forget files that are gone for good (e.g. earlier days' audit logs, now compressed)
+            for name in [n for n in state if n not in results and not (self.logs_dir / n).exists()]:
+                del state[name]
+                changed = True
+            if changed:
+                self._save()
+        return results
+
+# Global statistics for LOGS_DIR
+log_statistics = LogStatistics()
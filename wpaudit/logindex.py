@@ -0,0 +1,355 @@
+"""Time-indexed queries over the daily JSON audit logs"""
+import gzip
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from .audit import audit_logger
+from .config import LOGS_DIR, LOG_INDEX_PATH, LOG_INDEX_BLOCK_ENTRIES, LOG_QUERY_PAGE_SIZE
+
+# Fields with a secondary index
+INDEXED_FIELDS = ('username', 'site_name', 'event_type', 'session_id')
+
+# Daily audit logs, their rotated segments and compressed copies
+AUDIT_FILE_PATTERN = re.compile(r'^audit_\d{4}-\d{2}-\d{2}(\.\d{8}-\d{6}(-\d+)?)?\.log(\.gz)?$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    open_block INTEGER
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    first_ts TEXT NOT NULL,
+    last_ts TEXT NOT NULL,
+    entries INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_by_file ON blocks (file);
+CREATE INDEX IF NOT EXISTS blocks_by_time ON blocks (last_ts, first_ts);
+CREATE TABLE IF NOT EXISTS postings (
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    PRIMARY KEY (field, value, block)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_block ON postings (block);
+"""
+
+def gzip_size(path):
+    """Uncompressed size of a single-member gzip file, modulo 2**32, from its trailer"""
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return int.from_bytes(f.read(4), 'little')
+
+class AuditLogIndex:
+    """Sparse index over audit_*.log files: blocks of entries by time range and field values
+
+    Each block covers up to block_entries consecutive lines and records its
+    byte range, earliest and latest timestamp, and the distinct username,
+    site_name, event_type and session_id values in it. A query picks the
+    blocks whose time range overlaps and whose postings contain every field
+    filter, then reads and filters only those byte ranges (in one forward
+    pass per gzipped file). The index is extended from each file's last indexed offset, by the audit writer after
+    every append and by refresh() for files changed while the app was down.
+    """
+    def __init__(self, logs_dir=LOGS_DIR, db_path=LOG_INDEX_PATH, block_entries=LOG_INDEX_BLOCK_ENTRIES):
+        self.logs_dir = Path(logs_dir)
+        self.db_path = Path(db_path)
+        self.block_entries = block_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    # --- Maintenance ---
+    def on_append(self, stream, path, lines):
+        """Audit writer listener: index what was just appended to the daily audit log"""
+        if stream == 'audit':
+            self.refresh_file(path)
+
+    def refresh(self):
+        """Index new and grown audit files and forget vanished ones"""
+        names = set()
+        try:
+            with os.scandir(self.logs_dir) as entries:
+                for entry in entries:
+                    if AUDIT_FILE_PATTERN.match(entry.name):
+                        names.add(entry.name)
+                        self.refresh_file(entry.path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            conn = self._connection()
+            vanished = [row['name'] for row in conn.execute("SELECT name FROM files") if row['name'] not in names]
+            with conn:
+                for name in vanished:
+                    self._drop_file(conn, name)
+
+    def _drop_file(self, conn, name):
+        conn.execute("DELETE FROM postings WHERE block IN (SELECT id FROM blocks WHERE file = ?)", (name,))
+        conn.execute("DELETE FROM blocks WHERE file = ?", (name,))
+        conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+    def _rename_file(self, conn, old_name, new_name, inode):
+        """Move a file's index to its new name; the uncompressed offsets stay valid"""
+        self._drop_file(conn, new_name)
+        conn.execute("UPDATE blocks SET file = ? WHERE file = ?", (new_name, old_name))
+        conn.execute("UPDATE files SET name = ?, inode = ? WHERE name = ?", (new_name, inode, old_name))
+
+    def _renamed_to(self, logs_dir, inode, old_name):
+        """Name an indexed file now lives under after a rotation rename, or None"""
+        try:
+            with os.scandir(logs_dir) as entries:
+                for entry in entries:
+                    if (entry.name != old_name and AUDIT_FILE_PATTERN.match(entry.name) and
+                            entry.inode() == inode):
+                        return entry.name
+        except FileNotFoundError:
+            pass
+        return None
+
+    def _predecessor(self, conn, path, stat):
+        """Index row of the file this one was rotated or compressed from, or None"""
+        if path.name.endswith('.gz'):
+            row = conn.execute("SELECT name, inode, offset, open_block FROM files WHERE name = ?",
+                               (path.name[:-3],)).fetchone()
+            return row if row is not None and not (path.parent / row['name']).exists() else None
+        for row in conn.execute("SELECT name, inode, offset, open_block FROM files WHERE inode = ? AND name != ?",
+                                (stat.st_ino, path.name)).fetchall():
+            try:
+                moved = os.stat(path.parent / row['name']).st_ino != stat.st_ino
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                return row
+        return None
+
+    def refresh_file(self, path):
+        """Index the complete lines appended to one file since the last refresh
+
+        A file renamed by rotation, or replaced by its gzipped copy, keeps
+        its index under the new name instead of being indexed again.
+        """
+        path = Path(path)
+        compressed = path.name.endswith('.gz')
+        try:
+            stat = os.stat(path)
+            size = gzip_size(path) if compressed else stat.st_size
+        except OSError:
+            return
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT inode, offset, open_block FROM files WHERE name = ?", (path.name,)).fetchone()
+            if row is not None and (row['inode'] != stat.st_ino or (not compressed and size < row['offset'])):
+                # Rotated away (the index follows the old file) or replaced; index this one from scratch
+                with conn:
+                    renamed = None
+                    if row['inode'] != stat.st_ino:
+                        renamed = self._renamed_to(path.parent, row['inode'], path.name)
+                    if renamed:
+                        self._rename_file(conn, path.name, renamed, row['inode'])
+                    else:
+                        self._drop_file(conn, path.name)
+                row = None
+            if row is None:
+                if compressed and (path.parent / path.name[:-3]).exists():
+                    return  # Still being compressed; adopt the original's index once it is gone
+                predecessor = self._predecessor(conn, path, stat)
+                if predecessor is not None:
+                    with conn:
+                        self._rename_file(conn, predecessor['name'], path.name, stat.st_ino)
+                    row = predecessor
+            # gzip records the uncompressed size modulo 2**32
+            if row is not None and (row['offset'] % 2**32 if compressed else row['offset']) == size:
+                return
+
+            offset = row['offset'] if row else 0
+            block_id = row['open_block'] if row else None
+            with conn:
+                offset, block_id = self._index_from(conn, path, offset, block_id)
+                conn.execute("INSERT OR REPLACE INTO files (name, inode, offset, open_block) VALUES (?, ?, ?, ?)",
+                             (path.name, stat.st_ino, offset, block_id))
+
+    def _index_from(self, conn, path, offset, block_id):
+        """Read lines from offset, extending the open block; returns (new offset, open block id)"""
+        block = None
+        if block_id is not None:
+            block = dict(conn.execute("SELECT * FROM blocks WHERE id = ?", (block_id,)).fetchone())
+        postings = set()
+
+        def close_block():
+            if block is None:
+                return None
+            if block.get('id') is None:
+                cursor = conn.execute(
+                    "INSERT INTO blocks (file, start, end, first_ts, last_ts, entries) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path.name, block['start'], block['end'], block['first_ts'], block['last_ts'], block['entries']))
+                block['id'] = cursor.lastrowid
+            else:
+                conn.execute("UPDATE blocks SET end = ?, first_ts = ?, last_ts = ?, entries = ? WHERE id = ?",
+                             (block['end'], block['first_ts'], block['last_ts'], block['entries'], block['id']))
+            conn.executemany("INSERT OR IGNORE INTO postings (field, value, block) VALUES (?, ?, ?)",
+                             [(field, value, block['id']) for field, value in postings])
+            postings.clear()
+            return block['id']
+
+        opener = gzip.open if path.name.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Still being written
+                line_start = offset
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                    timestamp = entry['timestamp']
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if block is None or block['entries'] >= self.block_entries:
+                    close_block()
+                    block = {'id': None, 'start': line_start, 'end': offset, 'first_ts': timestamp,
+                             'last_ts': timestamp, 'entries': 0}
+                block['end'] = offset
+                block['first_ts'] = min(block['first_ts'], timestamp)
+                block['last_ts'] = max(block['last_ts'], timestamp)
+                block['entries'] += 1
+                for field in INDEXED_FIELDS:
+                    value = entry.get(field)
+                    if value is not None:
+                        postings.add((field, str(value)))
+        return offset, close_block()
+
+    # --- Queries ---
+    def _matching_blocks(self, start, end, filters, newest_first):
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append("last_ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("first_ts <= ?")
+            params.append(end)
+        for field, value in filters.items():
+            clauses.append("id IN (SELECT block FROM postings WHERE field = ? AND value = ?)")
+            params.extend([field, str(value)])
+        where = " AND ".join(clauses) or "1"
+        order = "DESC" if newest_first else "ASC"
+        with self._lock:
+            return [dict(row) for row in self._connection().execute(
+                f"SELECT file, start, end FROM blocks WHERE {where} ORDER BY last_ts {order}, id {order}", params)]
+
+    def _read_block(self, block):
+        with open(self.logs_dir / block['file'], 'rb') as f:
+            f.seek(block['start'])
+            return f.read(block['end'] - block['start'])
+
+    def _read_compressed_blocks(self, name, blocks, start, end, filters, newest_first):
+        """Matching entries of several blocks of one gzip file, read in a single forward pass
+
+        Seeking in a gzip stream decompresses from the start, so blocks are
+        read in offset order from one handle; only their matches are kept.
+        """
+        matches = {}
+        with gzip.open(self.logs_dir / name, 'rb') as f:
+            for block in sorted(blocks, key=lambda block: block['start']):
+                f.seek(block['start'])  # Forward from the previous block, decompressing only the gap
+                data = f.read(block['end'] - block['start'])
+                matches[block['start']] = self._filter_block(data, start, end, filters, newest_first)
+        return matches
+
+    @staticmethod
+    def _filter_block(data, start, end, filters, newest_first):
+        matches = []
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            timestamp = entry.get('timestamp', '')
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                continue
+            if all(str(entry.get(field)) == str(value) for field, value in filters.items()):
+                matches.append(entry)
+        matches.sort(key=lambda entry: entry.get('timestamp', ''), reverse=newest_first)
+        return matches
+
+    def iter_entries(self, start=None, end=None, newest_first=True, **filters):
+        """Yield matching entries block by block; start and end are ISO timestamps (inclusive)"""
+        filters = {field: value for field, value in filters.items() if value}
+        unknown = set(filters) - set(INDEXED_FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported filter field(s): {', '.join(sorted(unknown))}")
+        blocks = self._matching_blocks(start, end, filters, newest_first)
+        compressed_blocks = {}
+        for block in blocks:
+            if block['file'].endswith('.gz'):
+                compressed_blocks.setdefault(block['file'], []).append(block)
+        compressed_matches = {}
+
+        for block in blocks:
+            name = block['file']
+            try:
+                if name in compressed_blocks:
+                    if name not in compressed_matches:
+                        compressed_matches[name] = {}
+                        compressed_matches[name] = self._read_compressed_blocks(
+                            name, compressed_blocks[name], start, end, filters, newest_first)
+                    matches = compressed_matches[name].pop(block['start'], [])
+                else:
+                    matches = self._filter_block(self._read_block(block), start, end, filters, newest_first)
+            except FileNotFoundError:
+                continue  # Rotated or compressed since the query started
+            yield from matches
+
+    def query(self, start=None, end=None, page=1, page_size=LOG_QUERY_PAGE_SIZE, newest_first=True, **filters):
+        """One page of matching entries; returns (entries, has_more)"""
+        skip = (max(int(page), 1) - 1) * page_size
+        entries = list(itertools.islice(self.iter_entries(start, end, newest_first, **filters),
+                                        skip, skip + page_size + 1))
+        return entries[:page_size], len(entries) > page_size
+
+    def distinct_values(self, field, limit=500):
+        """Known values of an indexed field, for filter pickers"""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Unsupported filter field: {field}")
+        with self._lock:
+            return [row['value'] for row in self._connection().execute(
+                "SELECT DISTINCT value FROM postings WHERE field = ? ORDER BY value LIMIT ?", (field, limit))]
+
+    def stats(self):
+        with self._lock:
+            conn = self._connection()
+            files, = conn.execute("SELECT COUNT(*) FROM files").fetchone()
+            blocks, entries = conn.execute("SELECT COUNT(*), COALESCE(SUM(entries), 0) FROM blocks").fetchone()
+            postings, = conn.execute("SELECT COUNT(*) FROM postings").fetchone()
+        return {'files': files, 'blocks': blocks, 'entries': entries, 'postings': postings}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Global index over LOGS_DIR, kept current by the audit writer
+audit_index = AuditLogIndex()
+audit_logger.writer.listeners.append(audit_index.on_append)
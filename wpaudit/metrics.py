@@ -0,0 +1,284 @@
+"""In-process metrics: counters, gauges and latency histograms in Prometheus text format"""
+import bisect
+import collections
+import contextlib
+import math
+import threading
+import time
+
+from .audit import audit_logger
+from .limiter import limiters
+
+# Text exposition format served at /metrics
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds (seconds) of the latency buckets: 5 ms doubling up to about 82 s
+LATENCY_BUCKETS = tuple(0.005 * 2 ** i for i in range(15))
+# Bulk operations run for seconds to hours
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+# Recent observations kept per series for exact quantiles in the sidebar
+QUANTILE_WINDOW = 1024
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def quantile(sorted_values, percentile):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * percentile / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(name suffix, label values, extra labels, value) for each exported sample"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, values, extra)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    """Monotonic total per label set"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [('', key, (), value) for key, value in sorted(self.values().items())]
+
+class Gauge(_Metric):
+    """Current value per label set, either set directly or read from a callback at render time
+
+    A callback returns an iterable of (label values tuple, value).
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def values(self):
+        if self.callback is not None:
+            return {tuple(str(value) for value in key): value for key, value in self.callback()}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [('', key, (), value) for key, value in sorted(self.values().items())]
+
+class Histogram(_Metric):
+    """Cumulative buckets, sum and count per label set, plus a window of recent values for quantiles"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS, window=QUANTILE_WINDOW):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0,
+                                              'recent': collections.deque(maxlen=self.window)}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+            series['recent'].append(value)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def summary(self, group_by=None, percentiles=(50, 95, 99)):
+        """Count, mean and percentiles of recent values, per label set or merged by the group_by labels"""
+        group_by = self.labels if group_by is None else tuple(group_by)
+        positions = [self.labels.index(name) for name in group_by]
+        groups = {}
+        with self._lock:
+            for key, series in self._series.items():
+                group = groups.setdefault(tuple(key[i] for i in positions), {'count': 0, 'sum': 0.0, 'recent': []})
+                group['count'] += series['count']
+                group['sum'] += series['sum']
+                group['recent'].extend(series['recent'])
+        rows = []
+        for key, group in sorted(groups.items()):
+            recent = sorted(group['recent'])
+            row = dict(zip(group_by, key))
+            row.update({'count': group['count'], 'mean': group['sum'] / group['count']})
+            row.update({f'p{p}': quantile(recent, p) for p in percentiles})
+            rows.append(row)
+        return rows
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(s['counts']), s['sum'], s['count']) for key, s in self._series.items()}
+        samples = []
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, (('le', _format_value(bound)),), cumulative))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), count))
+        return samples
+
+class MetricsRegistry:
+    """Named metrics of one process, rendered together for the metrics endpoint"""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        return self._register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            registered = list(self._metrics.values())
+        lines = []
+        for metric in registered:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# --- Process-wide metrics ---
+def _limiter_values(field):
+    return lambda: [((host,), limiter.snapshot()[field]) for host, limiter in limiters().items()]
+
+metrics_registry = MetricsRegistry()
+
+api_request_seconds = metrics_registry.histogram(
+    'wpaudit_api_request_duration_seconds',
+    'Softaculous request latency (time to first byte for streamed downloads)', ('act', 'host'))
+api_requests = metrics_registry.counter(
+    'wpaudit_api_requests_total', 'Softaculous requests by act, host and result', ('act', 'host', 'result'))
+download_bytes = metrics_registry.counter('wpaudit_download_bytes_total', 'Backup bytes received from servers')
+archive_bytes = metrics_registry.counter(
+    'wpaudit_archive_input_bytes_total', 'Uncompressed bytes written into archives', ('format',))
+archive_seconds = metrics_registry.counter(
+    'wpaudit_archive_seconds_total', 'Time spent writing archives', ('format',))
+archive_throughput = metrics_registry.gauge(
+    'wpaudit_archive_last_throughput_mb_per_second', 'Throughput of the most recent archive', ('format',))
+bulk_operation_seconds = metrics_registry.histogram(
+    'wpaudit_bulk_operation_duration_seconds', 'Duration of bulk operations', ('operation',), DURATION_BUCKETS)
+bulk_pending = metrics_registry.gauge(
+    'wpaudit_bulk_pending_items', 'Sites or backups queued in running bulk operations', ('operation',))
+audit_queue_depth = metrics_registry.gauge(
+    'wpaudit_audit_queue_depth', 'Audit entries waiting for the log writer',
+    callback=lambda: [((), audit_logger.writer.stats()['queued'])])
+metrics_registry.gauge(
+    'wpaudit_limiter_in_flight', 'Requests in flight per cPanel host', ('host',),
+    callback=_limiter_values('in_flight'))
+metrics_registry.gauge(
+    'wpaudit_limiter_waiting', 'Requests waiting for a concurrency slot per cPanel host', ('host',),
+    callback=_limiter_values('waiting'))
+metrics_registry.gauge(
+    'wpaudit_limiter_limit', 'Adaptive concurrency limit per cPanel host', ('host',),
+    callback=_limiter_values('limit'))
+
+def record_api_call(act, host, success, response_time=None):
+    api_requests.inc(act=act, host=host, result='success' if success else 'failure')
+    if response_time is not None:
+        api_request_seconds.observe(response_time, act=act, host=host)
+
+def record_archive(stats):
+    archive_bytes.inc(stats['bytes_in'], format=stats['format'])
+    archive_seconds.inc(stats['duration'], format=stats['format'])
+    archive_throughput.set(round(stats['mb_per_s'], 3), format=stats['format'])
+
+@contextlib.contextmanager
+def track_bulk_operation(operation, items):
+    """Time a bulk operation and count its items as pending; call the yielded done() as each one finishes"""
+    state = {'pending': items}
+    bulk_pending.inc(items, operation=operation)
+
+    def done(count=1):
+        count = min(count, state['pending'])
+        state['pending'] -= count
+        bulk_pending.dec(count, operation=operation)
+
+    started = time.monotonic()
+    try:
+        yield done
+    finally:
+        # Items never reached (errors, early exit) are no longer pending either
+        done(state['pending'])
+        bulk_operation_seconds.observe(time.monotonic() - started, operation=operation)
@@ -0,0 +1,187 @@
+"""Fast decoder for PHP serialize() payloads, with one-pass installation and plugin records
+
+Softaculous answers api=serialize requests in PHP's serialize() format. The
+decoder walks the payload by offset, using bytes.index and slicing, instead
+of reading it through a file object a few bytes at a time. The record
+decoders go further: they build the dicts list_wordpress_installations and
+get_plugins_for_installation return while scanning, and step over every
+field they do not use without building it.
+"""
+
+class DecodeError(ValueError):
+    """Malformed or truncated PHP-serialized data"""
+
+# Type tags
+_STRING, _INT, _ARRAY, _BOOL, _FLOAT, _NULL, _OBJECT = b'siabdNO'
+
+def _text(raw):
+    return raw.decode('utf-8', errors='replace')
+
+def _key(data, pos):
+    """Raw array key at pos (bytes for string keys, int for integer keys) and the position after it"""
+    if data[pos] == _STRING:
+        colon = data.index(b':', pos + 2)
+        start = colon + 2
+        end = start + int(data[pos + 2:colon])
+        return data[start:end], end + 2
+    end = data.index(b';', pos + 2)
+    return int(data[pos + 2:end]), end + 1
+
+def _array_header(data, pos):
+    """Element count of the array at pos and the position of its first key"""
+    colon = data.index(b':', pos + 2)
+    return int(data[pos + 2:colon]), colon + 2
+
+def _object_header(data, pos):
+    """Property count of the object at pos and the position of its first key (the class name is dropped)"""
+    colon = data.index(b':', pos + 2)
+    name_end = colon + 2 + int(data[pos + 2:colon])
+    count_end = data.index(b':', name_end + 2)
+    return int(data[name_end + 2:count_end]), count_end + 2
+
+def _close(data, pos):
+    """Position after the brace closing an array or object whose elements end at pos"""
+    if data[pos] != 125:
+        raise DecodeError(f"Array ending at offset {pos} does not close after its declared elements")
+    return pos + 1
+
+def _skip(data, pos):
+    """Position just past the value at pos, without building it"""
+    kind = data[pos]
+    if kind == _STRING:
+        colon = data.index(b':', pos + 2)
+        return colon + 4 + int(data[pos + 2:colon])
+    if kind == _ARRAY or kind == _OBJECT:
+        count, pos = _array_header(data, pos) if kind == _ARRAY else _object_header(data, pos)
+        for _ in range(count * 2):
+            pos = _skip(data, pos)
+        return _close(data, pos)
+    return data.index(b';', pos + 1) + 1
+
+def _value(data, pos):
+    """Decoded value at pos and the position after it"""
+    kind = data[pos]
+    if kind == _STRING:
+        colon = data.index(b':', pos + 2)
+        start = colon + 2
+        end = start + int(data[pos + 2:colon])
+        if data[end] != 34:
+            raise DecodeError(f"String at offset {pos} does not end where its length says")
+        return data[start:end].decode('utf-8', errors='replace'), end + 2
+    if kind == _INT:
+        end = data.index(b';', pos + 2)
+        return int(data[pos + 2:end]), end + 1
+    if kind == _ARRAY or kind == _OBJECT:
+        count, pos = _array_header(data, pos) if kind == _ARRAY else _object_header(data, pos)
+        result = {}
+        for _ in range(count):
+            key, pos = _key(data, pos)
+            result[_text(key) if isinstance(key, bytes) else key], pos = _value(data, pos)
+        return result, _close(data, pos)
+    if kind == _BOOL:
+        return data[pos + 2] == 49, pos + 4
+    if kind == _FLOAT:
+        end = data.index(b';', pos + 2)
+        return float(data[pos + 2:end]), end + 1
+    if kind == _NULL:
+        return None, pos + 2
+    raise DecodeError(f"Unsupported type {chr(kind)!r} at offset {pos}")
+
+def loads(data):
+    """Decode a payload; arrays become dicts with str (or int) keys and strings become str"""
+    try:
+        value, _ = _value(data, 0)
+    except (IndexError, ValueError) as e:
+        raise DecodeError(f"Malformed PHP-serialized data: {e}") from e
+    return value
+
+def _records(data, section, fields):
+    """(key, {field: value}) for each array entry of a top-level section, decoding only the named fields
+
+    The whole payload is walked, so a response cut off anywhere raises
+    DecodeError instead of yielding a partial listing.
+    """
+    index = data.index
+    try:
+        if data[0] != _ARRAY:
+            return []
+        count, pos = _array_header(data, 0)
+        records = None
+        for _ in range(count):
+            key, pos = _key(data, pos)
+            if records is not None or key != section or data[pos] != _ARRAY:
+                pos = _skip(data, pos)
+                continue
+            entries, pos = _array_header(data, pos)
+            records = []
+            for _ in range(entries):
+                entry_key, pos = _key(data, pos)
+                if data[pos] != _ARRAY:
+                    pos = _skip(data, pos)
+                    continue
+                colon = index(b':', pos + 2)
+                field_count = int(data[pos + 2:colon])
+                pos = colon + 2
+                values = {}
+                # The hot loop: string keys and scalar values are parsed inline
+                for _ in range(field_count):
+                    if data[pos] == _STRING:
+                        colon = index(b':', pos + 2)
+                        start = colon + 2
+                        end = start + int(data[pos + 2:colon])
+                        field = data[start:end]
+                        pos = end + 2
+                    else:
+                        field, pos = _key(data, pos)
+                    if field in fields:
+                        values[field], pos = _value(data, pos)
+                        continue
+                    kind = data[pos]
+                    if kind == _STRING:
+                        colon = index(b':', pos + 2)
+                        pos = colon + 4 + int(data[pos + 2:colon])
+                    elif kind == _ARRAY or kind == _OBJECT:
+                        pos = _skip(data, pos)
+                    else:
+                        pos = index(b';', pos + 1) + 1
+                records.append((_text(entry_key) if isinstance(entry_key, bytes) else str(entry_key), values))
+                pos = _close(data, pos)
+            pos = _close(data, pos)
+        _close(data, pos)
+        return records or []
+    except (IndexError, ValueError) as e:
+        raise DecodeError(f"Malformed PHP-serialized data: {e}") from e
+
+INSTALLATION_FIELDS = frozenset((b'softurl', b'softpath', b'ver', b'cuser', b'softdomain', b'softdirectory'))
+PLUGIN_FIELDS = frozenset((b'Name', b'Version', b'active', b'update_available', b'new_version', b'Description'))
+
+def installations(data):
+    """Installation records of an act=wordpress listing, as list_wordpress_installations returns them"""
+    records = []
+    for insid, fields in _records(data, b'installations', INSTALLATION_FIELDS):
+        get = fields.get
+        records.append({
+            'insid': insid,
+            'domain': get(b'softurl', ''),
+            'path': get(b'softpath', ''),
+            'version': get(b'ver', ''),
+            'user': get(b'cuser', ''),
+            'display_name': f"{get(b'softdomain', '')}/{get(b'softdirectory', '')}"
+        })
+    return records
+
+def plugins(data):
+    """Plugin records of an act=wordpress type=plugins listing, as get_plugins_for_installation returns them"""
+    records = []
+    for slug, fields in _records(data, b'plugins', PLUGIN_FIELDS):
+        get = fields.get
+        records.append({
+            'name': get(b'Name', 'Unknown'),
+            'slug': slug,
+            'version': get(b'Version', ''),
+            'active': get(b'active', False),
+            'update_available': get(b'update_available', False),
+            'new_version': get(b'new_version', ''),
+            'description': get(b'Description', '')
+        })
+    return records
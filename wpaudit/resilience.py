@@ -0,0 +1,121 @@
+"""Retry backoff and per-host circuit breaker for the Softaculous transport"""
+import collections
+import random
+import threading
+import time
+
+from .audit import audit_logger
+from .config import (
+    RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_THRESHOLD,
+    BREAKER_RESET_TIMEOUT, BREAKER_HALF_OPEN_PROBES
+)
+
+# Responses worth retrying (the request may succeed on another attempt)
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+
+def backoff_delay(attempt, retry_after=None, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff, honouring a server Retry-After hint"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+def parse_retry_after(value):
+    """Parse a Retry-After header given in seconds"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class CircuitOpenError(Exception):
+    """Raised when a host's circuit breaker is rejecting requests"""
+
+class CircuitBreaker:
+    """Per-host breaker: fails fast once the error rate crosses a threshold"""
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, host, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 error_threshold=BREAKER_ERROR_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT,
+                 half_open_probes=BREAKER_HALF_OPEN_PROBES, audit=None):
+        self.host = host
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.audit = audit or audit_logger
+        self.state = self.CLOSED
+        self.opened_at = None
+        self._outcomes = collections.deque(maxlen=window)
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _transition(self, new_state, reason):
+        old_state = self.state
+        self.state = new_state
+        self.audit.log_circuit_breaker(self.host, old_state, new_state,
+                                       details={'reason': reason,
+                                                'error_rate': round(self.error_rate(), 3),
+                                                'window_calls': len(self._outcomes)})
+
+    def allow_request(self):
+        """Check whether a request may go out; raises CircuitOpenError when failing fast"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"Circuit open for {self.host}; failing fast")
+                self._transition(self.HALF_OPEN, 'reset timeout elapsed, probing')
+                self._probes_in_flight = 0
+
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    raise CircuitOpenError(f"Circuit half-open for {self.host}; probe in progress")
+                self._probes_in_flight += 1
+
+    def record(self, success):
+        """Record the outcome of a request let through by allow_request"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if success:
+                    self._outcomes.clear()
+                    self._transition(self.CLOSED, 'probe succeeded')
+                else:
+                    self.opened_at = time.monotonic()
+                    self._transition(self.OPEN, 'probe failed')
+                return
+
+            self._outcomes.append(success)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and self.error_rate() >= self.error_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN, 'error rate above threshold')
+
+    def release(self):
+        """Give back the slot of a request that ended without an outcome (e.g. it was cancelled)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def snapshot(self):
+        """Current state and error rate"""
+        with self._lock:
+            return {'state': self.state, 'error_rate': self.error_rate(), 'window_calls': len(self._outcomes)}
+
+# --- Breaker Registry ---
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(host):
+    """Get the shared circuit breaker for a cPanel host"""
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
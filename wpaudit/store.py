@@ -0,0 +1,242 @@
+"""Content-addressed local backup store with a manifest of server backup names"""
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from .catalog import BACKUP, backup_catalog
+from .config import LOCAL_BACKUP_DIR, ARCHIVE_LEVELS
+from .filelock import file_lock
+
+STORE_DIRNAME = '.store'
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_or_copy(source, target):
+    """Hardlink target to source; fall back to a symlink, then a copy"""
+    target = Path(target)
+    if target.exists() or target.is_symlink():
+        if target.exists() and os.path.samefile(source, target):
+            return 'existing'
+        target.unlink()
+    try:
+        os.link(source, target)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.abspath(source), target)
+        return 'symlink'
+    except OSError:
+        shutil.copy2(source, target)
+        return 'copy'
+
+class BackupStore:
+    """Blobs keyed by SHA-256; LOCAL_BACKUP_DIR entries are links into the store"""
+    def __init__(self, root=LOCAL_BACKUP_DIR, catalog=None):
+        self.root = Path(root)
+        self.catalog = catalog
+        self.store_dir = self.root / STORE_DIRNAME
+        self.blob_dir = self.store_dir / 'blobs'
+        self.manifest_path = self.store_dir / 'manifest.json'
+        self.lock_path = self.store_dir / 'manifest.lock'
+        self._lock = threading.RLock()
+        self._manifest = None
+        self._manifest_stat = None
+
+    # --- Manifest ---
+    def _stat(self):
+        try:
+            stat = self.manifest_path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self, reload=False):
+        # The app and the CLI share the store, so pick up saves made by the other process
+        stat = self._stat()
+        if reload or self._manifest is None or stat != self._manifest_stat:
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+            self._manifest.setdefault('backups', {})
+            self._manifest.setdefault('archives', {})
+            self._manifest_stat = stat
+        return self._manifest
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive across threads and processes; yields the manifest as currently on disk"""
+        with self._lock, file_lock(self.lock_path):
+            yield self._load(reload=True)
+
+    def _save(self):
+        # Only called inside _locked, so no other writer saved since the manifest was read
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=1)
+        os.replace(temp_path, self.manifest_path)
+        self._manifest_stat = self._stat()
+
+    def blob_path(self, sha256):
+        return self.blob_dir / sha256[:2] / sha256
+
+    def local_path(self, backup_name):
+        """Link for a server backup in the backup directory (never outside it)"""
+        return self.root / Path(backup_name).name
+
+    def lookup(self, backup_name):
+        """Manifest entry for a server backup name, or None"""
+        with self._lock:
+            entry = self._load()['backups'].get(backup_name)
+            return dict(entry) if entry else None
+
+    # --- Backups ---
+    def is_current(self, backup_name, size=None, server_mtime=None):
+        """True when the stored copy matches the server listing's size and mtime
+
+        A missing link in the backup directory is restored from the blob.
+        """
+        with self._lock:
+            entry = self._load()['backups'].get(backup_name)
+            if not entry or size is None or entry.get('size') != size:
+                return False
+            if server_mtime is not None and entry.get('server_mtime') != server_mtime:
+                return False
+            blob = self.blob_path(entry['sha256'])
+            if not blob.exists():
+                return False
+            local_path = self.local_path(backup_name)
+            if not local_path.exists():
+                link_or_copy(blob, local_path)
+                if self.catalog is not None:
+                    self.catalog.record(BACKUP, local_path, entry['sha256'], entry.get('insid'))
+            return True
+
+    def ingest(self, path, backup_name, sha256=None, server_mtime=None, insid=None):
+        """Move a finished download into the store and link it under its backup name
+
+        Returns (local_path, deduplicated) where deduplicated means the content
+        was already stored and the new copy was discarded.
+        """
+        path = Path(path)
+        sha256 = sha256 or file_sha256(path)
+        size = path.stat().st_size
+        blob = self.blob_path(sha256)
+        with self._locked() as manifest:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            deduplicated = blob.exists()
+            if deduplicated:
+                path.unlink()
+            else:
+                os.replace(path, blob)
+
+            local_path = self.local_path(backup_name)
+            link_type = link_or_copy(blob, local_path)
+
+            manifest['backups'][backup_name] = {
+                'sha256': sha256,
+                'size': size,
+                'server_mtime': server_mtime,
+                'insid': insid,
+                'link': link_type,
+                'stored_at': datetime.datetime.now().isoformat()
+            }
+            self._save()
+        if self.catalog is not None:
+            self.catalog.record(BACKUP, local_path, sha256, insid)
+        return local_path, deduplicated
+
+    def remove(self, backup_name):
+        """Forget a backup, delete its link and drop the blob once nothing references it"""
+        with self._locked() as manifest:
+            entry = manifest['backups'].pop(backup_name, None)
+            local_path = self.local_path(backup_name)
+            if local_path.exists() or local_path.is_symlink():
+                local_path.unlink()
+            if self.catalog is not None:
+                self.catalog.remove(BACKUP, local_path.name)
+            if entry:
+                self._save()
+                self._drop_blob_if_unreferenced(entry['sha256'])
+
+    def _drop_blob_if_unreferenced(self, sha256):
+        # Archives are separate files with their own copy of the bytes, so only backups keep a blob
+        referenced = any(e['sha256'] == sha256 for e in self._load()['backups'].values())
+        blob = self.blob_path(sha256)
+        if not referenced and blob.exists() and blob.stat().st_nlink <= 1:
+            blob.unlink()
+
+    # --- Archives ---
+    def archive_key(self, backup_names, compression_type, level=None):
+        """Identity of an archive by format, compression level and member content
+
+        None if any member is unknown. level None means the format's default.
+        Thread count is left out: it changes speed, not how well the archive compresses.
+        """
+        with self._lock:
+            backups = self._load()['backups']
+            members = []
+            for name in backup_names:
+                entry = backups.get(name)
+                if not entry:
+                    return None
+                members.append(f"{name}={entry['sha256']}")
+        level = ARCHIVE_LEVELS[compression_type] if level is None else int(level)
+        identity = f"{compression_type}:{level}\n" + "\n".join(sorted(members))
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def find_archive(self, key):
+        """Path of an existing archive with identical format, level and members"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._load()['archives'].get(key)
+            if entry and Path(entry['path']).exists():
+                return Path(entry['path'])
+        return None
+
+    def record_archive(self, key, archive_path, backup_names):
+        """Remember an archive so a later identical request can link to it"""
+        if key is not None:
+            with self._locked() as manifest:
+                backups = manifest['backups']
+                manifest['archives'][key] = {
+                    'path': str(archive_path),
+                    'members': [backups[name]['sha256'] for name in backup_names if name in backups],
+                    'created': datetime.datetime.now().isoformat()
+                }
+                self._save()
+        if self.catalog is not None:
+            self.catalog.record_archive(archive_path, backup_names)
+
+    def stats(self):
+        """Logical vs. stored bytes"""
+        with self._lock:
+            backups = self._load()['backups']
+            logical_bytes = sum(entry['size'] for entry in backups.values())
+            unique = {entry['sha256']: entry['size'] for entry in backups.values()}
+            stored_bytes = sum(unique.values())
+            return {
+                'backups': len(backups),
+                'blobs': len(unique),
+                'logical_bytes': logical_bytes,
+                'stored_bytes': stored_bytes,
+                'saved_bytes': logical_bytes - stored_bytes
+            }
+
+# Global store for LOCAL_BACKUP_DIR
+backup_store = BackupStore(catalog=backup_catalog)
@@ -0,0 +1,302 @@
+"""Typed SQLite store of API call telemetry with vectorised aggregations"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .audit import audit_logger
+from .config import LOGS_DIR, TELEMETRY_PATH
+
+# api_calls.log and its rotated segments
+API_LOG_PATTERN = re.compile(r'^api_calls(\.\d{8}-\d{6}(-\d+)?)?\.log(\.gz)?$')
+
+GROUP_COLUMNS = ('day', 'host', 'act', 'username')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_calls (
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    host TEXT,
+    act TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    status_code INTEGER,
+    response_time REAL,
+    response_size INTEGER,
+    attempt INTEGER,
+    streaming INTEGER NOT NULL,
+    username TEXT
+);
+CREATE INDEX IF NOT EXISTS api_calls_by_ts ON api_calls (ts);
+CREATE INDEX IF NOT EXISTS api_calls_by_day_act ON api_calls (day, act);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    first_line TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    offset INTEGER NOT NULL
+);
+"""
+
+def _uncompressed_size(path):
+    """Uncompressed size of a single-member gzip file, modulo 2**32, from its trailer"""
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return int.from_bytes(f.read(4), 'little')
+
+def _row(entry):
+    """Typed columns for one API_CALL log entry, or None if it is not one"""
+    if entry.get('event_type') != 'API_CALL' or 'timestamp' not in entry:
+        return None
+    timestamp = datetime.datetime.fromisoformat(entry['timestamp'])
+    details = entry.get('details') or {}
+    size = details.get('response_size', details.get('content_length'))
+    return (timestamp.timestamp(), timestamp.date().isoformat(), entry.get('host'), entry.get('action') or '',
+            1 if entry.get('result') == 'SUCCESS' else 0, details.get('status_code'), entry.get('response_time'),
+            size if isinstance(size, int) else None, details.get('attempt'), 1 if details.get('streaming') else 0,
+            entry.get('username'))
+
+def _group_percentiles(values, starts, counts, percentile):
+    """Linear-interpolated percentile of each sorted group, computed for all groups at once"""
+    position = starts + (counts - 1) * (percentile / 100.0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, starts + counts - 1)
+    fraction = position - lower
+    return values[lower] + (values[upper] - values[lower]) * fraction
+
+class TelemetryStore:
+    """API calls from api_calls.log as typed rows, for fleet-level questions
+
+    Each api_calls file has a watermark, the offset of the last complete
+    line imported, so refresh() reads only what was appended since, whichever
+    process appended it. Watermarks are keyed by a hash of the file's first
+    line, so they follow a file through rotation and compression. The audit
+    writer refreshes after each append to api_calls.log; entries from the
+    CLI and other processes are picked up on the next refresh. Aggregations
+    pull whole columns and group them with numpy instead of parsing JSON.
+    """
+    def __init__(self, db_path=TELEMETRY_PATH, logs_dir=LOGS_DIR):
+        self.db_path = Path(db_path)
+        self.logs_dir = Path(logs_dir)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                if self._meta('watermarks') is None:
+                    # Rows from before per-file watermarks cannot be matched to log offsets; reimport them
+                    self._conn.execute("DELETE FROM api_calls")
+                    self._conn.execute("DELETE FROM files")
+                    self._conn.execute("INSERT INTO meta (key, value) VALUES ('watermarks', ?)",
+                                       (datetime.datetime.now().isoformat(),))
+        return self._conn
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # --- Ingest ---
+    def on_append(self, stream, path, lines):
+        """Audit writer listener: import what was just appended to api_calls.log"""
+        if stream == 'api_calls':
+            self.refresh_file(path)
+
+    def refresh(self):
+        """Import API calls appended to any api_calls file since the last refresh; returns rows added"""
+        try:
+            with os.scandir(self.logs_dir) as entries:
+                names = sorted(entry.name for entry in entries if API_LOG_PATTERN.match(entry.name))
+        except FileNotFoundError:
+            names = []
+        added = 0
+        present = set()
+        for name in names:
+            rows, first_line = self._refresh_file(self.logs_dir / name)
+            added += rows
+            present.add(first_line)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # Forget files that are gone for good
+                gone = [key for (key,) in conn.execute("SELECT first_line FROM files") if key not in present]
+                conn.executemany("DELETE FROM files WHERE first_line = ?", [(key,) for key in gone])
+        return added
+
+    def refresh_file(self, path):
+        """Import the complete lines appended to one api_calls file; returns rows added"""
+        return self._refresh_file(Path(path))[0]
+
+    def _refresh_file(self, path, batch_lines=10000):
+        compressed = path.name.endswith('.gz')
+        opener = gzip.open if compressed else open
+        try:
+            size = _uncompressed_size(path) if compressed else os.stat(path).st_size
+            with opener(path, 'rb') as f:
+                first_line = f.readline()
+        except (OSError, EOFError):
+            return 0, None
+        if not first_line.endswith(b'\n'):
+            return 0, None  # Empty, or the first entry is still being written
+        key = hashlib.sha256(first_line).hexdigest()
+
+        added = 0
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # Serialises refreshes across processes, so no line is imported twice
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute("SELECT offset FROM files WHERE first_line = ?", (key,)).fetchone()
+                offset = row[0] if row else 0
+                # gzip records the uncompressed size modulo 2**32
+                if (offset % 2**32 if compressed else offset) == size:
+                    conn.execute("UPDATE files SET name = ? WHERE first_line = ?", (path.name, key))
+                    return 0, key
+
+                with opener(path, 'rb') as f:
+                    f.seek(offset)
+                    batch = []
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Still being written
+                        offset += len(line)
+                        batch.append(line)
+                        if len(batch) >= batch_lines:
+                            added += self._insert(conn, batch)
+                            batch = []
+                    added += self._insert(conn, batch)
+                conn.execute("INSERT OR REPLACE INTO files (first_line, name, offset) VALUES (?, ?, ?)",
+                             (key, path.name, offset))
+        return added, key
+
+    @staticmethod
+    def _insert(conn, lines):
+        """Insert the API_CALL entries among lines; returns rows added"""
+        rows = []
+        for line in lines:
+            try:
+                row = _row(json.loads(line))
+            except (ValueError, TypeError, AttributeError):
+                continue
+            if row is not None:
+                rows.append(row)
+        conn.executemany("INSERT INTO api_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # --- Queries ---
+    def _where(self, since, until, required=()):
+        clauses = [f"{column} IS NOT NULL" for column in required]
+        params = []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until.timestamp())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def columns(self, names, since=None, until=None, required=()):
+        """Selected columns for calls in [since, until) as numpy arrays, skipping rows with NULL in required"""
+        for name in tuple(names) + tuple(required):
+            if name not in GROUP_COLUMNS + ('ts', 'ok', 'status_code', 'response_time', 'response_size', 'attempt'):
+                raise ValueError(f"Unknown telemetry column: {name}")
+        where, params = self._where(since, until, required)
+        with self._lock:
+            rows = self._connection().execute(f"SELECT {', '.join(names)} FROM api_calls{where}", params).fetchall()
+        if not rows:
+            return {name: np.array([]) for name in names}
+        return {name: np.array(values) for name, values in zip(names, zip(*rows))}
+
+    def latency_percentiles(self, by=('day', 'act'), percentiles=(50, 95, 99), since=None, until=None):
+        """Response-time percentiles per group, e.g. p95 per act per day"""
+        by = tuple(by)
+        for column in by:
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"Cannot group by {column}")
+        data = self.columns(by + ('response_time',), since, until, required=('response_time',))
+        values = data['response_time'].astype(float)
+        if not len(values):
+            return []
+
+        # One integer code per distinct group, then sort by (group, value)
+        codes = np.zeros(len(values), dtype=np.int64)
+        labels = []
+        for column in by:
+            column_labels, inverse = np.unique(data[column].astype(str), return_inverse=True)
+            codes = codes * len(column_labels) + inverse
+            labels.append(column_labels)
+        order = np.lexsort((values, codes))
+        values, codes = values[order], codes[order]
+        group_codes, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+
+        results = {f"p{p}": _group_percentiles(values, starts, counts, p) for p in percentiles}
+        means = np.add.reduceat(values, starts) / counts
+        groups = []
+        for i, code in enumerate(group_codes):
+            group = {}
+            for column, column_labels in reversed(list(zip(by, labels))):
+                code, index = divmod(int(code), len(column_labels))
+                group[column] = str(column_labels[index])
+            group = {column: group[column] for column in by}
+            group['calls'] = int(counts[i])
+            group['mean'] = float(means[i])
+            group.update({name: float(result[i]) for name, result in results.items()})
+            groups.append(group)
+        return groups
+
+    def failure_rates(self, by='host', since=None, until=None):
+        """Calls, failures and failure rate per group (e.g. per host)"""
+        if by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {by}")
+        where, params = self._where(since, until)
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT {by}, COUNT(*), SUM(1 - ok) FROM api_calls{where} GROUP BY {by} ORDER BY 3 DESC",
+                params).fetchall()
+        return [{by: group, 'calls': calls, 'failures': failures, 'failure_rate': failures / calls}
+                for group, calls, failures in rows]
+
+    def bytes_transferred(self, period='week', since=None, until=None):
+        """Response bytes per day, week or month"""
+        formats = {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'}
+        if period not in formats:
+            raise ValueError(f"Unsupported period: {period}")
+        where, params = self._where(since, until)
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT strftime('{formats[period]}', ts, 'unixepoch', 'localtime') AS bucket, "
+                f"COALESCE(SUM(response_size), 0), COUNT(*) FROM api_calls{where} GROUP BY bucket ORDER BY bucket",
+                params).fetchall()
+        return [{period: bucket, 'bytes': total, 'calls': calls} for bucket, total, calls in rows]
+
+    def stats(self):
+        with self._lock:
+            count, first, last = self._connection().execute(
+                "SELECT COUNT(*), MIN(ts), MAX(ts) FROM api_calls").fetchone()
+        return {'calls': count,
+                'first': datetime.datetime.fromtimestamp(first) if first else None,
+                'last': datetime.datetime.fromtimestamp(last) if last else None}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Global store, refreshed by the audit writer
+telemetry_store = TelemetryStore()
+audit_logger.writer.listeners.append(telemetry_store.on_append)
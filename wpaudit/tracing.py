@@ -0,0 +1,170 @@
+"""Opt-in span tracing, exported as Chrome trace event JSON for chrome://tracing or Perfetto"""
+import contextlib
+import contextvars
+import datetime
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from .config import TRACES_DIR, TRACE_MAX_EVENTS
+
+# File server kind for exported traces
+TRACE = 'trace'
+
+# The recording spans are added to, and the lane of the innermost open span
+_active_trace = contextvars.ContextVar('active_trace', default=None)
+_current_lane = contextvars.ContextVar('trace_lane', default=None)
+
+class Trace:
+    """Complete ("X") events of one recording, laid out in lanes that nest properly
+
+    Chrome's format needs spans on one thread id to nest, but concurrent
+    sites share the event loop thread, so each concurrent unit of work gets
+    its own lane (tid). Lanes are reused once free to keep the chart compact.
+    """
+    def __init__(self, name, max_events=TRACE_MAX_EVENTS):
+        self.name = name
+        self.max_events = max_events
+        self.started = datetime.datetime.now()
+        self.events = []
+        self.dropped = 0
+        self.path = None
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._lane_names = {}
+        self._thread_lanes = {}
+        self._free_lanes = []
+        self._next_lane = 1
+
+    def now(self):
+        """Microseconds since the recording started"""
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def thread_lane(self):
+        """Lane of the calling thread, for spans opened outside any other span"""
+        thread = threading.current_thread()
+        with self._lock:
+            lane = self._thread_lanes.get(thread.ident)
+            if lane is None:
+                lane = self._thread_lanes[thread.ident] = self._next_lane
+                self._next_lane += 1
+                self._lane_names[lane] = thread.name
+            return lane
+
+    def acquire_lane(self):
+        with self._lock:
+            if self._free_lanes:
+                return heapq.heappop(self._free_lanes)
+            lane = self._next_lane
+            self._next_lane += 1
+            self._lane_names[lane] = f"worker {len(self._lane_names) - len(self._thread_lanes) + 1}"
+            return lane
+
+    def release_lane(self, lane):
+        with self._lock:
+            heapq.heappush(self._free_lanes, lane)
+
+    def add(self, name, category, start, duration, lane, args):
+        with self._lock:
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': round(start, 3),
+                                'dur': round(duration, 3), 'pid': os.getpid(), 'tid': lane, 'args': args})
+
+    def to_json(self):
+        """The trace in Chrome's JSON object format"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            lane_names = dict(self._lane_names)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': f"wpaudit {self.name}"}}]
+        metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': lane, 'args': {'name': lane_name}}
+                     for lane, lane_name in sorted(lane_names.items())]
+        metadata += [{'name': 'thread_sort_index', 'ph': 'M', 'pid': pid, 'tid': lane, 'args': {'sort_index': lane}}
+                     for lane in sorted(lane_names)]
+        return {'traceEvents': metadata + sorted(events, key=lambda event: event['ts']),
+                'displayTimeUnit': 'ms',
+                'otherData': {'name': self.name, 'started': self.started.isoformat(),
+                              'events': len(events), 'dropped': self.dropped}}
+
+    def export(self, traces_dir=TRACES_DIR):
+        """Write the trace as JSON and return its path"""
+        traces_dir = Path(traces_dir)
+        traces_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9_-]+', '_', self.name).strip('_') or 'trace'
+        path = traces_dir / f"trace_{slug}_{self.started.strftime('%Y%m%d-%H%M%S')}.json"
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self.to_json(), f, separators=(',', ':'))
+        os.replace(temp_path, path)
+        self.path = path
+        return path
+
+class Tracer:
+    """Entry point for spans; spans are only kept inside a recording() block
+
+    The recording is carried in a context variable, so it covers coroutines
+    submitted to the shared event loop from inside the block and nothing run
+    by other sessions at the same time. Outside a recording span() costs one
+    context variable lookup.
+    """
+    def __init__(self, traces_dir=TRACES_DIR, max_events=TRACE_MAX_EVENTS):
+        self.traces_dir = Path(traces_dir)
+        self.max_events = max_events
+
+    @property
+    def active(self):
+        return _active_trace.get()
+
+    @contextlib.contextmanager
+    def recording(self, name, enabled=True):
+        """Record spans opened in this block; yields the Trace (None when disabled), exported on exit"""
+        if not enabled:
+            yield None
+            return
+        trace = Trace(name, self.max_events)
+        trace_token = _active_trace.set(trace)
+        lane_token = _current_lane.set(None)
+        try:
+            with self.span(name, 'recording'):
+                yield trace
+        finally:
+            _current_lane.reset(lane_token)
+            _active_trace.reset(trace_token)
+            trace.export(self.traces_dir)
+
+    @contextlib.contextmanager
+    def span(self, name, category='wpaudit', new_lane=False, **args):
+        """Time the block as a span nested in the enclosing one; yields its args dict for results
+
+        new_lane=True starts a lane of its own, for work that runs concurrently
+        with its siblings (e.g. one site of a bulk operation).
+        """
+        trace = _active_trace.get()
+        if trace is None:
+            yield args
+            return
+        if new_lane:
+            lane = trace.acquire_lane()
+        else:
+            lane = _current_lane.get() or trace.thread_lane()
+        lane_token = _current_lane.set(lane)
+        start = trace.now()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            trace.add(name, category, start, trace.now() - start, lane, args)
+            _current_lane.reset(lane_token)
+            if new_lane:
+                trace.release_lane(lane)
+
+# Global tracer
+tracer = Tracer()